@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+原子替换与同步到磁盘
+原地处理时先写入同一目录下的临时文件，完成后用os.replace整体替换原文件，
+处理中途崩溃或断电只会留下临时文件，原图片不会处于写了一半的状态
+"""
+
+import os
+import glob
+import shutil
+import tempfile
+
+from timing import NULL_TIMER, STAGE_FSYNC
+
+
+# 输出文件同步到磁盘的方式
+FSYNC_NONE = 'none'   # 不主动同步，由操作系统决定写回时机
+FSYNC_FILE = 'file'   # 替换或完成前同步输出文件的数据
+FSYNC_FULL = 'full'   # 同时同步所在目录，使替换后的文件名在断电后也能保留
+FSYNC_POLICIES = (FSYNC_NONE, FSYNC_FILE, FSYNC_FULL)
+
+# 临时文件的后缀，文件夹扫描不会把它当作图片
+TEMP_SUFFIX = '.tmp'
+
+
+def make_temp_path(target_path):
+    """
+    在目标文件所在目录创建一个空的临时文件
+
+    与目标文件位于同一文件系统，os.replace才能保证是原子操作。
+
+    Returns:
+        str: 临时文件路径
+    """
+    directory, name = os.path.split(os.path.abspath(target_path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=TEMP_SUFFIX, dir=directory)
+    os.close(fd)
+    return temp_path
+
+
+def find_temp_files(target_path):
+    """
+    查找make_temp_path为目标文件创建的临时文件
+
+    处理文件的进程被终止时无法报告临时文件名，只能按命名规则查找。
+
+    Returns:
+        list: 临时文件路径列表
+    """
+    directory, name = os.path.split(os.path.abspath(target_path))
+    return glob.glob(glob.escape(os.path.join(directory, f".{name}.")) + '*' + TEMP_SUFFIX)
+
+
+def fsync_file(path):
+    """把文件数据同步到磁盘"""
+    # Windows上只有可写的文件描述符才能调用fsync
+    flags = os.O_RDWR if os.name == 'nt' else os.O_RDONLY
+    fd = os.open(path, flags)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_directory(path):
+    """同步目录项，使其中文件的创建、重命名持久化（Windows不支持，直接跳过）"""
+    if os.name == 'nt':
+        return
+    fd = os.open(path or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def sync_output(path, policy=FSYNC_NONE, timer=NULL_TIMER):
+    """按同步方式同步已经写完的输出文件，耗时记录到fsync阶段"""
+    if policy == FSYNC_NONE:
+        return
+    with timer.stage(STAGE_FSYNC):
+        fsync_file(path)
+        if policy == FSYNC_FULL:
+            fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+
+def replace_file(temp_path, target_path, policy=FSYNC_FILE, timer=NULL_TIMER):
+    """
+    用临时文件原子替换目标文件，保留目标文件的权限和时间戳
+
+    Args:
+        temp_path: 已经写完的临时文件
+        target_path: 被替换的文件
+        policy: 同步方式 (FSYNC_POLICIES之一)
+        timer: 可选的StageTimer，同步耗时记录到fsync阶段
+    """
+    shutil.copystat(target_path, temp_path)
+
+    # 先同步临时文件的数据再重命名，避免断电后出现同名但内容为空的文件
+    if policy != FSYNC_NONE:
+        with timer.stage(STAGE_FSYNC):
+            fsync_file(temp_path)
+    os.replace(temp_path, target_path)
+    if policy == FSYNC_FULL:
+        with timer.stage(STAGE_FSYNC):
+            fsync_directory(os.path.dirname(os.path.abspath(target_path)))
+
+
+def remove_temp_file(temp_path):
+    """删除处理失败时留下的临时文件"""
+    try:
+        os.unlink(temp_path)
+    except FileNotFoundError:
+        pass
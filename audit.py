@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+元数据审计（试运行）
+只读取块头和少量元数据字段，统计一批文件中工作流文本、EXIF GPS、XMP等元数据出现的文件数
+和占用的字节数，不写入任何图片文件，不依赖Qt
+"""
+
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import processors  # 导入时注册内置的格式处理器
+from formats import find_handler, read_header
+
+
+# 每个文件元数据总字节数的直方图桶上限
+METADATA_SIZE_BOUNDS = (0, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# 进程池模式下每次交给工作进程的文件数，减少大量小文件的进程间通信开销
+AUDIT_CHUNK_SIZE = 64
+
+
+def audit_file(image_path) -> dict:
+    """
+    审计单个文件
+
+    定义在模块级别，以便进程池中的工作进程可以直接调用；失败时不抛出异常，返回错误信息。
+
+    Returns:
+        dict: 审计结果
+            format: 格式名称
+            file_size: 文件大小
+            scanned: 格式是否支持逐块审计（PIL处理的格式为False）
+            entries: [(类型, 关键字, 字节数), ...]
+            error: 失败时只有该字段
+    """
+    try:
+        with open(image_path, 'rb', buffering=0) as input_file:
+            handler = find_handler(read_header(input_file))
+            entries = handler.audit(input_file)
+            file_size = os.fstat(input_file.fileno()).st_size
+    except Exception as e:
+        return {'error': str(e)}
+    return {'format': handler.name, 'file_size': file_size, 'scanned': entries is not None,
+            'entries': entries or []}
+
+
+class AuditSummary:
+    """汇总多个文件的审计结果"""
+
+    def __init__(self):
+        self.total_files = 0
+        self.scanned_files = 0
+        self.files_with_metadata = 0
+        self.total_bytes = 0
+        self.metadata_bytes = 0
+        self.failed_files = []
+        self.failure_reasons = {}
+        self.formats = {}    # 格式 -> {'files', 'files_with_metadata', 'bytes', 'metadata_bytes'}
+        self.types = {}      # 元数据类型 -> {'files', 'count', 'bytes'}
+        self.keywords = {}   # 关键字 -> {'files', 'count', 'bytes'}
+        self.size_buckets = [0] * (len(METADATA_SIZE_BOUNDS) + 1)
+
+    def add(self, image_path, result):
+        """加入一个文件的审计结果"""
+        self.total_files += 1
+        if 'error' in result:
+            self.failed_files.append(image_path)
+            self.failure_reasons[image_path] = result['error']
+            return
+
+        entries = result['entries']
+        metadata_bytes = sum(entry[2] for entry in entries)
+        self.total_bytes += result['file_size']
+        self.metadata_bytes += metadata_bytes
+        if result['scanned']:
+            self.scanned_files += 1
+            self.size_buckets[_bucket_index(metadata_bytes)] += 1
+        if entries:
+            self.files_with_metadata += 1
+
+        summary = self.formats.setdefault(result['format'], {'files': 0, 'files_with_metadata': 0,
+                                                             'bytes': 0, 'metadata_bytes': 0})
+        summary['files'] += 1
+        summary['files_with_metadata'] += 1 if entries else 0
+        summary['bytes'] += result['file_size']
+        summary['metadata_bytes'] += metadata_bytes
+
+        # 同一文件中重复出现的类型/关键字只计一个文件
+        seen_types = set()
+        seen_keywords = set()
+        for entry_type, keyword, size in entries:
+            _count(self.types, entry_type, size, entry_type not in seen_types)
+            seen_types.add(entry_type)
+            if keyword is not None:
+                _count(self.keywords, keyword, size, keyword not in seen_keywords)
+                seen_keywords.add(keyword)
+
+    def to_dict(self):
+        """转换为可以写入JSON的统计结果"""
+        labels = [f"<={bound}" for bound in METADATA_SIZE_BOUNDS]
+        labels.append(f">{METADATA_SIZE_BOUNDS[-1]}")
+        return {
+            'total_files': self.total_files,
+            'scanned_files': self.scanned_files,
+            'files_with_metadata': self.files_with_metadata,
+            'failed': len(self.failed_files),
+            'failed_files': self.failed_files.copy(),
+            'failure_reasons': dict(self.failure_reasons),
+            'total_bytes': self.total_bytes,
+            'metadata_bytes': self.metadata_bytes,
+            'formats': dict(sorted(self.formats.items())),
+            'types': _sorted_by_files(self.types),
+            'keywords': _sorted_by_files(self.keywords),
+            'metadata_size_histogram': {label: count for label, count in zip(labels, self.size_buckets)
+                                        if count},
+        }
+
+
+def _count(table, key, size, new_file):
+    summary = table.get(key)
+    if summary is None:
+        summary = table[key] = {'files': 0, 'count': 0, 'bytes': 0}
+    summary['files'] += 1 if new_file else 0
+    summary['count'] += 1
+    summary['bytes'] += size
+
+
+def _sorted_by_files(table):
+    return dict(sorted(table.items(), key=lambda item: (-item[1]['files'], item[0])))
+
+
+def _bucket_index(size):
+    for index, bound in enumerate(METADATA_SIZE_BOUNDS):
+        if size <= bound:
+            return index
+    return len(METADATA_SIZE_BOUNDS)
+
+
+def run_audit(image_paths, max_workers=1, file_callback=None) -> dict:
+    """
+    审计一批文件并汇总统计结果
+
+    Args:
+        image_paths: 输入文件路径列表
+        max_workers: 进程数，大于1时使用进程池并行审计
+        file_callback: 可选的回调 (image_path, result)，按输入顺序在当前进程中调用
+
+    Returns:
+        dict: AuditSummary.to_dict()的统计结果
+    """
+    summary = AuditSummary()
+    executor = None
+    if max_workers > 1 and len(image_paths) > 1:
+        # 使用spawn启动方式，避免在带有Qt线程的进程中fork
+        executor = ProcessPoolExecutor(max_workers=max_workers,
+                                       mp_context=multiprocessing.get_context('spawn'))
+    try:
+        if executor is not None:
+            results = executor.map(audit_file, image_paths, chunksize=AUDIT_CHUNK_SIZE)
+        else:
+            results = map(audit_file, image_paths)
+        for image_path, result in zip(image_paths, results):
+            summary.add(image_path, result)
+            if file_callback is not None:
+                file_callback(image_path, result)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+    return summary.to_dict()
+
+
+class AuditLog:
+    """把每个文件的审计结果逐行写入JSONL文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, image_path, result):
+        record = {'input': image_path}
+        if 'error' in result:
+            record['error'] = result['error']
+        else:
+            record.update(format=result['format'], file_size=result['file_size'], scanned=result['scanned'],
+                          entries=[{'type': entry_type, 'keyword': keyword, 'bytes': size}
+                                   for entry_type, keyword, size in result['entries']])
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量处理执行器
+负责文件命名、串行/进程池/读写流水线调度和结果统计，不依赖Qt，GUI与命令行模式共用
+"""
+
+import io
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+from atomic import FSYNC_NONE, FSYNC_FILE, find_temp_files, remove_temp_file
+from cache import options_fingerprint
+from limits import DEFAULT_LIMITS, LimitExceededError
+from pipeline import IOPipeline, DEFAULT_BUDGET_BYTES
+from processors import (process_image_file, process_image_data, write_image_output,
+                        CLEAN_COPY, CLEAN_REWRITE)
+from progress import ProgressTracker
+from timing import StageHistogram, StageTimer, TimingLog, NULL_TIMER, STAGE_READ
+
+# 单个文件的处理状态
+STATUS_PENDING = 0   # 等待处理
+STATUS_DONE = 1      # 处理成功
+STATUS_FAILED = 2    # 处理失败
+STATUS_SKIPPED = 3   # 缓存命中，未重新处理
+
+
+def unique_output_name(filename, used_names):
+    """
+    为同一批中重名的文件加上 _1、_2 等后缀，避免不同文件夹中的同名文件写入同一个输出
+
+    Args:
+        filename: 原始文件名
+        used_names: 已经使用的文件名集合（按os.path.normcase比较），返回的文件名会加入其中
+
+    Returns:
+        str: 不与已有文件名重复的输出文件名
+    """
+    candidate = filename
+    name, ext = os.path.splitext(filename)
+    suffix = 0
+    while os.path.normcase(candidate) in used_names:
+        suffix += 1
+        candidate = f"{name}_{suffix}{ext}"
+    used_names.add(os.path.normcase(candidate))
+    return candidate
+
+
+class BatchRunner:
+    """批量处理图像文件并汇总统计结果"""
+
+    # 执行模式
+    EXECUTOR_SERIAL = 'serial'      # 在当前线程中逐个处理
+    EXECUTOR_PROCESS = 'process'    # 使用进程池并行处理
+    EXECUTOR_PIPELINE = 'pipeline'  # 预读、处理、后台写入重叠执行，适合网络盘等高延迟存储
+
+    # 每个工作进程最多排队的任务数，避免一次性提交大量任务占用内存
+    TASKS_PER_WORKER = 4
+
+    # 多进程模式下设置了处理时间限制时，超出限制多少秒后终止卡住的工作进程
+    TIMEOUT_GRACE = 5.0
+
+    # 设置了处理时间限制时，检查超时任务的间隔（秒）
+    WATCHDOG_INTERVAL = 0.5
+
+    def __init__(self, image_paths, output_dir, keep_original_name,
+                 executor_mode=EXECUTOR_SERIAL, max_workers=None, result_callback=None,
+                 clean_strategy=CLEAN_COPY, cache=None, executor=None, status_callback=None,
+                 progress_callback=None, progress_interval=0.1, collect_timings=False,
+                 timings_path=None, profile_hook=None, strip_icc=False, in_place=False, fsync=None,
+                 pipeline_budget=DEFAULT_BUDGET_BYTES, limits=None, journal=None, output_names=None):
+        """
+        Args:
+            image_paths: 输入文件路径列表
+            output_dir: 输出文件夹
+            keep_original_name: 是否保留原始文件名
+            executor_mode: 执行模式 (EXECUTOR_SERIAL / EXECUTOR_PROCESS / EXECUTOR_PIPELINE)
+            max_workers: 进程池大小，默认为CPU核心数
+            result_callback: 每个文件完成后的回调 (filename, error, done_count, total)
+            clean_strategy: 不含元数据的文件的输出方式 ('rewrite' / 'copy' / 'hardlink')
+            cache: 可选的ResultCache，输入和输出都未变化的文件直接跳过
+            executor: 可选的外部进程池，多次批量处理共用时避免重复启动进程
+            status_callback: 每个文件完成后的回调 (index, status)，index为文件在image_paths中的位置
+            progress_callback: 合并后的进度报告回调，参数为ProgressTracker生成的报告
+            progress_interval: 两次进度报告之间的最短间隔（秒）
+            collect_timings: 是否记录每个文件各处理阶段的耗时，汇总到统计结果的timings中
+            timings_path: 可选的JSONL文件路径，逐行写入每个文件的耗时（会同时开启collect_timings）
+            profile_hook: 可选的无参数函数，返回包裹整批处理的上下文管理器，
+                例如 functools.partial(timing.cprofile_hook, 'batch.prof')
+            strip_icc: 是否同时去除WebP、GIF和TIFF中的ICC颜色配置
+            in_place: 是否原地处理，写入临时文件后原子替换原文件（忽略output_dir和keep_original_name）
+            fsync: 输出文件同步到磁盘的方式 (atomic.FSYNC_POLICIES之一)，
+                默认原地处理时为'file'，否则为'none'
+            pipeline_budget: 流水线模式下预读和待写入的文件合计占用的内存上限（字节）
+            limits: 可选的ResourceLimits，限制单个文件的块长度、块数量、输出大小和处理时间，
+                超出时该文件处理失败，原因记录在failure_reasons中；处理时间由处理器在遍历块和复制数据时检查，
+                多进程模式下卡在系统调用中的工作进程超时后会被终止，进程池随之重建
+                （使用外部进程池时，重建后的进程池保存在self.executor中）
+            journal: 可选的BatchJournal，逐个记录处理结果；resume模式下日志中已完成的文件直接跳过
+            output_names: 可选的输出文件名列表，与image_paths一一对应（例如清单模式中预先分配的文件名），
+                指定时忽略keep_original_name
+        """
+        self.image_paths = image_paths
+        self.output_dir = output_dir
+        self.keep_original_name = keep_original_name
+        self.output_names = output_names
+        self._used_names = set()    # 本批已经使用的输出文件名
+        self.executor_mode = executor_mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.result_callback = result_callback
+        self.clean_strategy = clean_strategy
+        self.strip_icc = strip_icc
+        self.in_place = in_place
+        if fsync is None:
+            fsync = FSYNC_FILE if in_place else FSYNC_NONE
+        self.fsync = fsync
+        self.pipeline_budget = pipeline_budget
+        self.limits = limits
+        self.cache = cache
+        # 影响输出内容或成败的选项，缓存只复用以相同选项生成的结果
+        effective_limits = limits or DEFAULT_LIMITS
+        self._cache_options = options_fingerprint(
+            clean_strategy=clean_strategy, strip_icc=strip_icc,
+            limits=[effective_limits.max_chunk_length, effective_limits.max_chunks,
+                    effective_limits.max_output_bytes, effective_limits.timeout])
+        self.journal = journal
+        self.executor = executor
+        self.status_callback = status_callback
+        self.progress_callback = progress_callback
+        self.progress_interval = progress_interval
+        self.progress = None
+        self.collect_timings = collect_timings or timings_path is not None
+        self.timings_path = timings_path
+        self.profile_hook = profile_hook
+        self.timings = StageHistogram()
+        self.timing_log = None
+        self.is_running = True
+
+        # 初始化统计变量
+        self.processed_files = []   # 成功处理的文件列表
+        self.failed_files = []      # 处理失败的文件列表
+        self.failure_reasons = {}   # 失败文件 -> 失败原因
+        self.clean_files = []       # 扫描后确认本来就不含元数据的文件
+        self.fast_path_files = {}   # 直接链接或整个复制的文件 -> 使用的方式
+        self.skipped_files = []     # 缓存命中、未重新处理的文件
+        self.bytes_in = 0           # 读取的输入文件总字节数
+        self.bytes_out = 0          # 写入的输出文件总字节数
+
+    def run(self) -> dict:
+        """
+        执行批量处理
+
+        Returns:
+            dict: 处理统计结果
+        """
+        total = len(self.image_paths)
+        if self.progress_callback is not None:
+            self.progress = ProgressTracker(total, self.progress_interval)
+
+        if self.timings_path is not None:
+            self.timing_log = TimingLog(self.timings_path)
+
+        if self.journal is not None:
+            # 输出位置不同的任务不能共用日志中的完成记录
+            output_dir = None if self.in_place else os.path.abspath(self.output_dir)
+            self.journal.begin({'output_dir': output_dir, 'keep_original_name': self.keep_original_name})
+
+        try:
+            if self.profile_hook is not None:
+                with self.profile_hook():
+                    self._run(total)
+            else:
+                self._run(total)
+        finally:
+            if self.cache is not None:
+                self.cache.close()
+            if self.timing_log is not None:
+                self.timing_log.close()
+                self.timing_log = None
+            if self.journal is not None:
+                self.journal.close()
+
+        # 发送最后一次进度报告，包含最后一个间隔内完成的文件
+        if self.progress is not None:
+            report = self.progress.flush()
+            if report is not None:
+                self.progress_callback(report)
+
+        # 准备统计结果
+        stats = {
+            'total_files': total,
+            'successful': len(self.processed_files),
+            'failed': len(self.failed_files),
+            'processed_files': self.processed_files.copy(),
+            'failed_files': self.failed_files.copy(),
+            'failure_reasons': dict(self.failure_reasons),
+            'clean_files': self.clean_files.copy(),
+            'fast_path_files': dict(self.fast_path_files),
+            'skipped_files': self.skipped_files.copy(),
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out
+        }
+        if self.collect_timings:
+            stats['timings'] = self.timings.to_dict()
+        return stats
+
+    def _run(self, total):
+        if self.executor_mode == self.EXECUTOR_PROCESS and total > 1:
+            self._run_process_pool(total)
+        elif self.executor_mode == self.EXECUTOR_PIPELINE:
+            self._run_pipeline(total)
+        else:
+            self._run_serial(total)
+
+    def stop(self):
+        """停止处理，尚未开始的文件将被跳过"""
+        self.is_running = False
+
+    def _build_output_path(self, i, image_path):
+        """生成输出文件名和输出路径"""
+        # 原地处理时输出到原文件；不同文件夹中可能有同名文件，统计结果使用完整路径
+        if self.in_place:
+            return image_path, image_path
+
+        # 获取原始文件名
+        filename = os.path.basename(image_path)
+
+        if self.output_names is not None:
+            filename = self.output_names[i]
+        elif not self.keep_original_name:
+            # 如果不保留原始文件名，则使用时间戳命名
+            name, ext = os.path.splitext(filename)
+            filename = f"{int(time.time())}_{i}{ext}"
+        else:
+            # 不同文件夹中的同名文件不能写入同一个输出
+            filename = unique_output_name(filename, self._used_names)
+
+        return filename, os.path.join(self.output_dir, filename)
+
+    def _run_serial(self, total):
+        """在当前线程中逐个处理文件"""
+        for i, image_path in enumerate(self.image_paths):
+            if not self.is_running:
+                break
+
+            filename, output_path = self._build_output_path(i, image_path)
+            task = (i, filename, image_path, output_path)
+
+            result = self._lookup_cache(image_path, output_path)
+            error = None
+            if result is None:
+                try:
+                    result = process_image_file(image_path, output_path, self.clean_strategy,
+                                                self.collect_timings, self.strip_icc, self.fsync,
+                                                self.limits, self.in_place)
+                except Exception as e:
+                    result = None
+                    error = e
+
+            self._record_result(task, error, i + 1, total, result)
+
+    def _create_pool(self):
+        """创建进程池，使用spawn启动方式，避免在带有Qt线程的进程中fork"""
+        context = multiprocessing.get_context('spawn')
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+
+    def _submit(self, executor, task):
+        """把一个文件提交给进程池"""
+        i, filename, image_path, output_path = task
+        return executor.submit(process_image_file, image_path, output_path,
+                               self.clean_strategy, self.collect_timings, self.strip_icc,
+                               self.fsync, self.limits, self.in_place)
+
+    def _find_expired(self, pending, started, timeout):
+        """
+        找出超过处理时间的任务
+
+        进程池把任务放入调用队列时就标记为running，队列中的任务可能还要等一个正在执行的任务结束，
+        因此从首次看到running起允许两倍的处理时间再加TIMEOUT_GRACE。工作进程内的检查通常先让文件失败，
+        这里只处理卡在系统调用中（例如网络盘无响应）、无法自行检查的进程。
+        """
+        now = time.monotonic()
+        expired = []
+        for future in pending:
+            if future.running():
+                started.setdefault(future, now)
+                if now - started[future] > timeout * 2 + self.TIMEOUT_GRACE:
+                    expired.append(future)
+        return expired
+
+    def _terminate_pool(self, executor):
+        """终止进程池的所有工作进程"""
+        terminate = getattr(executor, 'terminate_workers', None)
+        if terminate is not None:
+            # Python 3.14 起提供的公开接口
+            terminate()
+        else:
+            for process in list((executor._processes or {}).values()):
+                process.terminate()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    def _run_process_pool(self, total):
+        """使用进程池并行处理文件，结果按完成顺序返回"""
+        executor = self.executor
+        if executor is None:
+            executor = self._create_pool()
+        pending = {}
+        started = {}    # 任务 -> 首次看到running的时间，只在设置了处理时间限制时记录
+        timeout = self.limits.timeout if self.limits is not None else None
+        tasks = enumerate(self.image_paths)
+        max_pending = self.max_workers * self.TASKS_PER_WORKER
+        completed = 0
+
+        try:
+            while True:
+                # 补充任务，保持队列中有足够的待处理文件
+                while self.is_running and len(pending) < max_pending:
+                    task = next(tasks, None)
+                    if task is None:
+                        break
+                    i, image_path = task
+                    filename, output_path = self._build_output_path(i, image_path)
+                    task = (i, filename, image_path, output_path)
+
+                    # 缓存命中的文件只需stat，不必提交给工作进程
+                    result = self._lookup_cache(image_path, output_path)
+                    if result is not None:
+                        completed += 1
+                        self._record_result(task, None, completed, total, result)
+                        continue
+
+                    pending[self._submit(executor, task)] = task
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, timeout=None if timeout is None else self.WATCHDOG_INTERVAL,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = pending.pop(future)
+                    started.pop(future, None)
+                    completed += 1
+                    error = future.exception()
+                    result = future.result() if error is None else None
+                    self._record_result(task, error, completed, total, result)
+
+                expired = self._find_expired(pending, started, timeout) if timeout is not None else []
+                if expired:
+                    # 无法单独终止一个工作进程：终止整个进程池，超时的文件记为失败，其余任务提交给新的进程池
+                    self._terminate_pool(executor)
+                    executor_is_external = executor is self.executor
+                    executor = self._create_pool()
+                    if executor_is_external:
+                        self.executor = executor
+                    for future in expired:
+                        task = pending.pop(future)
+                        # 工作进程被终止时输出只写了一部分，原地处理时写了一部分的是原文件旁边的临时文件
+                        if self.in_place:
+                            for temp_path in find_temp_files(task[2]):
+                                remove_temp_file(temp_path)
+                        else:
+                            remove_temp_file(task[3])
+                        completed += 1
+                        error = LimitExceededError(f"处理超时: 超过{timeout:g}秒，工作进程已被终止")
+                        self._record_result(task, error, completed, total)
+                    for future, task in list(pending.items()):
+                        # 终止前已经完成的任务照常记录，其余的重新提交
+                        if (future.done() and not future.cancelled()
+                                and not isinstance(future.exception(), BrokenProcessPool)):
+                            del pending[future]
+                            completed += 1
+                            error = future.exception()
+                            result = future.result() if error is None else None
+                            self._record_result(task, error, completed, total, result)
+                    pending = {self._submit(executor, task): task for task in pending.values()}
+                    started = {}
+
+                if not self.is_running:
+                    break
+        finally:
+            # 停止时取消尚未开始的任务，只等待正在执行的任务
+            if executor is self.executor:
+                for future in pending:
+                    future.cancel()
+                wait(pending)
+            else:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def _run_pipeline(self, total):
+        """
+        读取、处理和写入重叠执行：预读线程提前读入后面的文件，
+        当前线程按顺序处理，写入线程在后台写出结果
+        """
+        completed = 0
+        tasks = {}
+        items = []
+
+        # 缓存在当前线程中查询（SQLite连接不能跨线程共用），命中的文件不进入流水线
+        for i, image_path in enumerate(self.image_paths):
+            filename, output_path = self._build_output_path(i, image_path)
+            task = (i, filename, image_path, output_path)
+            result = self._lookup_cache(image_path, output_path)
+            if result is not None:
+                completed += 1
+                self._record_result(task, None, completed, total, result)
+                continue
+            tasks[i] = task
+            items.append((i, image_path))
+
+        def process(i, data, read_seconds):
+            timer = StageTimer() if self.collect_timings else NULL_TIMER
+            if timer.stages is not None:
+                timer.stages[STAGE_READ] = read_seconds
+            output = io.BytesIO()
+            result = process_image_data(tasks[i][2], data, output, self.clean_strategy,
+                                        self.strip_icc, timer, self.limits)
+            return (result, output, timer), output.seek(0, io.SEEK_END)
+
+        def write(i, processed):
+            result, output, timer = processed
+            _, _, image_path, output_path = tasks[i]
+            with output.getbuffer() as data:
+                return write_image_output(image_path, output_path, result, data,
+                                          self.clean_strategy, self.fsync, timer, self.in_place)
+
+        def done(i, result, error):
+            nonlocal completed
+            completed += 1
+            self._record_result(tasks.pop(i), error, completed, total, result)
+
+        pipeline = IOPipeline(self.pipeline_budget)
+        pipeline.run(items, process, write, done, should_stop=lambda: not self.is_running)
+
+    def _lookup_cache(self, image_path, output_path):
+        """查询日志和缓存，日志中已完成或缓存命中时返回标记为cached的处理结果"""
+        if self.journal is not None and self.journal.is_done(image_path):
+            return {'cached': True, 'journaled': True, 'removed': []}
+        if self.cache is None:
+            return None
+        try:
+            cached = self.cache.lookup(image_path, output_path, self._cache_options)
+        except OSError:
+            # 输入文件不存在等情况交给正常处理流程报告错误
+            return None
+        if cached is None:
+            return None
+        return {'cached': True, 'removed': cached['removed']}
+
+    def _record_result(self, task, error, done_count, total, result=None):
+        """记录单个文件的处理结果"""
+        i, filename, image_path, output_path = task
+        status = STATUS_DONE
+        bytes_in = bytes_out = 0
+        if error is None:
+            # 记录成功处理的文件
+            self.processed_files.append(filename)
+            if result is not None and result.get('cached'):
+                self.skipped_files.append(filename)
+                status = STATUS_SKIPPED
+            elif result is not None:
+                bytes_in = result['bytes_in']
+                bytes_out = result['bytes_out']
+                self.bytes_in += bytes_in
+                self.bytes_out += bytes_out
+                if not result['needs_stripping']:
+                    self.clean_files.append(filename)
+                if result['output_strategy'] != CLEAN_REWRITE:
+                    self.fast_path_files[filename] = result['output_strategy']
+                if self.cache is not None:
+                    self.cache.store(image_path, output_path, result['removed'], self._cache_options)
+                if self.collect_timings:
+                    self.timings.add(result['timings'], bytes_in, bytes_out)
+                    if self.timing_log is not None:
+                        self.timing_log.write(filename, image_path, result['timings'], bytes_in, bytes_out)
+        else:
+            # 记录处理失败的文件
+            self.failed_files.append(filename)
+            self.failure_reasons[filename] = str(error)
+            status = STATUS_FAILED
+            if self.timing_log is not None:
+                self.timing_log.write(filename, image_path, error=error)
+
+        # 日志中已有的文件不重复记录
+        if self.journal is not None and not (result is not None and result.get('journaled')):
+            self.journal.record(image_path, filename, error, result['removed'] if result is not None else None)
+
+        if self.status_callback is not None:
+            self.status_callback(i, status)
+        if self.progress is not None:
+            report = self.progress.record(i, status, filename, error, bytes_in, bytes_out)
+            if report is not None:
+                self.progress_callback(report)
+        if self.result_callback is not None:
+            self.result_callback(filename, error, done_count, total)
@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+吞吐量基准测试
+用固定随机种子生成可复现的测试图片集，分别测量各条处理路径的文件数/秒、MB/秒、
+峰值内存和各格式的单文件耗时分位数，以JSON格式输出，并可以与保存的基准结果比较。
+每条处理路径在全新的子进程中运行，峰值内存只反映这一条路径
+
+用法:
+    python benchmark.py [--corpus DIR] [--seed N] [--files-per-format N] [--jobs N]
+                        [--output REPORT.json] [--baseline BASELINE.json] [--tolerance 0.1]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+from batch import BatchRunner
+from processors import (PNGBlockProcessor, JPEGSegmentProcessor, WebPChunkProcessor,
+                        GIFBlockProcessor, TIFFProcessor, process_image_file, process_non_png_image)
+
+try:
+    import resource
+except ImportError:
+    # Windows没有resource模块，不统计峰值内存
+    resource = None
+
+
+# 测试图片集中PNG的边长，覆盖小图标到大图
+PNG_DIMENSIONS = (16, 64, 256, 1024)
+
+# 各格式的扩展名
+CORPUS_FORMATS = {
+    'PNG': '.png',
+    'JPEG': '.jpg',
+    'GIF': '.gif',
+    'TIFF': '.tiff',
+    'BMP': '.bmp',
+    'WEBP': '.webp',
+}
+
+# 比较基准结果时使用的指标，数值越大越好
+BASELINE_METRIC = 'files_per_sec'
+
+
+def _random_image(rng, size):
+    """生成带有随机噪声的RGB图片，避免压缩后体积过小"""
+    from PIL import Image
+
+    width, height = size
+    # 只随机一小块再平铺，既有一定的熵又不会让生成过程太慢
+    tile = Image.frombytes('RGB', (16, 16), bytes(rng.getrandbits(8) for _ in range(16 * 16 * 3)))
+    image = Image.new('RGB', size)
+    for x in range(0, width, 16):
+        for y in range(0, height, 16):
+            image.paste(tile, (x, y))
+    return image
+
+
+def _random_text(rng, length):
+    alphabet = 'abcdefghijklmnopqrstuvwxyz0123456789 {}":,'
+    return ''.join(rng.choice(alphabet) for _ in range(length))
+
+
+def _exif_payload(rng, length):
+    """生成最小的合法TIFF头加随机填充，作为EXIF数据"""
+    return b'II*\x00\x08\x00\x00\x00\x00\x00' + bytes(rng.getrandbits(8) for _ in range(length))
+
+
+def _write_png(path, rng, dimension):
+    from PIL import PngImagePlugin
+
+    metadata = PngImagePlugin.PngInfo()
+    metadata.add_text("workflow", _random_text(rng, rng.choice((100, 4000, 60000))))
+    metadata.add_text("prompt", _random_text(rng, rng.randint(10, 2000)), zip=True)
+    metadata.add_itxt("parameters", _random_text(rng, rng.randint(10, 2000)), lang="en")
+    exif = _exif_payload(rng, rng.randint(16, 4000))
+    _random_image(rng, (dimension, dimension)).save(path, "PNG", pnginfo=metadata, exif=exif)
+
+
+def _write_jpeg(path, rng, dimension):
+    buffer = io.BytesIO()
+    exif = b'Exif\x00\x00' + _exif_payload(rng, rng.randint(1000, 60000))
+    _random_image(rng, (dimension, dimension)).save(buffer, "JPEG", quality=90, exif=exif)
+    data = buffer.getvalue()
+
+    # 在SOI之后插入一个较大的APP13（Photoshop IRB）段
+    payload = b'Photoshop 3.0\x00' + bytes(rng.getrandbits(8) for _ in range(rng.randint(1000, 30000)))
+    app13 = b'\xFF\xED' + struct.pack('>H', len(payload) + 2) + payload
+    with open(path, 'wb') as f:
+        f.write(data[:2] + app13 + data[2:])
+
+
+def _write_other(path, rng, dimension, image_format):
+    image = _random_image(rng, (dimension, dimension))
+    if image_format == 'GIF':
+        image.convert('P').save(path, "GIF", comment=_random_text(rng, 200).encode('ascii'))
+    elif image_format == 'TIFF':
+        from PIL import TiffImagePlugin
+
+        tags = TiffImagePlugin.ImageFileDirectory_v2()
+        tags[270] = _random_text(rng, 500)   # ImageDescription
+        tags[305] = "benchmark"              # Software
+        image.save(path, "TIFF", tiffinfo=tags)
+    elif image_format == 'WEBP':
+        xmp = _random_text(rng, rng.randint(100, 4000)).encode('ascii')
+        image.save(path, "WEBP", lossless=True, exif=_exif_payload(rng, 2000), xmp=xmp)
+    else:
+        image.save(path, image_format)
+
+
+def generate_corpus(corpus_dir, seed=0, files_per_format=20, max_dimension=1024):
+    """
+    生成可复现的测试图片集
+
+    Args:
+        corpus_dir: 输出文件夹
+        seed: 随机种子，相同的种子和Pillow版本生成完全相同的文件
+        files_per_format: 每种格式生成的文件数
+        max_dimension: 图片最大边长
+
+    Returns:
+        list: [(文件路径, 格式), ...]
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    rng = random.Random(seed)
+    dimensions = [d for d in PNG_DIMENSIONS if d <= max_dimension] or [max_dimension]
+
+    corpus = []
+    for image_format, ext in CORPUS_FORMATS.items():
+        for i in range(files_per_format):
+            dimension = dimensions[i % len(dimensions)]
+            path = os.path.join(corpus_dir, f"{image_format.lower()}_{i:04d}{ext}")
+            if image_format == 'PNG':
+                _write_png(path, rng, dimension)
+            elif image_format == 'JPEG':
+                _write_jpeg(path, rng, min(dimension, 256))
+            else:
+                # 非PNG路径需要解码像素，尺寸较小以免基准测试耗时过长
+                _write_other(path, rng, min(dimension, 256), image_format)
+            corpus.append((path, image_format))
+    return corpus
+
+
+def percentile(sorted_values, fraction):
+    """最近秩法计算分位数，sorted_values需要已经排序"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize_latencies(latencies):
+    """把单文件耗时（秒）汇总为毫秒分位数"""
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'p50_ms': percentile(values, 0.50) * 1000,
+        'p90_ms': percentile(values, 0.90) * 1000,
+        'p99_ms': percentile(values, 0.99) * 1000,
+        'max_ms': values[-1] * 1000,
+    }
+
+
+def _proc_peak_rss_kb():
+    """
+    Linux上从/proc读取本进程自身的峰值常驻内存（KB），其他平台返回None
+
+    Linux的ru_maxrss在exec后保留创建进程时父进程的峰值，子进程的测量值不会低于父进程；
+    VmHWM只统计exec之后的内存。
+    """
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_kb():
+    """
+    当前进程和已结束子进程中最大者的峰值常驻内存（KB），不支持时返回None
+
+    children取自ru_maxrss，包含子进程创建时本进程已经占用的内存。
+    """
+    if resource is None:
+        return None
+    # macOS上ru_maxrss的单位是字节，Linux上是KB
+    divisor = 1024 if sys.platform == 'darwin' else 1
+    return {
+        'self': _proc_peak_rss_kb() or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // divisor,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // divisor,
+    }
+
+
+def _make_result(files, total_bytes, seconds, latencies_by_format=None):
+    result = {
+        'files': files,
+        'bytes': total_bytes,
+        'seconds': seconds,
+        'files_per_sec': files / seconds if seconds > 0 else 0.0,
+        'mb_per_sec': total_bytes / seconds / (1024 * 1024) if seconds > 0 else 0.0,
+    }
+    if latencies_by_format is not None:
+        result['latency'] = {image_format: summarize_latencies(latencies)
+                             for image_format, latencies in sorted(latencies_by_format.items())}
+    return result
+
+
+def _time_per_file(corpus, output_dir, func, repeat):
+    """逐个文件调用func(输入, 输出)并记录耗时"""
+    latencies = {}
+    total_bytes = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for path, image_format in corpus:
+            output_path = os.path.join(output_dir, os.path.basename(path))
+            total_bytes += os.path.getsize(path)
+            file_started = time.perf_counter()
+            func(path, output_path)
+            latencies.setdefault(image_format, []).append(time.perf_counter() - file_started)
+    seconds = time.perf_counter() - started
+    return _make_result(len(corpus) * repeat, total_bytes, seconds, latencies)
+
+
+@contextlib.contextmanager
+def _discard_stdout():
+    """
+    测量期间丢弃处理器逐个文件打印的日志
+
+    重定向的是文件描述符1，进程池中的子进程启动时继承这一设置，输出同样被丢弃。
+    """
+    sys.stdout.flush()
+    saved_fd = os.dup(1)
+    devnull_fd = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull_fd, 1)
+    os.close(devnull_fd)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved_fd, 1)
+        os.close(saved_fd)
+
+
+def _png_streaming(input_path, output_path):
+    if not PNGBlockProcessor().process_png_streaming(input_path, output_path):
+        raise Exception("PNG块处理失败")
+
+
+def _jpeg_streaming(input_path, output_path):
+    if not JPEGSegmentProcessor().process_jpeg_streaming(input_path, output_path):
+        raise Exception("JPEG段处理失败")
+
+
+def _webp_streaming(input_path, output_path):
+    if not WebPChunkProcessor().process_webp_streaming(input_path, output_path):
+        raise Exception("WebP块处理失败")
+
+
+def _gif_streaming(input_path, output_path):
+    if not GIFBlockProcessor().process_gif_streaming(input_path, output_path):
+        raise Exception("GIF块处理失败")
+
+
+def _tiff_streaming(input_path, output_path):
+    if not TIFFProcessor().process_tiff_streaming(input_path, output_path):
+        raise Exception("TIFF块处理失败")
+
+
+def _process_image_file(input_path, output_path):
+    process_image_file(input_path, output_path)
+
+
+def _time_batch(input_paths, output_dir, executor_mode, jobs):
+    """用BatchRunner处理整个测试图片集并计时"""
+    total_bytes = sum(os.path.getsize(path) for path in input_paths)
+    runner = BatchRunner(input_paths, output_dir, keep_original_name=True,
+                         executor_mode=executor_mode, max_workers=jobs)
+    started = time.perf_counter()
+    stats = runner.run()
+    seconds = time.perf_counter() - started
+    result = _make_result(len(input_paths), total_bytes, seconds)
+    result['failed'] = stats['failed']
+    return result
+
+
+def _measure_in_child(connection, measure, args):
+    """子进程入口：运行一条处理路径，把结果连同本进程的峰值内存发回"""
+    result = measure(*args)
+    result['peak_rss_kb'] = peak_rss_kb()
+    connection.send(result)
+    connection.close()
+
+
+def _run_isolated(measure, *args):
+    """
+    在全新的子进程中运行measure(*args)并返回其结果
+
+    同一进程中依次运行各条路径时，ru_maxrss只会记录其中最大的一次，无法区分是哪条路径；
+    进程池模式下工作进程是这个子进程的子进程，计入children。
+    """
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_measure_in_child, args=(sender, measure, args))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = None
+    finally:
+        receiver.close()
+        process.join()
+    if result is None:
+        raise RuntimeError(f"基准测试子进程异常退出: {getattr(measure, '__name__', measure)} "
+                           f"(退出码{process.exitcode})")
+    return result
+
+
+def run_benchmarks(corpus, work_dir, jobs=None, repeat=1):
+    """
+    对测试图片集运行所有处理路径
+
+    Args:
+        corpus: generate_corpus返回的文件列表
+        work_dir: 存放输出文件的临时文件夹
+        jobs: 进程池模式的进程数，默认为CPU核心数
+        repeat: 单文件路径重复测量的次数
+
+    Returns:
+        dict: 各处理路径的测量结果，peak_rss_kb为该路径子进程的峰值内存
+    """
+    png_files = [item for item in corpus if item[1] == 'PNG']
+    jpeg_files = [item for item in corpus if item[1] == 'JPEG']
+    webp_files = [item for item in corpus if item[1] == 'WEBP']
+    gif_files = [item for item in corpus if item[1] == 'GIF']
+    tiff_files = [item for item in corpus if item[1] == 'TIFF']
+    non_png_files = [item for item in corpus if item[1] != 'PNG']
+
+    single_file_paths = [
+        ('png_streaming', png_files, _png_streaming),
+        ('jpeg_streaming', jpeg_files, _jpeg_streaming),
+        ('webp_streaming', webp_files, _webp_streaming),
+        ('gif_streaming', gif_files, _gif_streaming),
+        ('tiff_streaming', tiff_files, _tiff_streaming),
+        ('non_png_pil', non_png_files, process_non_png_image),
+        ('process_image_file', corpus, _process_image_file),
+    ]
+
+    results = {}
+    with _discard_stdout():
+        for name, files, func in single_file_paths:
+            if not files:
+                continue
+            output_dir = os.path.join(work_dir, name)
+            os.makedirs(output_dir, exist_ok=True)
+            results[name] = _run_isolated(_time_per_file, files, output_dir, func, repeat)
+
+        input_paths = [path for path, _ in corpus]
+        for name, executor_mode in (('batch_serial', BatchRunner.EXECUTOR_SERIAL),
+                                    ('batch_process', BatchRunner.EXECUTOR_PROCESS),
+                                    ('batch_pipeline', BatchRunner.EXECUTOR_PIPELINE)):
+            output_dir = os.path.join(work_dir, name)
+            os.makedirs(output_dir, exist_ok=True)
+            results[name] = _run_isolated(_time_batch, input_paths, output_dir, executor_mode, jobs)
+
+    return results
+
+
+def compare_to_baseline(report, baseline, tolerance=0.1):
+    """
+    与基准结果比较，找出吞吐量下降超过tolerance的处理路径
+
+    Args:
+        report: 本次测量结果
+        baseline: 保存的基准结果
+        tolerance: 允许下降的比例
+
+    Returns:
+        list: 性能下降的处理路径 [{'benchmark', 'baseline', 'current', 'change'}, ...]
+    """
+    regressions = []
+    for name, baseline_result in baseline.get('benchmarks', {}).items():
+        current_result = report['benchmarks'].get(name)
+        if current_result is None:
+            continue
+        before = baseline_result[BASELINE_METRIC]
+        after = current_result[BASELINE_METRIC]
+        if before > 0 and after < before * (1 - tolerance):
+            regressions.append({
+                'benchmark': name,
+                'baseline': before,
+                'current': after,
+                'change': after / before - 1,
+            })
+    return regressions
+
+
+def build_report(corpus, results, seed):
+    """汇总测量结果和运行环境"""
+    formats = {}
+    for path, image_format in corpus:
+        summary = formats.setdefault(image_format, {'files': 0, 'bytes': 0})
+        summary['files'] += 1
+        summary['bytes'] += os.path.getsize(path)
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'corpus': {'seed': seed, 'formats': formats},
+        'benchmarks': results,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='陈狗元数据去除工具 - 吞吐量基准测试')
+    parser.add_argument('--corpus', metavar='DIR',
+                        help='生成测试图片集的文件夹，默认使用临时文件夹')
+    parser.add_argument('--seed', type=int, default=0, help='生成测试图片集的随机种子 (默认: 0)')
+    parser.add_argument('--files-per-format', type=int, default=20, metavar='N',
+                        help='每种格式生成的文件数 (默认: 20)')
+    parser.add_argument('--max-dimension', type=int, default=1024, metavar='PX',
+                        help='生成的图片最大边长 (默认: 1024)')
+    parser.add_argument('--repeat', type=int, default=1, metavar='N',
+                        help='单文件处理路径重复测量的次数 (默认: 1)')
+    parser.add_argument('-j', '--jobs', type=int, metavar='N',
+                        help='进程池模式的进程数 (默认: CPU核心数)')
+    parser.add_argument('--output', metavar='REPORT',
+                        help='把JSON结果写入文件，默认输出到标准输出')
+    parser.add_argument('--baseline', metavar='BASELINE',
+                        help='与保存的基准结果比较，吞吐量下降超过阈值时退出码为1')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='允许的吞吐量下降比例 (默认: 0.1)')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix='chengou-benchmark-')
+    try:
+        corpus_dir = args.corpus or os.path.join(work_dir, 'corpus')
+        print(f"生成测试图片集: {corpus_dir}", file=sys.stderr)
+        corpus = generate_corpus(corpus_dir, seed=args.seed,
+                                 files_per_format=args.files_per_format,
+                                 max_dimension=args.max_dimension)
+
+        print("运行基准测试...", file=sys.stderr)
+        results = run_benchmarks(corpus, os.path.join(work_dir, 'output'),
+                                 jobs=args.jobs, repeat=args.repeat)
+        report = build_report(corpus, results, args.seed)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['regressions'] = compare_to_baseline(report, baseline, args.tolerance)
+        for regression in report['regressions']:
+            print(f"性能下降: {regression['benchmark']} "
+                  f"{regression['baseline']:.1f} -> {regression['current']:.1f} 文件/秒 "
+                  f"({regression['change']:+.1%})", file=sys.stderr)
+        if report['regressions']:
+            exit_code = 1
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+处理结果缓存
+以 (真实路径, 大小, 修改时间, inode) 标识输入文件，记录输出路径、输出摘要、移除的元数据和处理选项，
+重复以相同选项处理同一批未修改的文件时只需一次stat即可跳过
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+def default_cache_path():
+    """默认缓存数据库位置"""
+    if os.name == 'nt':
+        base_dir = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        return os.path.join(base_dir, 'ChenGouMetadata', 'result_cache.sqlite')
+
+    base_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base_dir, 'chengou-metadata', 'result_cache.sqlite')
+
+
+def options_fingerprint(**options):
+    """
+    生成处理选项的指纹，选项不同时产生的输出不同，缓存记录不能共用
+
+    Args:
+        **options: 影响输出内容的处理选项（值需能序列化为JSON）
+
+    Returns:
+        str: 按选项名排序的JSON字符串
+    """
+    return json.dumps(options, sort_keys=True)
+
+
+def file_digest(file_path):
+    """计算文件的SHA-256摘要"""
+    with open(file_path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+
+        digest = hashlib.sha256()
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+        return digest.hexdigest()
+
+
+class ResultCache:
+    """基于SQLite的处理结果缓存，超过容量时按最近使用时间淘汰"""
+
+    # 默认最多缓存的文件数
+    DEFAULT_MAX_ENTRIES = 1000000
+
+    # 每累计多少次写操作提交一次事务
+    COMMIT_INTERVAL = 500
+
+    def __init__(self, db_path=None, max_entries=DEFAULT_MAX_ENTRIES, use_content_hash=False):
+        """
+        Args:
+            db_path: 数据库文件路径，默认使用default_cache_path()
+            max_entries: 最多缓存的文件数
+            use_content_hash: 是否额外校验输入和输出文件的内容摘要（需要读取整个文件）
+        """
+        self.db_path = db_path or default_cache_path()
+        self.max_entries = max_entries
+        self.use_content_hash = use_content_hash
+        self._connection = None
+        self._pending_writes = 0
+        self._touched = []      # 命中的记录 (使用时间, 输入路径)，提交时统一更新
+        self._entry_count = 0   # 记录数，打开数据库时统计一次，之后随插入和淘汰更新
+
+    def lookup(self, input_path, output_path, options=None):
+        """
+        查询输入文件是否已经处理过且输出仍然有效
+
+        Args:
+            input_path: 输入文件路径
+            output_path: 输出文件路径
+            options: options_fingerprint()生成的处理选项指纹，必须与记录中的相同
+
+        Returns:
+            dict | None: 命中时返回缓存记录，否则返回None
+        """
+        identity = self._file_identity(input_path)
+        row = self._connect().execute(
+            'SELECT input_size, input_mtime_ns, input_inode, input_digest, output_path, '
+            'output_size, output_mtime_ns, output_digest, removed, options FROM results WHERE input_path = ?',
+            (identity['path'],)
+        ).fetchone()
+        if row is None:
+            return None
+
+        (input_size, input_mtime_ns, input_inode, input_digest, cached_output,
+         output_size, output_mtime_ns, output_digest, removed, cached_options) = row
+
+        # 输入文件必须未被修改
+        if (input_size, input_mtime_ns, input_inode) != \
+                (identity['size'], identity['mtime_ns'], identity['inode']):
+            return None
+
+        # 以不同选项（例如是否去除ICC）处理的结果不能复用
+        if cached_options != options:
+            return None
+
+        # 输出文件必须仍然存在且未被修改
+        if cached_output != os.path.abspath(output_path):
+            return None
+        try:
+            output_stat = os.stat(output_path)
+        except OSError:
+            return None
+        if (output_stat.st_size, output_stat.st_mtime_ns) != (output_size, output_mtime_ns):
+            return None
+
+        if self.use_content_hash:
+            if input_digest is None or file_digest(input_path) != input_digest:
+                return None
+            if output_digest is None or file_digest(output_path) != output_digest:
+                return None
+
+        # 最近使用时间在提交时批量更新，命中时不单独写数据库
+        self._touched.append((time.time(), identity['path']))
+        if len(self._touched) >= self.COMMIT_INTERVAL:
+            self._commit()
+
+        return {
+            'output_path': cached_output,
+            'output_digest': output_digest,
+            'removed': json.loads(removed)
+        }
+
+    def store(self, input_path, output_path, removed=(), options=None):
+        """记录一个处理成功的文件，options为options_fingerprint()生成的处理选项指纹"""
+        identity = self._file_identity(input_path)
+        output_stat = os.stat(output_path)
+        input_digest = output_digest = None
+        if self.use_content_hash:
+            input_digest = file_digest(input_path)
+            output_digest = file_digest(output_path)
+
+        values = (identity['size'], identity['mtime_ns'], identity['inode'], input_digest,
+                  os.path.abspath(output_path), output_stat.st_size, output_stat.st_mtime_ns, output_digest,
+                  json.dumps(list(removed)), options, time.time(), identity['path'])
+        # 先尝试插入，已有记录时再更新，这样才能知道记录数是否增加
+        connection = self._connect()
+        cursor = connection.execute(
+            'INSERT OR IGNORE INTO results (input_size, input_mtime_ns, input_inode, input_digest, '
+            'output_path, output_size, output_mtime_ns, output_digest, removed, options, last_used, '
+            'input_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            values
+        )
+        if cursor.rowcount:
+            self._entry_count += 1
+        else:
+            connection.execute(
+                'UPDATE results SET input_size = ?, input_mtime_ns = ?, input_inode = ?, input_digest = ?, '
+                'output_path = ?, output_size = ?, output_mtime_ns = ?, output_digest = ?, removed = ?, '
+                'options = ?, last_used = ? WHERE input_path = ?',
+                values
+            )
+        self._after_write()
+
+    def close(self):
+        """提交未完成的事务并关闭数据库"""
+        if self._connection is None:
+            return
+        self._commit()
+        self._connection.close()
+        self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _connect(self):
+        """首次使用时才打开数据库，便于在处理线程中使用"""
+        if self._connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'input_path TEXT PRIMARY KEY, input_size INTEGER, input_mtime_ns INTEGER, '
+                'input_inode INTEGER, input_digest TEXT, output_path TEXT, output_size INTEGER, '
+                'output_mtime_ns INTEGER, output_digest TEXT, removed TEXT, options TEXT, last_used REAL)'
+            )
+            # 旧版本的数据库没有options列，补上后旧记录的选项为NULL，不会命中
+            columns = {row[1] for row in self._connection.execute('PRAGMA table_info(results)')}
+            if 'options' not in columns:
+                self._connection.execute('ALTER TABLE results ADD COLUMN options TEXT')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)'
+            )
+            self._entry_count = self._connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        return self._connection
+
+    def _file_identity(self, file_path):
+        """获取输入文件的标识"""
+        real_path = os.path.realpath(file_path)
+        file_stat = os.stat(real_path)
+        return {
+            'path': real_path,
+            'size': file_stat.st_size,
+            'mtime_ns': file_stat.st_mtime_ns,
+            'inode': file_stat.st_ino,
+        }
+
+    def _after_write(self):
+        """累计写操作，定期淘汰并提交"""
+        self._pending_writes += 1
+        if self._pending_writes >= self.COMMIT_INTERVAL:
+            self._commit()
+
+    def _commit(self):
+        """批量更新命中记录的最近使用时间，淘汰超出容量的记录后提交"""
+        if self._touched:
+            self._connection.executemany('UPDATE results SET last_used = ? WHERE input_path = ?',
+                                         self._touched)
+            self._touched.clear()
+        self._evict()
+        self._connection.commit()
+        self._pending_writes = 0
+
+    def _evict(self):
+        """超过容量时删除最久未使用的记录，使用维护的记录数，不必每次提交都统计整个表"""
+        excess = self._entry_count - self.max_entries
+        if excess <= 0:
+            return
+        cursor = self._connection.execute(
+            'DELETE FROM results WHERE input_path IN '
+            '(SELECT input_path FROM results ORDER BY last_used LIMIT ?)',
+            (excess,)
+        )
+        self._entry_count -= cursor.rowcount
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+陈狗元数据去除工具 - 命令行模式
+无界面批量处理，整个调用链不导入PyQt5，适合在没有显示服务的服务器上运行
+
+用法:
+    python -m cli strip IN... -o OUT [--jobs N] [--rename] [--clean-strategy MODE] [--no-cache]
+    python -m cli strip IN... --in-place [--fsync none|file|full]
+    python -m cli strip IN... -o OUT --pipeline [--pipeline-budget MB]
+    python -m cli strip IN... -o OUT --journal PATH [--resume]
+    python -m cli watch IN_DIR... -o OUT [--jobs N] [--interval SECONDS] [--settle SECONDS]
+    python -m cli audit IN... [--jobs N] [-r] [--files-jsonl PATH]
+    python -m cli manifest create DIR IN... -o OUT|--in-place [--shard-size N]
+    python -m cli manifest work DIR [--jobs N] [--stale-after SECONDS]
+    python -m cli manifest merge DIR
+"""
+
+import argparse
+import contextlib
+import functools
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from audit import AuditLog, run_audit
+from batch import BatchRunner
+from cache import ResultCache
+from file_walker import iter_image_files
+from watcher import FolderWatcher, watch_folders
+from processors import CLEAN_STRATEGIES, CLEAN_COPY
+from atomic import FSYNC_POLICIES, FSYNC_NONE, FSYNC_FILE
+from journal import BatchJournal, default_journal_path
+from manifest import (DEFAULT_SHARD_SIZE, DEFAULT_STALE_AFTER, ShardWorker, create_manifest,
+                      merge_results)
+from limits import DEFAULT_MAX_CHUNK_LENGTH, DEFAULT_MAX_CHUNKS, ResourceLimits
+from pipeline import DEFAULT_BUDGET_BYTES
+from timing import PROFILE_HOOKS
+
+
+def collect_input_files(inputs, recursive=False):
+    """展开输入参数：文件直接加入，文件夹只收集其中支持的图片文件"""
+    image_paths = []
+    for input_path in inputs:
+        if os.path.isdir(input_path):
+            image_paths.extend(iter_image_files([input_path], recursive=recursive))
+        else:
+            image_paths.append(input_path)
+    return image_paths
+
+
+@contextlib.contextmanager
+def report_stream():
+    """
+    获取用于输出统计结果的标准输出
+
+    处理器会打印进度信息，这里在处理期间把文件描述符1重定向到标准错误，
+    让进程池中的子进程也继承这一设置，保证标准输出只包含JSON结果。
+    """
+    sys.stdout.flush()
+    saved_fd = os.dup(1)
+    os.dup2(2, 1)
+    try:
+        with os.fdopen(os.dup(saved_fd), 'w', encoding='utf-8') as report:
+            yield report
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved_fd, 1)
+        os.close(saved_fd)
+
+
+def build_runner_options(args):
+    """根据公共处理参数生成BatchRunner的参数"""
+    if args.pipeline:
+        executor_mode = BatchRunner.EXECUTOR_PIPELINE
+    elif args.jobs > 1:
+        executor_mode = BatchRunner.EXECUTOR_PROCESS
+    else:
+        executor_mode = BatchRunner.EXECUTOR_SERIAL
+
+    cache = None
+    if not args.no_cache:
+        cache = ResultCache(args.cache_path, max_entries=args.cache_max_entries,
+                            use_content_hash=args.cache_hash)
+
+    profile_hook = None
+    if args.profile:
+        profile_hook = functools.partial(PROFILE_HOOKS[args.profile],
+                                         args.profile_output or f"{args.profile}.out")
+
+    max_output_bytes = None
+    if args.max_output_mb is not None:
+        max_output_bytes = int(args.max_output_mb * 1024 * 1024)
+    limits = ResourceLimits(args.max_chunk_length, args.max_chunks, max_output_bytes, args.timeout)
+
+    return {
+        'executor_mode': executor_mode,
+        'max_workers': args.jobs,
+        'clean_strategy': args.clean_strategy,
+        'strip_icc': args.strip_icc,
+        'cache': cache,
+        'collect_timings': args.timings,
+        'timings_path': args.timings_jsonl,
+        'profile_hook': profile_hook,
+        'fsync': args.fsync,
+        'pipeline_budget': args.pipeline_budget * 1024 * 1024,
+        'limits': limits,
+    }
+
+
+def command_strip(args):
+    """strip子命令：批量移除元数据并输出统计结果"""
+    image_paths = collect_input_files(args.inputs, recursive=args.recursive)
+    if not args.in_place:
+        os.makedirs(args.output, exist_ok=True)
+
+    journal = None
+    if args.journal or args.resume:
+        # 原地处理默认同步输出文件，日志也同步到磁盘，断电后不会把未落盘的文件记为完成
+        fsync = args.fsync or (FSYNC_FILE if args.in_place else FSYNC_NONE)
+        journal = BatchJournal(args.journal or default_journal_path(), resume=args.resume,
+                               fsync=fsync != FSYNC_NONE)
+
+    runner = BatchRunner(
+        image_paths,
+        args.output,
+        keep_original_name=not args.rename,
+        in_place=args.in_place,
+        journal=journal,
+        **build_runner_options(args)
+    )
+
+    with report_stream() as report:
+        stats = runner.run()
+        json.dump(stats, report, ensure_ascii=False, indent=2 if args.pretty else None)
+        report.write('\n')
+
+    return 0 if stats['failed'] == 0 else 1
+
+
+def command_watch(args):
+    """watch子命令：持续监视文件夹，每处理完一批文件输出一行JSON统计结果"""
+    os.makedirs(args.output, exist_ok=True)
+
+    watcher = FolderWatcher(
+        args.inputs,
+        recursive=not args.no_recursive,
+        settle_time=args.settle,
+        exclude_dirs=[args.output],
+        process_existing=not args.skip_existing
+    )
+    options = build_runner_options(args)
+
+    # 多进程模式下整个监视期间共用一个进程池，避免每批文件重新启动工作进程
+    executor = None
+    if options['executor_mode'] == BatchRunner.EXECUTOR_PROCESS:
+        executor = ProcessPoolExecutor(max_workers=args.jobs,
+                                       mp_context=multiprocessing.get_context('spawn'))
+        options['executor'] = executor
+
+    with report_stream() as report:
+        def report_batch(stats):
+            json.dump(stats, report, ensure_ascii=False)
+            report.write('\n')
+            report.flush()
+
+        try:
+            watch_folders(watcher, args.output, interval=args.interval,
+                          batch_callback=report_batch, **options)
+        except KeyboardInterrupt:
+            print("监视已停止", file=sys.stderr)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    return 0
+
+
+def command_audit(args):
+    """audit子命令：只统计元数据，不写入任何图片文件"""
+    image_paths = collect_input_files(args.inputs, recursive=args.recursive)
+
+    audit_log = AuditLog(args.files_jsonl) if args.files_jsonl else None
+    try:
+        with report_stream() as report:
+            summary = run_audit(image_paths, max_workers=args.jobs,
+                                file_callback=audit_log.write if audit_log is not None else None)
+            json.dump(summary, report, ensure_ascii=False, indent=2 if args.pretty else None)
+            report.write('\n')
+    finally:
+        if audit_log is not None:
+            audit_log.close()
+
+    return 0 if summary['failed'] == 0 else 1
+
+
+def add_processing_arguments(parser, output_group=None, include_output=True):
+    """添加strip、watch和manifest work共用的处理参数，output_group为-o所属的互斥参数组"""
+    if include_output:
+        (output_group or parser).add_argument('-o', '--output', required=output_group is None, metavar='OUT',
+                                              help='输出文件夹')
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                        help='并行进程数 (默认: 1)')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='预读后面的文件并在后台写入结果，读写与处理重叠执行，适合网络盘等高延迟存储'
+                             '（忽略--jobs）')
+    parser.add_argument('--pipeline-budget', type=int, default=DEFAULT_BUDGET_BYTES // (1024 * 1024),
+                        metavar='MB', help='流水线模式下预读和待写入的文件合计占用的内存上限 (默认: 64)')
+    parser.add_argument('--clean-strategy', choices=CLEAN_STRATEGIES, default=CLEAN_COPY,
+                        help='不含元数据的文件的输出方式: rewrite逐块重写, copy整个复制, '
+                             'hardlink同一文件系统时创建硬链接 (默认: copy)')
+    parser.add_argument('--strip-icc', action='store_true',
+                        help='同时去除WebP、GIF和TIFF中的ICC颜色配置（默认保留）')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='不使用结果缓存，重新处理所有文件')
+    parser.add_argument('--cache-path', metavar='PATH',
+                        help='结果缓存数据库路径')
+    parser.add_argument('--cache-max-entries', type=int, default=ResultCache.DEFAULT_MAX_ENTRIES,
+                        metavar='N', help='结果缓存最多记录的文件数，超出时淘汰最久未使用的记录')
+    parser.add_argument('--cache-hash', action='store_true',
+                        help='缓存命中时额外校验文件内容摘要（需要读取整个文件）')
+    parser.add_argument('--timings', action='store_true',
+                        help='记录每个文件各处理阶段的耗时，直方图输出到统计结果的timings字段')
+    parser.add_argument('--timings-jsonl', metavar='PATH',
+                        help='把每个文件的阶段耗时逐行追加到JSONL文件（同时开启--timings）')
+    parser.add_argument('--profile', choices=sorted(PROFILE_HOOKS),
+                        help='用cProfile或tracemalloc分析整批处理（进程池模式下只分析主进程）')
+    parser.add_argument('--profile-output', metavar='PATH',
+                        help='分析结果的输出路径 (默认: cprofile.out / tracemalloc.out)')
+    parser.add_argument('--fsync', choices=FSYNC_POLICIES,
+                        help='输出文件同步到磁盘的方式: none不主动同步, file同步文件数据, '
+                             'full同时同步所在目录 (默认: 原地处理时为file，否则为none)')
+    parser.add_argument('--max-chunk-length', type=int, default=DEFAULT_MAX_CHUNK_LENGTH, metavar='BYTES',
+                        help='单个块/段声明的最大数据长度，超出时该文件失败 (默认: 2^31-1)')
+    parser.add_argument('--max-chunks', type=int, default=DEFAULT_MAX_CHUNKS, metavar='N',
+                        help=f'单个文件最多的块/段/标签数，超出时该文件失败 (默认: {DEFAULT_MAX_CHUNKS})')
+    parser.add_argument('--max-output-mb', type=float, metavar='MB',
+                        help='单个输出文件的最大大小，超出时删除输出并记为失败（默认不限制）')
+    parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                        help='单个文件的最长处理时间，超出时该文件失败（默认不限制）')
+
+
+def command_manifest_create(args):
+    """manifest create子命令：把输入文件切分为分片写入共享目录"""
+    image_paths = collect_input_files(args.inputs, recursive=args.recursive)
+    if not args.in_place:
+        os.makedirs(args.output, exist_ok=True)
+    manifest = create_manifest(args.dir, image_paths, output_dir=args.output, in_place=args.in_place,
+                               shard_size=args.shard_size)
+    print(f"已创建清单: {manifest['total_files']}个文件，{manifest['shards']}个分片", file=sys.stderr)
+    return 0
+
+
+def command_manifest_work(args):
+    """manifest work子命令：领取并处理分片，每完成一个分片输出一行JSON统计结果"""
+    options = build_runner_options(args)
+
+    # 多进程模式下所有分片共用一个进程池
+    executor = None
+    if options['executor_mode'] == BatchRunner.EXECUTOR_PROCESS:
+        executor = ProcessPoolExecutor(max_workers=args.jobs,
+                                       mp_context=multiprocessing.get_context('spawn'))
+        options['executor'] = executor
+
+    worker = ShardWorker(args.dir, options, stale_after=args.stale_after)
+    with report_stream() as report:
+        def report_shard(index, stats):
+            json.dump(stats, report, ensure_ascii=False)
+            report.write('\n')
+            report.flush()
+
+        try:
+            processed = worker.run(max_shards=args.max_shards, shard_callback=report_shard)
+            print(f"本进程处理了{len(processed)}个分片", file=sys.stderr)
+        except KeyboardInterrupt:
+            worker.stop()
+            print("已停止，未完成的分片将由其他进程处理", file=sys.stderr)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+                # 超时终止工作进程后重建的进程池
+                replacement = worker.runner_options['executor']
+                if replacement is not executor:
+                    replacement.shutdown(wait=True, cancel_futures=True)
+
+    return 0
+
+
+def command_manifest_merge(args):
+    """manifest merge子命令：合并所有分片的统计结果"""
+    with report_stream() as report:
+        stats = merge_results(args.dir)
+        json.dump(stats, report, ensure_ascii=False, indent=2 if args.pretty else None)
+        report.write('\n')
+
+    return 0 if stats['failed'] == 0 and not stats['pending_shards'] else 1
+
+
+def build_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(
+        prog='python -m cli',
+        description='陈狗元数据去除工具 - 命令行模式'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    strip_parser = subparsers.add_parser('strip', help='移除图片元数据')
+    strip_parser.add_argument('inputs', nargs='+', metavar='IN',
+                              help='输入图片文件或文件夹')
+    output_group = strip_parser.add_mutually_exclusive_group(required=True)
+    add_processing_arguments(strip_parser, output_group)
+    output_group.add_argument('--in-place', action='store_true',
+                              help='原地处理：写入同一目录下的临时文件后原子替换原文件，保留权限和时间戳')
+    strip_parser.add_argument('-r', '--recursive', action='store_true',
+                              help='递归处理输入文件夹的子文件夹')
+    strip_parser.add_argument('--rename', action='store_true',
+                              help='使用时间戳命名输出文件，而不是保留原始文件名')
+    strip_parser.add_argument('--pretty', action='store_true',
+                              help='格式化输出JSON统计结果')
+    strip_parser.add_argument('--journal', metavar='PATH',
+                              help='把每个文件的处理结果追加到JSONL日志，中断后可以用--resume继续')
+    strip_parser.add_argument('--resume', action='store_true',
+                              help='继续上次中断的任务，跳过日志中已完成的文件（未指定--journal时使用默认日志位置）')
+    strip_parser.set_defaults(func=command_strip)
+
+    watch_parser = subparsers.add_parser('watch', help='持续监视文件夹并处理新增或修改的图片')
+    watch_parser.add_argument('inputs', nargs='+', metavar='IN_DIR',
+                              help='需要监视的文件夹')
+    add_processing_arguments(watch_parser)
+    watch_parser.add_argument('--interval', type=float, default=1.0, metavar='SECONDS',
+                              help='轮询间隔秒数 (默认: 1.0)')
+    watch_parser.add_argument('--settle', type=float, default=1.0, metavar='SECONDS',
+                              help='文件最后修改后等待多少秒才处理，避免处理写入中的文件 (默认: 1.0)')
+    watch_parser.add_argument('--no-recursive', action='store_true',
+                              help='不监视子文件夹')
+    watch_parser.add_argument('--skip-existing', action='store_true',
+                              help='不处理启动时已经存在的文件')
+    watch_parser.set_defaults(func=command_watch)
+
+    audit_parser = subparsers.add_parser('audit', help='统计图片中的元数据，不写入任何文件')
+    audit_parser.add_argument('inputs', nargs='+', metavar='IN',
+                              help='输入图片文件或文件夹')
+    audit_parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                              help='并行进程数 (默认: 1)')
+    audit_parser.add_argument('-r', '--recursive', action='store_true',
+                              help='递归处理输入文件夹的子文件夹')
+    audit_parser.add_argument('--files-jsonl', metavar='PATH',
+                              help='把每个文件中的元数据类型、关键字和字节数逐行追加到JSONL文件')
+    audit_parser.add_argument('--pretty', action='store_true',
+                              help='格式化输出JSON统计结果')
+    audit_parser.set_defaults(func=command_audit)
+
+    manifest_parser = subparsers.add_parser('manifest', help='把一批文件切分为分片，由多台主机共同处理')
+    manifest_subparsers = manifest_parser.add_subparsers(dest='manifest_command', required=True)
+
+    create_parser = manifest_subparsers.add_parser('create', help='把输入文件切分为分片写入共享目录')
+    create_parser.add_argument('dir', metavar='DIR', help='所有主机都能访问的共享目录')
+    create_parser.add_argument('inputs', nargs='+', metavar='IN',
+                               help='输入图片文件或文件夹（各主机上的路径必须相同）')
+    create_output_group = create_parser.add_mutually_exclusive_group(required=True)
+    create_output_group.add_argument('-o', '--output', metavar='OUT',
+                                     help='输出文件夹（使用原始文件名）')
+    create_output_group.add_argument('--in-place', action='store_true',
+                                     help='原地处理：写入临时文件后原子替换原文件')
+    create_parser.add_argument('-r', '--recursive', action='store_true',
+                               help='递归处理输入文件夹的子文件夹')
+    create_parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE, metavar='N',
+                               help=f'每个分片的文件数 (默认: {DEFAULT_SHARD_SIZE})')
+    create_parser.set_defaults(func=command_manifest_create)
+
+    work_parser = manifest_subparsers.add_parser('work', help='领取并处理分片，直到没有剩余的分片')
+    work_parser.add_argument('dir', metavar='DIR', help='manifest create使用的共享目录')
+    add_processing_arguments(work_parser, include_output=False)
+    work_parser.add_argument('--stale-after', type=float, default=DEFAULT_STALE_AFTER, metavar='SECONDS',
+                             help='锁文件超过多少秒未更新时视为领取它的进程已经退出，重新领取该分片 '
+                                  f'(默认: {DEFAULT_STALE_AFTER:g})')
+    work_parser.add_argument('--max-shards', type=int, metavar='N',
+                             help='本进程最多处理的分片数（默认不限制）')
+    work_parser.set_defaults(func=command_manifest_work)
+
+    merge_parser = manifest_subparsers.add_parser('merge', help='合并所有分片的统计结果')
+    merge_parser.add_argument('dir', metavar='DIR', help='manifest create使用的共享目录')
+    merge_parser.add_argument('--pretty', action='store_true',
+                              help='格式化输出JSON统计结果')
+    merge_parser.set_defaults(func=command_manifest_merge)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
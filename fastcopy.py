@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+零拷贝文件范围复制
+优先使用内核态复制 (copy_file_range / sendfile)，数据不经过Python对象；
+不支持时退回到复用同一个缓冲区的readinto循环
+"""
+
+import contextlib
+import errno
+import io
+import mmap
+import os
+import shutil
+
+
+# 退回方案使用的缓冲区大小
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# 有处理时间限制时，每复制这么多字节检查一次是否超时
+TIMED_COPY_STEP = 16 * 1024 * 1024
+
+# 这些错误表示当前文件系统或平台不支持该系统调用，应换用下一种方式
+_UNSUPPORTED_ERRNOS = {
+    errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EBADF,
+    errno.ENOTSUP, errno.EOPNOTSUPP, errno.ENOTSOCK, errno.EPERM,
+}
+
+
+def merge_ranges(ranges):
+    """合并首尾相接的字节范围，减少系统调用次数"""
+    merged = []
+    for offset, length in ranges:
+        if length <= 0:
+            continue
+        if merged and merged[-1][0] + merged[-1][1] == offset:
+            merged[-1][1] += length
+        else:
+            merged.append([offset, length])
+    return [(offset, length) for offset, length in merged]
+
+
+def copy_ranges(input_file, output_file, ranges, limits=None):
+    """
+    把输入文件中的若干字节范围依次追加写入输出文件
+
+    Args:
+        input_file: 以二进制模式打开的输入文件
+        output_file: 以二进制模式打开的输出文件，从当前位置开始写入
+        ranges: (偏移, 长度) 列表
+        limits: 可选的ResourceLimits，设置了截止时间时分段复制，每段之后检查是否超时
+
+    Returns:
+        int: 写入的总字节数
+    """
+    ranges = merge_ranges(ranges)
+    total = sum(length for _, length in ranges)
+
+    # 先把输出文件缓冲区中的数据落到文件描述符上，再直接操作描述符
+    output_file.flush()
+    try:
+        in_fd = input_file.fileno()
+        out_fd = output_file.fileno()
+    except (AttributeError, OSError, ValueError):
+        # 内存文件等没有文件描述符的对象
+        _copy_ranges_buffered(input_file, output_file, ranges, limits)
+        return total
+
+    out_offset = output_file.tell()
+    for offset, length in ranges:
+        _copy_range_fd(input_file, output_file, in_fd, out_fd, offset, length, out_offset, limits)
+        out_offset += length
+
+    # 系统调用绕过了Python的文件对象，需要同步文件位置
+    output_file.seek(out_offset)
+    return total
+
+
+def _copy_range_fd(input_file, output_file, in_fd, out_fd, offset, length, out_offset, limits=None):
+    """复制单个字节范围，依次尝试copy_file_range、sendfile和缓冲区复制"""
+    copied = 0
+    timed = limits is not None and limits.deadline is not None
+    step = TIMED_COPY_STEP if timed else length
+
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while copied < length:
+                n = os.copy_file_range(in_fd, out_fd, min(length - copied, step),
+                                       offset + copied, out_offset + copied)
+                if n == 0:
+                    raise ValueError("输入文件数据不完整")
+                copied += n
+                if timed:
+                    limits.check_time()
+            return
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+
+    if hasattr(os, 'sendfile'):
+        try:
+            os.lseek(out_fd, out_offset + copied, os.SEEK_SET)
+            while copied < length:
+                n = os.sendfile(out_fd, in_fd, offset + copied, min(length - copied, step))
+                if n == 0:
+                    raise ValueError("输入文件数据不完整")
+                copied += n
+                if timed:
+                    limits.check_time()
+            return
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+
+    output_file.seek(out_offset + copied)
+    _copy_ranges_buffered(input_file, output_file, [(offset + copied, length - copied)], limits)
+    output_file.flush()
+
+
+def _copy_ranges_buffered(input_file, output_file, ranges, limits=None):
+    """使用单个复用缓冲区和readinto复制，不为每块数据创建新的bytes对象"""
+    if isinstance(input_file, io.BytesIO):
+        # 已经读入内存的文件直接写出对应的切片
+        with memoryview(input_file.getvalue()) as view:
+            for offset, length in ranges:
+                if offset + length > len(view):
+                    raise ValueError("输入文件数据不完整")
+                output_file.write(view[offset:offset + length])
+                if limits is not None:
+                    limits.check_time()
+        return
+
+    buffer = bytearray(min(COPY_BUFFER_SIZE, max((length for _, length in ranges), default=0)))
+    view = memoryview(buffer)
+
+    for offset, length in ranges:
+        input_file.seek(offset)
+        remaining = length
+        while remaining > 0:
+            n = input_file.readinto(view[:min(remaining, len(buffer))])
+            if not n:
+                raise ValueError("输入文件数据不完整")
+            output_file.write(view[:n])
+            remaining -= n
+            if limits is not None:
+                limits.check_time()
+
+
+def file_size(input_file):
+    """已打开文件的大小，也支持流水线模式中已经读入内存的文件(BytesIO)"""
+    if isinstance(input_file, io.BytesIO):
+        return len(input_file.getvalue())
+    return os.fstat(input_file.fileno()).st_size
+
+
+@contextlib.contextmanager
+def map_file(input_file):
+    """只读映射整个输入文件；已经读入内存的文件直接返回其内容，不再复制"""
+    if isinstance(input_file, io.BytesIO):
+        yield input_file.getvalue()
+    else:
+        with mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+def unlink_output(output_path):
+    """
+    删除输出位置上已有的文件
+
+    已有的输出可能是上一次以硬链接方式生成的，与某个输入文件共享数据，
+    直接以'wb'打开会截断并改写那个输入文件，因此写入前先删除目录项再新建文件。
+    """
+    try:
+        os.unlink(output_path)
+    except FileNotFoundError:
+        pass
+
+
+def open_output(output):
+    """
+    打开输出文件，路径上已有的文件先删除再新建（见unlink_output）
+
+    Args:
+        output: 输出文件路径，或已经打开的可写文件对象（例如流水线模式的内存缓冲区）
+
+    Returns:
+        上下文管理器，文件对象由调用方传入时不会被关闭
+    """
+    if hasattr(output, 'write'):
+        return contextlib.nullcontext(output)
+    unlink_output(output)
+    return open(output, 'wb')
+
+
+@contextlib.contextmanager
+def buffered_reader(input_file):
+    """为无缓冲的输入文件临时套上读缓冲区，退出时分离而不关闭原文件"""
+    if isinstance(input_file, io.BufferedIOBase):
+        yield input_file
+        return
+    reader = io.BufferedReader(input_file)
+    try:
+        yield reader
+    finally:
+        reader.detach()
+
+
+def copy_file(input_path, output_path, input_file=None):
+    """
+    整个文件复制，优先使用copy_file_range（支持时可由文件系统直接克隆数据块）
+
+    Args:
+        input_path: 输入文件路径
+        output_path: 输出文件路径
+        input_file: 已经打开的输入文件，传入时直接从中复制，不再重新打开
+
+    Returns:
+        int: 复制的字节数
+    """
+    if input_file is not None:
+        with open_output(output_path) as output_file:
+            file_size = os.fstat(input_file.fileno()).st_size
+            return copy_ranges(input_file, output_file, [(0, file_size)])
+
+    if not hasattr(os, 'copy_file_range'):
+        unlink_output(output_path)
+        shutil.copyfile(input_path, output_path)
+        return os.path.getsize(output_path)
+
+    with open(input_path, 'rb', buffering=0) as input_file, \
+         open_output(output_path) as output_file:
+        file_size = os.fstat(input_file.fileno()).st_size
+        return copy_ranges(input_file, output_file, [(0, file_size)])
+
+
+def link_or_copy_file(input_path, output_path, allow_hardlink=False, input_file=None):
+    """
+    为内容不需要修改的文件生成输出：同一文件系统且允许时创建硬链接，否则整个复制
+
+    注意硬链接与原文件共享数据，修改其中一个会影响另一个，因此需要调用方明确允许。
+    传入已经打开的input_file时，复制直接使用该文件；output_path也可以是可写的文件对象，此时只能复制。
+
+    Returns:
+        str: 实际使用的方式 ('hardlink' 或 'copy')
+    """
+    if hasattr(output_path, 'write'):
+        copy_ranges(input_file, output_path, [(0, file_size(input_file))])
+        return 'copy'
+
+    if allow_hardlink and hasattr(os, 'link'):
+        input_stat = os.stat(input_path)
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        if os.stat(output_dir).st_dev == input_stat.st_dev:
+            try:
+                output_stat = os.stat(output_path)
+            except FileNotFoundError:
+                output_stat = None
+
+            if output_stat is not None and os.path.samestat(input_stat, output_stat):
+                # 输出已经是同一个文件
+                return 'hardlink'
+
+            try:
+                if output_stat is not None:
+                    os.unlink(output_path)
+                os.link(input_path, output_path)
+                return 'hardlink'
+            except OSError:
+                # 文件系统不支持硬链接等情况，退回到复制
+                pass
+
+    copy_file(input_path, output_path, input_file=input_file)
+    return 'copy'
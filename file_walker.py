@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片文件收集
+基于os.scandir递归遍历文件夹，按扩展名或文件头识别图片，不依赖Qt
+"""
+
+import os
+
+import processors  # 导入时注册内置的格式处理器
+from formats import HEADER_SIZE, find_handler, supported_extensions
+
+
+def has_image_magic(path):
+    """读取文件头判断是否为已注册处理器支持的图片格式"""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+    except OSError:
+        return False
+    return find_handler(header, use_fallback=False) is not None
+
+
+def is_image_file(path, sniff_magic=False):
+    """按扩展名判断是否为图片，sniff_magic为True时扩展名不匹配的文件再检查文件头"""
+    _, ext = os.path.splitext(path)
+    if ext.lower() in supported_extensions():
+        return True
+    return sniff_magic and has_image_magic(path)
+
+
+def iter_image_files(paths, recursive=True, sniff_magic=False, should_stop=None):
+    """
+    遍历文件和文件夹，逐个返回图片文件路径
+
+    Args:
+        paths: 文件或文件夹路径列表
+        recursive: 是否进入子文件夹
+        sniff_magic: 扩展名不匹配时是否读取文件头识别
+        should_stop: 可选的回调，返回True时停止遍历
+
+    Yields:
+        str: 图片文件路径
+    """
+    for path in paths:
+        if should_stop is not None and should_stop():
+            return
+
+        if not os.path.isdir(path):
+            if os.path.isfile(path) and is_image_file(path, sniff_magic):
+                yield path
+            continue
+
+        # 使用栈代替递归，避免很深的目录层级导致递归过深
+        stack = [path]
+        while stack:
+            if should_stop is not None and should_stop():
+                return
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    subdirs = []
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(entry.path)
+                            elif entry.is_file() and is_image_file(entry.path, sniff_magic):
+                                yield entry.path
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+            if recursive:
+                # 逆序压栈，使子文件夹按目录中的顺序处理
+                stack.extend(reversed(subdirs))
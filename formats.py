@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片格式注册表
+每种格式的处理器声明自己的文件头特征和扩展名，处理时只读取一次文件头就能选出处理器，
+并把已经打开的文件交给处理器，不再为判断格式和处理分别打开文件，不依赖Qt
+"""
+
+import abc
+
+from limits import DEFAULT_LIMITS
+from timing import NULL_TIMER
+
+
+# 识别格式需要读取的文件头长度（WebP需要12字节）
+HEADER_SIZE = 12
+
+
+class UnsupportedStructureError(Exception):
+    """文件结构有效，但处理器无法按块重写（例如TIFF的SubIFDs），调用方可以改用PIL重新编码"""
+
+
+class FormatHandler(abc.ABC):
+    """
+    格式处理器基类
+
+    子类设置name、magic和extensions并实现process，然后用register_handler注册。
+    """
+
+    # 处理结果中的格式名称
+    name = None
+
+    # 文件头前缀，匹配其中任意一个即识别为该格式；需要更复杂判断时重写matches
+    magic = ()
+
+    # 文件夹扫描和文件选择对话框使用的扩展名
+    extensions = ()
+
+    def matches(self, header: bytes) -> bool:
+        """判断文件头是否属于该格式"""
+        return header.startswith(self.magic) if self.magic else False
+
+    @abc.abstractmethod
+    def process(self, input_file, image_path: str, output_path: str, clean_strategy: str,
+                strip_icc: bool = False, timer=NULL_TIMER, limits=DEFAULT_LIMITS) -> dict:
+        """
+        处理已经打开的文件
+
+        Args:
+            input_file: 以无缓冲二进制模式打开的输入文件，读取位置在文件开头
+            image_path: 输入文件路径（用于创建硬链接等需要路径的操作）
+            output_path: 输出文件路径
+            clean_strategy: 不含元数据的文件的输出方式
+            strip_icc: 是否同时去除ICC颜色配置
+            timer: 记录各阶段耗时的StageTimer
+            limits: 当前文件的ResourceLimits，遍历块和复制数据时用于检查块长度、块数量和处理时间
+
+        Returns:
+            dict: 处理结果，格式见processors.process_image_file
+
+        Raises:
+            Exception: 处理失败时抛出
+        """
+
+    def audit(self, input_file):
+        """
+        列出文件中处理时会被去除的元数据，不写入任何文件
+
+        Args:
+            input_file: 以无缓冲二进制模式打开的输入文件
+
+        Returns:
+            list | None: [(类型, 关键字, 字节数), ...]，关键字为PNG文本块的关键字、
+                含GPS信息的EXIF为'GPS'，没有时为None；不支持逐块审计的格式返回None
+
+        Raises:
+            Exception: 文件结构损坏时抛出
+        """
+        return None
+
+
+_handlers = []
+_fallback_handler = None
+
+
+def register_handler(handler, fallback=False):
+    """
+    注册格式处理器，先注册的处理器优先匹配
+
+    Args:
+        handler: FormatHandler实例
+        fallback: 是否作为没有任何处理器匹配时使用的默认处理器
+    """
+    global _fallback_handler
+    _handlers.append(handler)
+    if fallback:
+        _fallback_handler = handler
+
+
+def unregister_handler(handler):
+    """移除已注册的格式处理器"""
+    global _fallback_handler
+    _handlers.remove(handler)
+    if _fallback_handler is handler:
+        _fallback_handler = None
+
+
+def find_handler(header: bytes, use_fallback=True):
+    """
+    根据文件头选择处理器
+
+    Args:
+        header: 文件开头的HEADER_SIZE个字节
+        use_fallback: 没有处理器匹配时是否返回默认处理器
+
+    Returns:
+        FormatHandler | None: 匹配的处理器
+    """
+    for handler in _handlers:
+        if handler.matches(header):
+            return handler
+    return _fallback_handler if use_fallback else None
+
+
+def read_header(input_file) -> bytes:
+    """读取文件头用于识别格式，读取后回到文件开头"""
+    header = input_file.read(HEADER_SIZE)
+    input_file.seek(0)
+    return header
+
+
+def supported_extensions():
+    """所有已注册处理器的扩展名，按注册顺序去重"""
+    extensions = []
+    for handler in _handlers:
+        for extension in handler.extensions:
+            if extension not in extensions:
+                extensions.append(extension)
+    return tuple(extensions)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量处理日志
+把每个文件的处理结果逐行追加到JSONL文件，分组写入磁盘；进程中途退出后以resume模式重新打开，
+已完成的文件直接跳过，写到一半的最后一行会被截掉，不依赖Qt
+"""
+
+import json
+import os
+import time
+
+
+# 日志格式版本，写在第一行的任务记录中
+JOURNAL_VERSION = 1
+
+# 累计多少条记录写入一次文件
+DEFAULT_FLUSH_RECORDS = 100
+
+# 距离上次写入超过多少秒时，即使记录不足也写入一次
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# 日志中的文件状态
+JOURNAL_DONE = 'done'
+JOURNAL_FAILED = 'failed'
+
+
+def default_journal_path(name='batch'):
+    """
+    默认日志位置，与结果缓存放在同一目录
+
+    Args:
+        name: 日志名称，命令行和图形界面使用不同的日志，开始新任务时不会清空对方的日志
+    """
+    filename = f'{name}_journal.jsonl'
+    if os.name == 'nt':
+        base_dir = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        return os.path.join(base_dir, 'ChenGouMetadata', filename)
+
+    base_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base_dir, 'chengou-metadata', filename)
+
+
+def read_journal(path):
+    """
+    读取日志
+
+    Args:
+        path: 日志文件路径
+
+    Returns:
+        tuple: (任务记录, 已完成的输入文件绝对路径集合, 最后一条完整记录的结束偏移)；
+            文件为空或第一行不是任务记录时任务记录为None
+    """
+    job = None
+    done = set()
+    valid_end = 0
+    offset = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            offset += len(line)
+            if not line.endswith(b'\n'):
+                # 进程退出时写到一半的最后一行
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print(f"跳过损坏的日志记录: 偏移{offset - len(line)}")
+                continue
+            valid_end = offset
+
+            if 'job' in record:
+                if job is None:
+                    job = record['job']
+            elif record.get('status') == JOURNAL_DONE:
+                done.add(record['input'])
+            else:
+                # 后面的失败记录覆盖前面的成功记录，重新处理
+                done.discard(record.get('input'))
+    return job, done, valid_end
+
+
+class BatchJournal:
+    """追加写入的批量处理日志"""
+
+    def __init__(self, path, resume=False, flush_records=DEFAULT_FLUSH_RECORDS,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, fsync=False):
+        """
+        Args:
+            path: 日志文件路径
+            resume: 是否继续上次的任务：跳过日志中已完成的文件；为False时清空日志重新开始
+            flush_records: 累计多少条记录写入一次文件
+            flush_interval: 距离上次写入超过多少秒时写入一次
+            fsync: 每次写入后是否同步到磁盘（断电时也不丢失已写入的记录）
+        """
+        self.path = path
+        self.resume = resume
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.done = set()
+        self._file = None
+        self._pending = []
+        self._last_flush = 0.0
+
+    def begin(self, job):
+        """
+        开始一批处理
+
+        Args:
+            job: 描述任务的字典（例如输出文件夹），resume时与日志中的任务不同则重新开始
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.done = set()
+        if self.resume and os.path.exists(self.path):
+            previous_job, done, valid_end = read_journal(self.path)
+            if previous_job == job:
+                self.done = done
+                self._file = open(self.path, 'r+b')
+                # 截掉写到一半的最后一行，后面追加的记录从完整的行开始
+                self._file.truncate(valid_end)
+                self._file.seek(valid_end)
+                print(f"继续上次的任务: {len(done)}个文件已完成")
+            else:
+                print("日志属于其他任务，重新开始")
+
+        if self._file is None:
+            self._file = open(self.path, 'wb')
+            self._pending.append({'job': job, 'version': JOURNAL_VERSION})
+            self.flush()
+        self._last_flush = time.monotonic()
+
+    def is_done(self, image_path):
+        """输入文件是否已在之前的运行中处理成功"""
+        return bool(self.done) and os.path.abspath(image_path) in self.done
+
+    def record(self, image_path, filename, error=None, removed=None):
+        """
+        记录一个文件的处理结果，累计到一定数量或时间后写入文件
+
+        Args:
+            image_path: 输入文件路径
+            filename: 输出文件名
+            error: 处理失败时的错误
+            removed: 成功时移除的元数据
+        """
+        record = {'input': os.path.abspath(image_path), 'file': filename}
+        if error is None:
+            record['status'] = JOURNAL_DONE
+            record['removed'] = removed or []
+        else:
+            record['status'] = JOURNAL_FAILED
+            record['error'] = str(error)
+        self._pending.append(record)
+
+        if (len(self._pending) >= self.flush_records
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """把累计的记录写入文件"""
+        if self._file is None or not self._pending:
+            return
+        lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in self._pending)
+        self._file.write(lines.encode('utf-8'))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._pending.clear()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        """写入剩余的记录并关闭文件"""
+        if self._file is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单个文件的资源限制
+限制块长度、块数量、输出大小和处理时间，损坏或恶意构造的文件在占用大量内存、
+长时间占住工作进程之前就以明确的原因失败，不依赖Qt
+"""
+
+import time
+
+
+# PNG规范允许的最大块长度 (2^31-1)
+DEFAULT_MAX_CHUNK_LENGTH = 0x7FFFFFFF
+
+# 单个文件最多的块/段/标签数，正常图片远低于此数
+DEFAULT_MAX_CHUNKS = 100_000
+
+
+class LimitExceededError(ValueError):
+    """超出资源限制，错误信息说明超出的是哪一项"""
+
+
+class ResourceLimits:
+    """
+    单个文件的资源上限
+
+    处理每个文件前调用for_file()得到带截止时间的副本，处理器在遍历块和复制数据时检查。
+    """
+
+    def __init__(self, max_chunk_length=DEFAULT_MAX_CHUNK_LENGTH, max_chunks=DEFAULT_MAX_CHUNKS,
+                 max_output_bytes=None, timeout=None):
+        """
+        Args:
+            max_chunk_length: 单个块/段声明的最大数据长度（字节）
+            max_chunks: 单个文件最多的块/段/标签数
+            max_output_bytes: 单个输出文件的最大字节数，None表示不限制
+            timeout: 单个文件的最长处理时间（秒），None表示不限制
+        """
+        self.max_chunk_length = max_chunk_length
+        self.max_chunks = max_chunks
+        self.max_output_bytes = max_output_bytes
+        self.timeout = timeout
+        self.deadline = None
+
+    def for_file(self):
+        """开始处理一个文件：复制限制，并从现在开始计算超时"""
+        limits = ResourceLimits(self.max_chunk_length, self.max_chunks, self.max_output_bytes, self.timeout)
+        if self.timeout is not None:
+            limits.deadline = time.monotonic() + self.timeout
+        return limits
+
+    def check_chunk(self, name, length, count):
+        """
+        检查一个块
+
+        Args:
+            name: 块名称（用于错误信息），可以是bytes，只在出错时才解码
+            length: 块声明的数据长度
+            count: 包括该块在内已经遇到的块数
+        """
+        if length > self.max_chunk_length:
+            if isinstance(name, bytes):
+                name = name.decode('latin-1')
+            raise LimitExceededError(f"块长度超过上限: {name} 声明{length}字节，上限{self.max_chunk_length}字节")
+        if count > self.max_chunks:
+            raise LimitExceededError(f"块数量超过上限: {self.max_chunks}")
+        if self.deadline is not None:
+            self.check_time()
+
+    def check_output(self, size):
+        """检查输出大小"""
+        if self.max_output_bytes is not None and size > self.max_output_bytes:
+            raise LimitExceededError(f"输出大小超过上限: {size}字节，上限{self.max_output_bytes}字节")
+
+    def check_time(self):
+        """检查是否已经超过处理时间"""
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise LimitExceededError(f"处理超时: 超过{self.timeout:g}秒")
+
+
+# 没有指定时使用的默认限制（不限制输出大小和处理时间）
+DEFAULT_LIMITS = ResourceLimits()
@@ -1,17 +1,25 @@
 import sys
 import os
-import struct
-import zlib
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QFileDialog, 
-                             QVBoxLayout, QHBoxLayout, QWidget, QListWidget, QCheckBox,
+                             QVBoxLayout, QHBoxLayout, QWidget, QListView, QCheckBox, QSpinBox,
                              QLabel, QMenu, QAction, QMessageBox, QProgressBar, QFrame, QLineEdit,
                              QDialog, QTextEdit, QScrollArea, QGroupBox, QGridLayout, QSizePolicy)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QAbstractListModel, QModelIndex
 from PyQt5.QtGui import QIcon, QDragEnterEvent, QDropEvent, QColor, QPalette, QFont
-from PIL import Image
 import piexif
 import shutil
-import time
+import multiprocessing
+
+# 处理器类原先定义在本模块中，保留从main导入的方式
+from processors import PNGBlockProcessor, JPEGSegmentProcessor  # noqa: F401
+from processors import CLEAN_COPY, CLEAN_HARDLINK
+from batch import BatchRunner, STATUS_PENDING, STATUS_DONE, STATUS_FAILED, STATUS_SKIPPED
+from cache import ResultCache
+from journal import BatchJournal, default_journal_path
+from file_walker import iter_image_files
+from formats import supported_extensions
+from path_store import PathStore
+from progress import format_report
 
 # 获取图标文件的绝对路径
 def get_icon_path(icon_name):
@@ -44,98 +52,209 @@ def set_application_icon(app, icon_name):
 class ImageProcessor(QThread):
     progress_updated = pyqtSignal(int)
     task_completed = pyqtSignal(str)
+    progress_reported = pyqtSignal(dict)   # 合并后的进度报告（数量、字节数、速度、剩余时间、行状态）
     all_tasks_completed = pyqtSignal(dict)  # 传递处理统计结果
     
-    def __init__(self, image_paths, output_dir, keep_original_name):
+    # 执行模式
+    EXECUTOR_SERIAL = BatchRunner.EXECUTOR_SERIAL     # 在当前线程中逐个处理
+    EXECUTOR_PROCESS = BatchRunner.EXECUTOR_PROCESS   # 使用进程池并行处理
+    
+    # 两次进度信号之间的最短间隔（秒），避免大量小文件时信号堆积在事件循环中
+    PROGRESS_INTERVAL = 0.1
+    
+    def __init__(self, image_paths, output_dir, keep_original_name,
+                 executor_mode=EXECUTOR_SERIAL, max_workers=None, clean_strategy=CLEAN_COPY,
+                 cache=None, collect_timings=False, in_place=False, journal=None):
         super().__init__()
         self.image_paths = image_paths
         self.output_dir = output_dir
         self.keep_original_name = keep_original_name
-        self.is_running = True
         
-        # 初始化PNG块处理器
-        self.png_processor = PNGBlockProcessor()
+        # 实际的批量处理由不依赖Qt的BatchRunner完成，这里只负责转发信号
+        self.runner = BatchRunner(
+            image_paths,
+            output_dir,
+            keep_original_name,
+            executor_mode=executor_mode,
+            max_workers=max_workers,
+            clean_strategy=clean_strategy,
+            cache=cache,
+            progress_callback=self._on_progress,
+            progress_interval=self.PROGRESS_INTERVAL,
+            collect_timings=collect_timings,  # 开启后统计结果中包含各阶段耗时直方图
+            in_place=in_place,  # 写入临时文件后原子替换原文件
+            journal=journal  # 逐个记录处理结果，中断后可以继续
+        )
         
-        # 初始化统计变量
-        self.processed_files = []  # 成功处理的文件列表
-        self.failed_files = []     # 处理失败的文件列表
+        # 初始化统计变量（与BatchRunner共享同一份列表）
+        self.processed_files = self.runner.processed_files  # 成功处理的文件列表
+        self.failed_files = self.runner.failed_files        # 处理失败的文件列表
+    
+    @property
+    def is_running(self):
+        return self.runner.is_running
     
     def run(self):
-        total = len(self.image_paths)
-        for i, image_path in enumerate(self.image_paths):
-            if not self.is_running:
-                break
-                
-            try:
-                # 获取原始文件名
-                filename = os.path.basename(image_path)
-                
-                # 如果不保留原始文件名，则使用时间戳命名
-                if not self.keep_original_name:
-                    name, ext = os.path.splitext(filename)
-                    filename = f"{int(time.time())}_{i}{ext}"
-                
-                output_path = os.path.join(self.output_dir, filename)
-                
-                # 使用新的PNG流式算法处理PNG文件
-                if self.png_processor.is_png_file(image_path):
-                    # 使用高效的块处理算法
-                    success = self.png_processor.process_png_streaming(image_path, output_path)
-                    if not success:
-                        raise Exception("PNG块处理失败")
-                else:
-                    # 对于非PNG文件，仍然使用原来的PIL方法
-                    self._process_non_png_image(image_path, output_path, filename)
-                
-                # 记录成功处理的文件
-                self.processed_files.append(filename)
-                self.task_completed.emit(f"已处理: {filename}")
-            except Exception as e:
-                # 记录处理失败的文件
-                self.failed_files.append(filename)
-                self.task_completed.emit(f"处理失败: {filename} - {str(e)}")
-            
-            # 更新进度
-            progress = int((i + 1) / total * 100)
-            self.progress_updated.emit(progress)
-        
-        # 准备统计结果
-        stats = {
-            'total_files': total,
-            'successful': len(self.processed_files),
-            'failed': len(self.failed_files),
-            'processed_files': self.processed_files.copy(),
-            'failed_files': self.failed_files.copy()
-        }
+        stats = self.runner.run()
         
         # 发送完成信号并传递统计数据
         self.all_tasks_completed.emit(stats)
     
-    def _process_non_png_image(self, image_path: str, output_path: str, filename: str):
-        """处理非PNG格式的图像文件（使用原有的PIL方法）"""
-        try:
-            # 打开图片
-            img = Image.open(image_path)
-            
-            # 保存图片，但不包含元数据
-            img_format = img.format
-            if img_format == 'JPEG':
-                # 对于JPEG，我们可以使用piexif来删除所有元数据
-                img_without_exif = Image.new(img.mode, img.size)
-                img_without_exif.putdata(list(img.getdata()))
-                img_without_exif.save(output_path, format=img_format, quality=100)
-            else:
-                # 对于其他格式，直接保存而不添加元数据
-                img_without_exif = Image.new(img.mode, img.size)
-                img_without_exif.putdata(list(img.getdata()))
-                img_without_exif.save(output_path, format=img_format)
-        except Exception as e:
-            raise Exception(f"非PNG图像处理失败: {str(e)}")
+    def _on_progress(self, report):
+        """每隔PROGRESS_INTERVAL发送一次合并后的进度信号"""
+        if report['last_error'] is None:
+            self.task_completed.emit(f"已处理: {report['last_file']}")
+        else:
+            self.task_completed.emit(f"处理失败: {report['last_file']} - {report['last_error']}")
+        
+        # 更新进度
+        progress = int(report['done'] / report['total'] * 100)
+        self.progress_updated.emit(progress)
+        self.progress_reported.emit(report)
+    
+    def stop(self):
+        self.runner.stop()
+
+
+class FolderScanWorker(QThread):
+    """后台递归扫描拖放或导入的文件和文件夹，分批返回找到的图片"""
+    files_found = pyqtSignal(list)   # [(所在目录的绝对路径, 文件名), ...]
+    scan_finished = pyqtSignal(int)  # 找到的文件总数
+    
+    # 每批发送的文件数，避免大量信号阻塞界面
+    BATCH_SIZE = 2000
+    
+    def __init__(self, paths, sniff_magic=True):
+        super().__init__()
+        self.paths = paths
+        self.sniff_magic = sniff_magic
+        self.is_running = True
+    
+    def run(self):
+        batch = []
+        found = 0
+        for file_path in iter_image_files(self.paths, recursive=True, sniff_magic=self.sniff_magic,
+                                          should_stop=lambda: not self.is_running):
+            batch.append(os.path.split(os.path.abspath(file_path)))
+            if len(batch) >= self.BATCH_SIZE:
+                found += len(batch)
+                self.files_found.emit(batch)
+                batch = []
+        
+        if batch and self.is_running:
+            found += len(batch)
+            self.files_found.emit(batch)
+        self.scan_finished.emit(found)
     
     def stop(self):
         self.is_running = False
 
 
+class TaskQueueModel(QAbstractListModel):
+    """任务队列的列表模型，数据保存在PathStore中，视图只绘制可见的行"""
+    
+    STATUS_TEXT = {
+        STATUS_DONE: "已完成",
+        STATUS_FAILED: "失败",
+        STATUS_SKIPPED: "已跳过",
+    }
+    STATUS_COLORS = {
+        STATUS_DONE: QColor(46, 125, 50),
+        STATUS_FAILED: QColor(198, 40, 40),
+        STATUS_SKIPPED: QColor(117, 117, 117),
+    }
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.store = PathStore()
+    
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.store)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            status = self.store.statuses[row]
+            if status == STATUS_PENDING:
+                return self.store.name(row)
+            return f"{self.store.name(row)}  [{self.STATUS_TEXT[status]}]"
+        if role == Qt.ForegroundRole:
+            return self.STATUS_COLORS.get(self.store.statuses[row])
+        if role == Qt.ToolTipRole:
+            return self.store.path(row)
+        return None
+    
+    def add_files(self, files):
+        """
+        添加一批文件，跳过已经在队列中的文件
+        
+        Args:
+            files: [(所在目录的绝对路径, 文件名), ...]
+        
+        Returns:
+            int: 实际添加的文件数
+        """
+        # 先加入存储再通知视图，新增的行总是连续地追加在末尾
+        first = len(self.store)
+        added = sum(1 for directory, name in files if self.store.add(directory, name))
+        if added:
+            self.beginInsertRows(QModelIndex(), first, first + added - 1)
+            self.endInsertRows()
+        return added
+    
+    def remove_ranges(self, ranges):
+        """按 (起始行, 结束行) 批量删除，每个连续区间只通知视图一次"""
+        # 合并重叠和相邻的区间
+        merged = []
+        for first, last in sorted(ranges):
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        
+        # 从后往前删除，前面区间的行号保持不变
+        for first, last in reversed(merged):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            self.store.remove_range(first, last)
+            self.endRemoveRows()
+    
+    def clear(self):
+        self.beginResetModel()
+        self.store = PathStore()
+        self.endResetModel()
+    
+    def set_status(self, row, status):
+        if 0 <= row < len(self.store):
+            self.store.statuses[row] = status
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.ForegroundRole])
+    
+    def set_statuses(self, statuses):
+        """批量更新 (行号, 状态)，只通知视图一次"""
+        rows = [row for row, status in statuses if 0 <= row < len(self.store)]
+        if not rows:
+            return
+        for row, status in statuses:
+            if 0 <= row < len(self.store):
+                self.store.statuses[row] = status
+        self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)),
+                              [Qt.DisplayRole, Qt.ForegroundRole])
+    
+    def reset_statuses(self):
+        self.store.reset_statuses()
+        if len(self.store):
+            self.dataChanged.emit(self.index(0), self.index(len(self.store) - 1),
+                                  [Qt.DisplayRole, Qt.ForegroundRole])
+    
+    def paths(self):
+        """返回当前队列中所有文件路径的只读序列"""
+        return self.store.snapshot()
+
+
 # 处理结果统计对话框
 class ProcessingResultsDialog(QDialog):
     """处理结果统计对话框"""
@@ -313,7 +432,8 @@ class MainWindow(QMainWindow):
         self.setWindowIcon(QIcon(get_icon_path("logo.ico")))
         
         # 存储任务队列
-        self.image_paths = []
+        self.queue_model = TaskQueueModel(self)
+        self._scan_workers = []      # 正在运行的后台扫描线程
         self.output_dir = ""
         self.processor = None
         
@@ -348,6 +468,11 @@ class MainWindow(QMainWindow):
         self.import_btn.clicked.connect(self.import_images)
         top_layout.addWidget(self.import_btn)
         
+        # 导入文件夹按钮
+        self.import_dir_btn = QPushButton("导入文件夹")
+        self.import_dir_btn.clicked.connect(self.import_folder)
+        top_layout.addWidget(self.import_dir_btn)
+        
         # 输出文件夹选择按钮
         self.output_btn = QPushButton("选择输出文件夹")
         self.output_btn.clicked.connect(self.select_output_dir)
@@ -384,6 +509,42 @@ class MainWindow(QMainWindow):
         self.keep_name_cb.setChecked(True)
         main_layout.addWidget(self.keep_name_cb)
         
+        # 原地处理：处理结果直接替换原文件
+        self.in_place_cb = QCheckBox("原地处理（直接替换原文件，不需要输出文件夹）")
+        self.in_place_cb.setChecked(False)
+        main_layout.addWidget(self.in_place_cb)
+        
+        # 不含元数据的文件允许使用硬链接（与原文件共享数据）
+        self.hardlink_cb = QCheckBox("不含元数据的文件使用硬链接（同一磁盘时，与原文件共享数据）")
+        self.hardlink_cb.setChecked(False)
+        main_layout.addWidget(self.hardlink_cb)
+        
+        # 跳过上次已处理且未修改的文件
+        self.cache_cb = QCheckBox("跳过上次已处理且未修改的文件")
+        self.cache_cb.setChecked(True)
+        main_layout.addWidget(self.cache_cb)
+        
+        # 继续上次中断的任务（每次处理都会记录日志）
+        self.resume_cb = QCheckBox("继续上次中断的任务（跳过上次已完成的文件）")
+        self.resume_cb.setChecked(False)
+        main_layout.addWidget(self.resume_cb)
+        
+        # 多进程并行处理选项
+        parallel_layout = QHBoxLayout()
+        self.parallel_cb = QCheckBox("多进程并行处理")
+        self.parallel_cb.setChecked(False)
+        parallel_layout.addWidget(self.parallel_cb)
+        
+        parallel_layout.addWidget(QLabel("进程数:"))
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, max(1, os.cpu_count() or 1) * 2)
+        self.workers_spin.setValue(os.cpu_count() or 1)
+        self.workers_spin.setEnabled(False)
+        self.parallel_cb.toggled.connect(self.workers_spin.setEnabled)
+        parallel_layout.addWidget(self.workers_spin)
+        parallel_layout.addStretch(1)
+        main_layout.addLayout(parallel_layout)
+        
         # 创建拖放提示区域
         self.drop_area = QFrame()
         self.drop_area.setFrameShape(QFrame.StyledPanel)
@@ -407,8 +568,11 @@ class MainWindow(QMainWindow):
         queue_label = QLabel("任务队列 (右键可清空):")
         main_layout.addWidget(queue_label)
         
-        # 任务队列列表
-        self.task_list = QListWidget()
+        # 任务队列列表（只绘制可见的行，所有行高度相同时无需逐行计算尺寸）
+        self.task_list = QListView()
+        self.task_list.setModel(self.queue_model)
+        self.task_list.setUniformItemSizes(True)
+        self.task_list.setSelectionMode(QListView.ExtendedSelection)
         self.task_list.setContextMenuPolicy(Qt.CustomContextMenu)
         self.task_list.customContextMenuRequested.connect(self.show_context_menu)
         # 不需要在列表上设置接受拖放，因为我们在主窗口上设置了
@@ -421,6 +585,10 @@ class MainWindow(QMainWindow):
         self.progress_bar.setValue(0)
         main_layout.addWidget(self.progress_bar)
         
+        # 实时处理速度
+        self.throughput_label = QLabel("")
+        main_layout.addWidget(self.throughput_label)
+        
         # 执行按钮
         self.execute_btn = QPushButton("执行")
         self.execute_btn.setIcon(QIcon(get_icon_path("logo.ico")))
@@ -451,21 +619,39 @@ class MainWindow(QMainWindow):
             self,
             "选择图片",
             "",
-            "图片文件 (*.jpg *.jpeg *.png *.bmp *.gif *.tiff)"
+            "图片文件 (" + " ".join("*" + ext for ext in supported_extensions()) + ")"
         )
         
         if files:
             self.add_images_to_queue(files)
     
+    def import_folder(self):
+        dir_path = QFileDialog.getExistingDirectory(
+            self,
+            "选择图片文件夹",
+            ""
+        )
+        
+        if dir_path:
+            self.add_images_to_queue([dir_path])
+    
     def add_images_to_queue(self, files):
-        for file_path in files:
-            # 检查是否是支持的图片格式
-            _, ext = os.path.splitext(file_path)
-            if ext.lower() in [".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff"]:
-                # 检查是否已经在队列中
-                if file_path not in self.image_paths:
-                    self.image_paths.append(file_path)
-                    self.task_list.addItem(os.path.basename(file_path))
+        """在后台线程中递归扫描文件和文件夹，找到的图片分批加入队列"""
+        worker = FolderScanWorker(files)
+        worker.files_found.connect(self.on_files_found)
+        worker.scan_finished.connect(lambda count, w=worker: self.on_scan_finished(w, count))
+        self._scan_workers.append(worker)
+        self.statusBar().showMessage("正在扫描文件...")
+        worker.start()
+    
+    def on_files_found(self, batch):
+        """把一批扫描结果加入队列，跳过已经在队列中的文件"""
+        self.queue_model.add_files(batch)
+    
+    def on_scan_finished(self, worker, count):
+        if worker in self._scan_workers:
+            self._scan_workers.remove(worker)
+        self.statusBar().showMessage(f"扫描完成，找到 {count} 个图片文件", 3000)
     
     def select_output_dir(self):
         dir_path = QFileDialog.getExistingDirectory(
@@ -494,26 +680,50 @@ class MainWindow(QMainWindow):
         
         context_menu.exec_(self.task_list.mapToGlobal(position))
     
+    def is_processing(self):
+        return self.processor is not None and self.processor.isRunning()
+    
     def clear_queue(self):
-        self.image_paths = []
-        self.task_list.clear()
+        # 处理过程中按行号更新状态，不能删除队列中的行
+        if self.is_processing():
+            self.statusBar().showMessage("正在处理，无法修改任务队列", 3000)
+            return
+        
+        # 停止仍在进行的扫描，避免清空后继续加入文件
+        for worker in self._scan_workers:
+            worker.files_found.disconnect(self.on_files_found)
+            worker.stop()
+        
+        self.queue_model.clear()
     
     def remove_selected(self):
-        selected_items = self.task_list.selectedItems()
-        if not selected_items:
+        if self.is_processing():
+            self.statusBar().showMessage("正在处理，无法修改任务队列", 3000)
             return
-            
-        for item in selected_items:
-            row = self.task_list.row(item)
-            self.task_list.takeItem(row)
-            del self.image_paths[row]
+        
+        # 按选中的连续区间删除，不逐行处理
+        selection = self.task_list.selectionModel().selection()
+        ranges = [(selection_range.top(), selection_range.bottom()) for selection_range in selection]
+        if not ranges:
+            return
+        
+        self.task_list.clearSelection()
+        self.queue_model.remove_ranges(ranges)
     
     def execute_tasks(self):
-        if not self.image_paths:
+        if self.queue_model.rowCount() == 0:
             QMessageBox.warning(self, "警告", "任务队列为空！")
             return
             
-        if not self.output_dir:
+        in_place = self.in_place_cb.isChecked()
+        if in_place:
+            reply = QMessageBox.question(
+                self, "确认", "原地处理会直接替换队列中的原文件，确定继续吗？",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+            )
+            if reply != QMessageBox.Yes:
+                return
+        elif not self.output_dir:
             QMessageBox.warning(self, "警告", "请先选择输出文件夹！")
             return
         
@@ -523,25 +733,46 @@ class MainWindow(QMainWindow):
         self.output_btn.setEnabled(False)
         
         # 创建并启动处理线程
+        if self.parallel_cb.isChecked():
+            executor_mode = ImageProcessor.EXECUTOR_PROCESS
+        else:
+            executor_mode = ImageProcessor.EXECUTOR_SERIAL
+        
+        # 传入当前队列的只读视图，后台扫描仍可继续向队列末尾添加文件
+        self.queue_model.reset_statuses()
         self.processor = ImageProcessor(
-            self.image_paths,
+            self.queue_model.paths(),
             self.output_dir,
-            self.keep_name_cb.isChecked()
+            self.keep_name_cb.isChecked(),
+            executor_mode=executor_mode,
+            max_workers=self.workers_spin.value(),
+            clean_strategy=CLEAN_HARDLINK if self.hardlink_cb.isChecked() else CLEAN_COPY,
+            cache=ResultCache() if self.cache_cb.isChecked() else None,
+            in_place=in_place,
+            journal=BatchJournal(default_journal_path('gui'), resume=self.resume_cb.isChecked(), fsync=in_place)
         )
         
         # 连接信号
-        self.processor.progress_updated.connect(self.update_progress)
-        self.processor.task_completed.connect(self.update_task_status)
+        self.processor.progress_reported.connect(self.on_progress_reported)
         self.processor.all_tasks_completed.connect(self.on_all_tasks_completed)
         
         # 启动线程
         self.processor.start()
     
-    def update_progress(self, value):
-        self.progress_bar.setValue(value)
-    
-    def update_task_status(self, message):
-        self.statusBar().showMessage(message, 3000)  # 显示3秒
+    def on_progress_reported(self, report):
+        """根据合并后的进度报告更新进度条、速度、状态栏和队列中的行状态"""
+        self.progress_bar.setMaximum(max(report['total'], 1))
+        self.progress_bar.setValue(report['done'])
+        self.throughput_label.setText(
+            f"{format_report(report)}"
+            f" · 读取 {report['bytes_in'] / (1024 * 1024):.1f} MB"
+            f" · 写入 {report['bytes_out'] / (1024 * 1024):.1f} MB"
+        )
+        if report['last_error'] is None:
+            self.statusBar().showMessage(f"已处理: {report['last_file']}", 3000)  # 显示3秒
+        else:
+            self.statusBar().showMessage(f"处理失败: {report['last_file']} - {report['last_error']}", 3000)
+        self.queue_model.set_statuses(report['statuses'])
     
     def on_all_tasks_completed(self, stats):
         # 重新启用按钮
@@ -557,170 +788,10 @@ class MainWindow(QMainWindow):
         self.progress_bar.setValue(0)
 
 
-# PNG块处理器 - 基于流的元数据去除算法
-class PNGBlockProcessor:
-    """高效PNG元数据去除器 - 基于块的流式处理算法"""
-    
-    # PNG文件签名 (8字节)
-    PNG_SIGNATURE = b'\x89\x50\x4E\x47\x0D\x0A\x1A\x0A'
-    
-    # 关键块 (Critical Chunks) - 必须保留
-    CRITICAL_CHUNKS = {'IHDR', 'PLTE', 'IDAT', 'IEND'}
-    
-    # 安全辅助块白名单 - 对图像显示重要但不包含工作流
-    SAFE_ANCILLARY_CHUNKS = {
-        'sRGB',   # sRGB颜色空间
-        'gAMA',   # Gamma校正
-        'iCCP',   # ICC颜色配置文件
-        'pHYs',   # 物理像素尺寸
-        'cHRM',   # 色度信息
-        'bKGD',   # 背景色
-        'hIST',   # 直方图
-        'tRNS',   # 透明度信息
-    }
-    
-    # 需要丢弃的块类型（包含工作流元数据）
-    METADATA_CHUNKS = {
-        'tEXt', 'zTXt', 'iTXt',  # 文本元数据
-        'eXIf',                   # EXIF数据
-        'tIME',                   # 最后修改时间
-    }
-    
-    def __init__(self):
-        pass
-    
-    def process_png_streaming(self, input_path: str, output_path: str) -> bool:
-        """
-        流式处理PNG文件 - 只重组文件结构，完全不碰图像数据
-        
-        Args:
-            input_path: 输入PNG文件路径
-            output_path: 输出PNG文件路径
-            
-        Returns:
-            bool: 处理是否成功
-        """
-        try:
-            with open(input_path, 'rb') as input_file, \
-                 open(output_path, 'wb') as output_file:
-                
-                # 1. 验证并写入PNG签名
-                signature = input_file.read(8)
-                if signature != self.PNG_SIGNATURE:
-                    raise ValueError("不是有效的PNG文件")
-                output_file.write(signature)
-                
-                # 2. 流式处理所有数据块
-                chunks_processed = 0
-                chunks_skipped = 0
-                
-                while True:
-                    # 读取块头信息 (8字节: 长度4字节 + 类型4字节)
-                    chunk_header = input_file.read(8)
-                    if len(chunk_header) != 8:
-                        break
-                    
-                    chunk_length, chunk_type = struct.unpack('>I4s', chunk_header)
-                    
-                    # 读取块数据
-                    chunk_data = input_file.read(chunk_length)
-                    if len(chunk_data) != chunk_length:
-                        raise ValueError(f"块数据不完整: {chunk_type}")
-                    
-                    # 读取CRC校验
-                    chunk_crc = input_file.read(4)
-                    if len(chunk_crc) != 4:
-                        raise ValueError(f"CRC校验不完整: {chunk_type}")
-                    
-                    # 3. 决策逻辑：保留或丢弃块
-                    chunk_type_str = chunk_type.decode('ascii')
-                    
-                    # 关键块必须保留
-                    is_critical = chunk_type_str in self.CRITICAL_CHUNKS
-                    
-                    # 安全辅助块可以保留
-                    is_safe_ancillary = chunk_type_str in self.SAFE_ANCILLARY_CHUNKS
-                    
-                    # 需要丢弃的元数据块
-                    is_metadata = chunk_type_str in self.METADATA_CHUNKS
-                    
-                    # 4. 写入决策
-                    if is_critical or is_safe_ancillary:
-                        # 这是"好"块，原封不动写回
-                        output_file.write(chunk_header)
-                        output_file.write(chunk_data)
-                        output_file.write(chunk_crc)
-                        chunks_processed += 1
-                    elif is_metadata:
-                        # 这是"坏"块（包含工作流），直接跳过
-                        chunks_skipped += 1
-                    else:
-                        # 未知的辅助块，默认保留以确保兼容性
-                        output_file.write(chunk_header)
-                        output_file.write(chunk_data)
-                        output_file.write(chunk_crc)
-                        chunks_processed += 1
-                        print(f"警告: 保留未知类型的块: {chunk_type_str}")
-                    
-                    # 5. 检查是否到达文件末尾
-                    if chunk_type_str == 'IEND':
-                        break
-                
-                print(f"处理完成: 保留{chunks_processed}个块，跳过{chunks_skipped}个元数据块")
-                return True
-                
-        except Exception as e:
-            print(f"PNG处理失败: {str(e)}")
-            return False
-    
-    def is_png_file(self, file_path: str) -> bool:
-        """检查文件是否为PNG格式"""
-        try:
-            with open(file_path, 'rb') as f:
-                signature = f.read(8)
-                return signature == self.PNG_SIGNATURE
-        except:
-            return False
-    
-    def get_file_info(self, file_path: str) -> dict:
-        """获取PNG文件的基本信息"""
-        try:
-            with open(file_path, 'rb') as f:
-                # 跳过PNG签名
-                f.seek(8)
-                
-                # 读取IHDR块
-                chunk_header = f.read(8)
-                if len(chunk_header) != 8:
-                    return {}
-                
-                chunk_length, chunk_type = struct.unpack('>I4s', chunk_header)
-                
-                if chunk_type.decode('ascii') != 'IHDR':
-                    return {}
-                
-                # IHDR块长度固定为13字节
-                ihdr_data = f.read(13)
-                if len(ihdr_data) != 13:
-                    return {}
-                
-                # 解析IHDR数据
-                width, height, bit_depth, color_type, compression_method, \
-                filter_method, interlace_method = struct.unpack('>IIBBBBB', ihdr_data)
-                
-                return {
-                    'width': width,
-                    'height': height,
-                    'bit_depth': bit_depth,
-                    'color_type': color_type,
-                    'is_png': True
-                }
-        except Exception as e:
-            print(f"获取文件信息失败: {str(e)}")
-            return {'is_png': False}
-
-
 if __name__ == "__main__":
+    # 打包为exe后，进程池的子进程需要此调用才能正确启动
+    multiprocessing.freeze_support()
+    
     app = QApplication(sys.argv)
     
     # 设置应用程序图标（桌面图标和窗口图标）
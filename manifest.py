@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+清单分片处理
+一个进程把输入文件列表切分为固定大小的分片写入共享目录，任意主机上的多个工作进程用O_EXCL锁文件
+领取分片，各自写出分片的统计结果，最后合并为整批的统计结果，不依赖Qt
+
+共享目录结构:
+    manifest.json               任务描述（输出位置、分片数和分片大小），最后写入
+    shards/shard-00000.jsonl    每行一个 [输入文件路径, 输出文件名]，重名的文件在切分时就分配好不重复的输出文件名
+    claims/shard-00000.lock     领取分片的工作进程写入的锁文件，处理期间定期更新修改时间
+    results/shard-00000.json    分片的统计结果，存在即表示该分片已完成
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+
+from atomic import fsync_file, make_temp_path, remove_temp_file
+from batch import BatchRunner, unique_output_name
+
+
+MANIFEST_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+
+# 默认每个分片的文件数
+DEFAULT_SHARD_SIZE = 1000
+
+# 锁文件超过多少秒未更新时视为工作进程已经退出，可以被其他进程重新领取
+DEFAULT_STALE_AFTER = 600.0
+
+# 处理期间每隔多少秒更新一次锁文件的修改时间
+HEARTBEAT_INTERVAL = 30.0
+
+# 合并时按列表拼接、按字典合并和按数值相加的统计字段
+_LIST_KEYS = ('processed_files', 'failed_files', 'clean_files', 'skipped_files')
+_DICT_KEYS = ('failure_reasons', 'fast_path_files')
+_SUM_KEYS = ('total_files', 'successful', 'failed', 'bytes_in', 'bytes_out')
+
+
+def _shard_name(index):
+    return f"shard-{index:05d}"
+
+
+def _write_json_atomic(path, data):
+    """写入临时文件并同步后再重命名，其他主机只会看到完整的文件"""
+    temp_path = make_temp_path(path)
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        fsync_file(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        remove_temp_file(temp_path)
+        raise
+
+
+def create_manifest(manifest_dir, image_paths, output_dir=None, in_place=False,
+                    shard_size=DEFAULT_SHARD_SIZE):
+    """
+    把输入文件列表切分为分片写入共享目录
+
+    Args:
+        manifest_dir: 共享目录，所有工作进程都能访问的路径
+        image_paths: 输入文件路径，应使用各主机上都相同的绝对路径
+        output_dir: 输出文件夹（输出使用原始文件名，重名的文件加上序号后缀）
+        in_place: 是否原地处理（忽略output_dir）
+        shard_size: 每个分片的文件数
+
+    Returns:
+        dict: 写入的任务描述
+
+    Raises:
+        FileExistsError: 共享目录中已经有任务
+    """
+    manifest_path = os.path.join(manifest_dir, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        raise FileExistsError(f"共享目录中已经有任务: {manifest_path}")
+    for name in ('shards', 'claims', 'results'):
+        os.makedirs(os.path.join(manifest_dir, name), exist_ok=True)
+
+    shards = 0
+    total = 0
+    shard_file = None
+    used_names = set()
+    try:
+        for image_path in image_paths:
+            if total % shard_size == 0:
+                if shard_file is not None:
+                    shard_file.close()
+                shard_file = open(os.path.join(manifest_dir, 'shards', _shard_name(shards) + '.jsonl'),
+                                  'w', encoding='utf-8')
+                shards += 1
+            # 各分片由不同的进程处理，输出文件名在这里统一去重
+            filename = unique_output_name(os.path.basename(image_path), used_names)
+            shard_file.write(json.dumps([os.path.abspath(image_path), filename], ensure_ascii=False) + '\n')
+            total += 1
+    finally:
+        if shard_file is not None:
+            shard_file.close()
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'output_dir': None if in_place else os.path.abspath(output_dir),
+        'in_place': in_place,
+        'shard_size': shard_size,
+        'shards': shards,
+        'total_files': total,
+        'created_at': time.time(),
+    }
+    # 分片全部写完后才写入任务描述，工作进程不会读到不完整的任务
+    _write_json_atomic(manifest_path, manifest)
+    return manifest
+
+
+def load_manifest(manifest_dir):
+    """读取任务描述"""
+    with open(os.path.join(manifest_dir, MANIFEST_FILE), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_shard(manifest_dir, index):
+    """读取分片中的 [输入文件路径, 输出文件名] 列表"""
+    with open(os.path.join(manifest_dir, 'shards', _shard_name(index) + '.jsonl'), encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+class ShardWorker:
+    """从共享目录领取并处理分片"""
+
+    def __init__(self, manifest_dir, runner_options=None, stale_after=DEFAULT_STALE_AFTER, worker_id=None):
+        """
+        Args:
+            manifest_dir: create_manifest写入的共享目录
+            runner_options: 传给BatchRunner的处理参数（执行模式、进程数、缓存等）
+            stale_after: 锁文件超过多少秒未更新时可以被重新领取；各主机的时钟偏差应远小于此值
+            worker_id: 写入锁文件的工作进程标识，默认为 主机名:进程号
+        """
+        self.manifest_dir = manifest_dir
+        self.manifest = load_manifest(manifest_dir)
+        self.runner_options = dict(runner_options or {})
+        self.stale_after = stale_after
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.runner = None
+        self._stopped = False
+        self._tokens = {}   # 分片编号 -> 本进程写入锁文件的令牌
+
+    def _lock_path(self, index):
+        return os.path.join(self.manifest_dir, 'claims', _shard_name(index) + '.lock')
+
+    def _result_path(self, index):
+        return os.path.join(self.manifest_dir, 'results', _shard_name(index) + '.json')
+
+    def _try_lock(self, lock_path):
+        """用O_EXCL创建锁文件，已存在时返回None，成功时返回写入的令牌"""
+        token = f"{self.worker_id} {time.time()!r}"
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return None
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(token)
+        return token
+
+    def _break_stale_lock(self, lock_path):
+        """
+        删除超时的锁文件
+
+        先读出锁文件的内容再把它重命名为本进程独有的名字，重命名后内容不同说明期间已经被其他进程
+        重新领取，此时放回原处；重命名是原子的，同一个锁文件只会被一个进程删除。
+        放回时用硬链接而不是重命名，不会覆盖期间又被第三个进程创建的锁文件。
+        """
+        try:
+            if time.time() - os.stat(lock_path).st_mtime < self.stale_after:
+                return False
+            with open(lock_path, encoding='utf-8') as f:
+                stale_token = f.read()
+            moved_path = f"{lock_path}.{self.worker_id.replace(os.sep, '_').replace(':', '_')}.stale"
+            os.rename(lock_path, moved_path)
+        except FileNotFoundError:
+            # 其他进程已经删除或完成了该分片
+            return False
+
+        with open(moved_path, encoding='utf-8') as f:
+            moved_token = f.read()
+        if moved_token != stale_token:
+            try:
+                os.link(moved_path, lock_path)
+            except FileExistsError:
+                # 第三个进程已经领取了该分片，被移走的锁的持有者会发现锁已丢失
+                pass
+            os.unlink(moved_path)
+            return False
+        os.unlink(moved_path)
+        print(f"重新领取超时的分片: {os.path.basename(lock_path)} ({stale_token})")
+        return True
+
+    def claim(self):
+        """
+        领取一个尚未完成的分片
+
+        Returns:
+            int | None: 分片编号，没有可领取的分片时返回None
+        """
+        for index in range(self.manifest['shards']):
+            if os.path.exists(self._result_path(index)):
+                continue
+            lock_path = self._lock_path(index)
+            token = self._try_lock(lock_path)
+            if token is None:
+                if not self._break_stale_lock(lock_path):
+                    continue
+                token = self._try_lock(lock_path)
+                if token is None:
+                    continue
+            self._tokens[index] = token
+            # 检查结果和领取之间分片可能已被完成并释放
+            if os.path.exists(self._result_path(index)):
+                self._release(index)
+                continue
+            return index
+        return None
+
+    def _owns_lock(self, index):
+        """锁文件是否仍是本进程写入的；超时后可能已被其他进程删除或重新领取"""
+        try:
+            with open(self._lock_path(index), encoding='utf-8') as f:
+                return f.read() == self._tokens.get(index)
+        except FileNotFoundError:
+            return False
+
+    def _release(self, index):
+        """删除本进程的锁文件，已被其他进程重新领取的锁文件保持不变"""
+        if self._owns_lock(index):
+            try:
+                os.unlink(self._lock_path(index))
+            except FileNotFoundError:
+                pass
+        self._tokens.pop(index, None)
+
+    def _heartbeat(self, index, stop_event, lost_event):
+        """
+        处理期间在后台线程中定期更新锁文件的修改时间，其他进程据此判断本进程仍在运行
+
+        单个文件处理很久（例如超大文件）时也不会因为没有结果回调而被误判为已退出。
+        锁已被其他进程重新领取时设置lost_event并停止处理，分片由新的持有者处理。
+        """
+        while not stop_event.wait(HEARTBEAT_INTERVAL):
+            try:
+                if self._owns_lock(index):
+                    os.utime(self._lock_path(index))
+                    continue
+            except FileNotFoundError:
+                pass
+            print(f"分片的锁已被其他进程重新领取: {_shard_name(index)}")
+            lost_event.set()
+            runner = self.runner
+            if runner is not None:
+                runner.stop()
+            return
+
+    def process_shard(self, index):
+        """
+        处理已领取的分片，写出统计结果后释放锁文件
+
+        Returns:
+            dict: 分片的统计结果
+        """
+        entries = read_shard(self.manifest_dir, index)
+        self.runner = BatchRunner(
+            [image_path for image_path, _ in entries],
+            self.manifest['output_dir'],
+            keep_original_name=True,
+            output_names=[filename for _, filename in entries],
+            in_place=self.manifest['in_place'],
+            **self.runner_options
+        )
+
+        stop_event = threading.Event()
+        lost_event = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(index, stop_event, lost_event),
+                                     name=f"heartbeat-{_shard_name(index)}", daemon=True)
+        heartbeat.start()
+        try:
+            stats = self.runner.run()
+        finally:
+            stop_event.set()
+            heartbeat.join()
+        stopped = not self.runner.is_running
+        if 'executor' in self.runner_options:
+            # 超时终止工作进程后进程池会被重建，后面的分片使用新的进程池
+            self.runner_options['executor'] = self.runner.executor
+        self.runner = None
+
+        if lost_event.is_set() or not self._owns_lock(index):
+            # 锁已被其他进程重新领取，结果由新的持有者写出
+            self._tokens.pop(index, None)
+            return stats
+
+        if stopped:
+            # 中途停止的分片不写结果，释放后由其他进程重新处理
+            self._release(index)
+            return stats
+
+        stats['shard'] = index
+        stats['worker'] = self.worker_id
+        _write_json_atomic(self._result_path(index), stats)
+        self._release(index)
+        return stats
+
+    def run(self, max_shards=None, shard_callback=None):
+        """
+        反复领取并处理分片，直到没有可领取的分片
+
+        Args:
+            max_shards: 最多处理的分片数，None表示不限制
+            shard_callback: 每个分片完成后的回调 (分片编号, 统计结果)
+
+        Returns:
+            list: 本进程处理的分片编号
+        """
+        processed = []
+        while not self._stopped and (max_shards is None or len(processed) < max_shards):
+            index = self.claim()
+            if index is None:
+                break
+            stats = self.process_shard(index)
+            processed.append(index)
+            if shard_callback is not None:
+                shard_callback(index, stats)
+        return processed
+
+    def stop(self):
+        """停止处理，当前分片释放后由其他进程重新领取"""
+        self._stopped = True
+        if self.runner is not None:
+            self.runner.stop()
+
+
+def merge_results(manifest_dir):
+    """
+    合并所有分片的统计结果
+
+    耗时直方图不能逐分片相加，合并结果中不包含timings。
+
+    Returns:
+        dict: 与BatchRunner.run相同字段的统计结果，另外包含
+            shards: 分片总数
+            completed_shards: 已完成的分片数
+            pending_shards: 尚未完成的分片编号
+            workers: 工作进程标识 -> 完成的分片数
+    """
+    manifest = load_manifest(manifest_dir)
+    merged = {key: 0 for key in _SUM_KEYS}
+    merged.update({key: [] for key in _LIST_KEYS})
+    merged.update({key: {} for key in _DICT_KEYS})
+    pending = []
+    workers = {}
+
+    for index in range(manifest['shards']):
+        result_path = os.path.join(manifest_dir, 'results', _shard_name(index) + '.json')
+        try:
+            with open(result_path, encoding='utf-8') as f:
+                stats = json.load(f)
+        except FileNotFoundError:
+            pending.append(index)
+            continue
+        for key in _SUM_KEYS:
+            merged[key] += stats[key]
+        for key in _LIST_KEYS:
+            merged[key].extend(stats[key])
+        for key in _DICT_KEYS:
+            merged[key].update(stats[key])
+        workers[stats['worker']] = workers.get(stats['worker'], 0) + 1
+
+    merged['shards'] = manifest['shards']
+    merged['completed_shards'] = manifest['shards'] - len(pending)
+    merged['pending_shards'] = pending
+    merged['workers'] = workers
+    return merged
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务队列的紧凑路径存储
+目录路径只保存一份，每个文件只保存目录编号、文件名和一个字节的状态，
+队列中有上百万个文件时内存占用仍然很小，不依赖Qt
+"""
+
+import os
+from array import array
+
+from batch import STATUS_PENDING
+
+
+class PathStore:
+    """按行保存任务队列中的文件路径和处理状态"""
+
+    def __init__(self):
+        self._dirs = []          # 目录编号 -> 目录路径
+        self._dir_ids = {}       # 规范化目录路径 -> 目录编号
+        self._dir_names = []     # 目录编号 -> 已加入队列的规范化文件名集合，用于O(1)去重
+        self._row_dirs = array('I')   # 每行的目录编号
+        self._names = []              # 每行的文件名
+        self.statuses = bytearray()   # 每行的处理状态
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, directory, name):
+        """
+        添加一个文件
+
+        Args:
+            directory: 文件所在目录的绝对路径
+            name: 文件名
+
+        Returns:
+            bool: 是否添加成功（已在队列中时返回False）
+        """
+        dir_key = os.path.normcase(directory)
+        dir_id = self._dir_ids.get(dir_key)
+        if dir_id is None:
+            dir_id = len(self._dirs)
+            self._dir_ids[dir_key] = dir_id
+            self._dirs.append(directory)
+            self._dir_names.append(set())
+
+        names = self._dir_names[dir_id]
+        name_key = os.path.normcase(name)
+        if name_key in names:
+            return False
+        names.add(name_key)
+
+        self._row_dirs.append(dir_id)
+        self._names.append(name)
+        self.statuses.append(STATUS_PENDING)
+        return True
+
+    def name(self, row):
+        return self._names[row]
+
+    def path(self, row):
+        return os.path.join(self._dirs[self._row_dirs[row]], self._names[row])
+
+    def remove_range(self, first, last):
+        """删除第first到第last行（包含两端）"""
+        for row in range(first, last + 1):
+            self._dir_names[self._row_dirs[row]].discard(os.path.normcase(self._names[row]))
+        del self._row_dirs[first:last + 1]
+        del self._names[first:last + 1]
+        del self.statuses[first:last + 1]
+
+    def reset_statuses(self):
+        """把所有行恢复为等待处理"""
+        self.statuses = bytearray([STATUS_PENDING]) * len(self._names)
+
+    def snapshot(self):
+        """返回当前所有行的只读路径序列，不复制路径字符串"""
+        return PathView(self, len(self._names))
+
+
+class PathView:
+    """PathStore前count行的只读视图，可以像列表一样传给BatchRunner"""
+
+    def __init__(self, store, count):
+        self._store = store
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, row):
+        if not 0 <= row < self._count:
+            raise IndexError(row)
+        return self._store.path(row)
+
+    def __iter__(self):
+        for row in range(self._count):
+            yield self._store.path(row)
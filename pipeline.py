@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+读取/处理/写入流水线
+预读线程提前把后面的文件整个读入内存，当前线程只负责解析和生成输出，写入线程在后台把结果写回磁盘，
+高延迟存储（网络盘等）上等待读写时CPU不再空闲；内存中的文件总量受字节预算限制，不依赖Qt
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+# 默认的内存预算：预读的输入和尚未写出的输出合计不超过该字节数
+DEFAULT_BUDGET_BYTES = 64 * 1024 * 1024
+
+# 默认的预读线程数和写入线程数
+DEFAULT_PREFETCH_WORKERS = 4
+DEFAULT_WRITE_WORKERS = 2
+
+
+class ByteBudget:
+    """限制同时驻留在内存中的字节数"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def acquire(self, size):
+        """
+        占用size字节，超出预算时等待其他文件释放
+
+        没有任何占用时总是允许，保证单个比预算还大的文件也能处理。
+
+        Returns:
+            bool: 成功占用返回True，预算已关闭时返回False
+        """
+        with self._condition:
+            while not self._closed and self.used > 0 and self.used + size > self.limit:
+                self._condition.wait()
+            if self._closed:
+                return False
+            self._add(size)
+            return True
+
+    def exchange(self, old_size, new_size):
+        """把占用的old_size字节换成new_size字节（处理后输入换成输出），不等待"""
+        with self._condition:
+            self.used -= old_size
+            self._add(new_size)
+            self._condition.notify_all()
+
+    def release(self, size):
+        with self._condition:
+            self.used -= size
+            self._condition.notify_all()
+
+    def close(self):
+        """停止时唤醒所有等待的线程"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def _add(self, size):
+        self.used += size
+        self.peak = max(self.peak, self.used)
+
+
+def _read_file(path):
+    """读取整个文件，返回 (内容, 耗时秒数)"""
+    started = time.perf_counter()
+    with open(path, 'rb', buffering=0) as f:
+        data = f.readall()
+    return data, time.perf_counter() - started
+
+
+class IOPipeline:
+    """预读、处理、后台写入三个阶段重叠执行的流水线"""
+
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_BYTES, prefetch_workers=DEFAULT_PREFETCH_WORKERS,
+                 write_workers=DEFAULT_WRITE_WORKERS):
+        """
+        Args:
+            budget_bytes: 预读的输入和尚未写出的输出合计占用的内存上限
+            prefetch_workers: 预读线程数，网络存储上多个请求可以同时等待
+            write_workers: 写入线程数
+        """
+        self.budget = ByteBudget(budget_bytes)
+        self.prefetch_workers = prefetch_workers
+        self.write_workers = write_workers
+
+    def run(self, items, process, write, done, should_stop=None):
+        """
+        运行流水线，直到所有文件完成或should_stop返回True
+
+        Args:
+            items: 可迭代的 (key, 输入文件路径)，在预读线程中按顺序遍历
+            process: process(key, data, read_seconds) -> (output, output_size)，
+                在调用线程中按输入顺序执行；output为交给write的输出内容
+            write: write(key, output) -> result，在写入线程中执行
+            done: done(key, result, error)，每个文件完成或失败时在调用线程中调用
+            should_stop: 可选的回调，返回True时不再开始新的文件，已经在写入的文件会完成
+        """
+        budget = self.budget
+        prefetched = queue.Queue()   # 按输入顺序排列的 (key, 占用字节数, 预读future)
+        completed = queue.Queue()    # 写入完成的 (key, 写入future)
+        stopping = threading.Event()
+        pending_writes = 0
+
+        read_pool = ThreadPoolExecutor(max_workers=self.prefetch_workers)
+        write_pool = ThreadPoolExecutor(max_workers=self.write_workers)
+
+        def feed():
+            # 在预算允许的范围内提前提交读取任务
+            try:
+                for key, path in items:
+                    if stopping.is_set():
+                        break
+                    try:
+                        size = os.path.getsize(path)
+                    except OSError:
+                        size = 0
+                    if not budget.acquire(size):
+                        break
+                    prefetched.put((key, size, read_pool.submit(_read_file, path)))
+            finally:
+                prefetched.put(None)
+
+        def finish_write(future, key, size):
+            budget.release(size)
+            completed.put((key, future))
+
+        def report_completed(block=False):
+            nonlocal pending_writes
+            while pending_writes:
+                try:
+                    key, future = completed.get(block=block)
+                except queue.Empty:
+                    return
+                pending_writes -= 1
+                error = future.exception()
+                done(key, future.result() if error is None else None, error)
+                block = False
+
+        feeder = threading.Thread(target=feed, name='pipeline-prefetch', daemon=True)
+        feeder.start()
+        try:
+            while True:
+                entry = prefetched.get()
+                report_completed()
+                if entry is None:
+                    break
+                key, size, read_future = entry
+                if should_stop is not None and should_stop():
+                    # 已经预读的文件不再处理，只释放占用
+                    read_future.cancel()
+                    budget.release(size)
+                    stopping.set()
+                    budget.close()
+                    continue
+
+                try:
+                    data, read_seconds = read_future.result()
+                    output, output_size = process(key, data, read_seconds)
+                except Exception as e:
+                    budget.release(size)
+                    done(key, None, e)
+                    continue
+                del data
+
+                # 输入已经处理完，占用换成输出的大小，写完后释放
+                budget.exchange(size, output_size)
+                write_future = write_pool.submit(write, key, output)
+                pending_writes += 1
+                write_future.add_done_callback(
+                    lambda future, key=key, output_size=output_size: finish_write(future, key, output_size))
+                del output
+
+            # 等待后台写入全部完成
+            while pending_writes:
+                report_completed(block=True)
+        finally:
+            stopping.set()
+            budget.close()
+            feeder.join()
+            read_pool.shutdown(wait=True, cancel_futures=True)
+            write_pool.shutdown(wait=True)
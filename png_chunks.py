@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PNG块遍历
+所有PNG操作共用的块迭代器：使用预编译的struct.Struct解析块头，块类型保持为4字节bytes直接比较，
+块数据和CRC只记录偏移、不复制，可以遍历文件、memoryview或mmap，不依赖Qt
+"""
+
+import struct
+
+from fastcopy import file_size as _file_size
+
+
+# PNG文件签名 (8字节)
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# 块头: 4字节大端长度 + 4字节类型
+CHUNK_HEADER = struct.Struct('>I4s')
+
+# IHDR块数据: 宽、高、位深、颜色类型、压缩方式、滤波方式、隔行扫描方式
+IHDR_DATA = struct.Struct('>IIBBBBB')
+
+IHDR = b'IHDR'
+IEND = b'IEND'
+
+
+class PNGChunk:
+    """单个块的位置信息，不包含块数据"""
+
+    __slots__ = ('type', 'offset', 'length', 'crc_offset')
+
+    def __init__(self, chunk_type, offset, length, crc_offset):
+        self.type = chunk_type        # 4字节块类型，例如 b'IDAT'
+        self.offset = offset          # 块起始偏移（块头所在位置）
+        self.length = length          # 块数据长度
+        self.crc_offset = crc_offset  # CRC所在偏移，块数据位于 offset + 8 到 crc_offset 之间
+
+    @property
+    def data_offset(self):
+        return self.offset + 8
+
+    @property
+    def size(self):
+        """块总长度 = 块头8字节 + 数据 + CRC 4字节"""
+        return self.length + 12
+
+    @property
+    def end(self):
+        return self.crc_offset + 4
+
+    def __repr__(self):
+        return f"PNGChunk({self.type!r}, offset={self.offset}, length={self.length})"
+
+
+def iter_chunks(source, offset=len(PNG_SIGNATURE), end=None):
+    """
+    依次返回PNG块，读到IEND后停止；不检查文件签名
+
+    Args:
+        source: 以二进制模式打开的文件（按块头seek读取，块数据用seek跳过），
+            或bytes、memoryview、mmap等支持缓冲区协议的对象
+        offset: 第一个块的偏移，默认紧跟在签名之后
+        end: 数据结束位置，默认为文件大小或缓冲区长度
+
+    Yields:
+        PNGChunk: 块的位置信息；剩余数据不足一个块头时停止
+
+    Raises:
+        ValueError: 块数据超出结束位置（文件不完整或长度字段损坏）
+    """
+    if hasattr(source, 'readinto'):
+        return _iter_file_chunks(source, offset, _file_size(source) if end is None else end)
+    return _iter_buffer_chunks(source, offset, len(source) if end is None else end)
+
+
+def _iter_buffer_chunks(data, offset, end):
+    unpack_from = CHUNK_HEADER.unpack_from
+    while offset + 8 <= end:
+        length, chunk_type = unpack_from(data, offset)
+        crc_offset = offset + 8 + length
+        if crc_offset + 4 > end:
+            raise ValueError(f"块数据不完整: {chunk_type.decode('latin-1')} 声明{length}字节，"
+                             f"超出数据末尾{crc_offset + 4 - end}字节")
+        yield PNGChunk(chunk_type, offset, length, crc_offset)
+        if chunk_type == IEND:
+            return
+        offset = crc_offset + 4
+
+
+def _iter_file_chunks(input_file, offset, end):
+    # 复用同一个块头缓冲区，不为每个块创建新的bytes对象
+    header = bytearray(CHUNK_HEADER.size)
+    unpack_from = CHUNK_HEADER.unpack_from
+    while offset + 8 <= end:
+        input_file.seek(offset)
+        if input_file.readinto(header) != 8:
+            return
+        length, chunk_type = unpack_from(header)
+        crc_offset = offset + 8 + length
+        if crc_offset + 4 > end:
+            raise ValueError(f"块数据不完整: {chunk_type.decode('latin-1')} 声明{length}字节，"
+                             f"超出数据末尾{crc_offset + 4 - end}字节")
+        yield PNGChunk(chunk_type, offset, length, crc_offset)
+        if chunk_type == IEND:
+            return
+        offset = crc_offset + 4
+
+
+def read_chunk_data(source, chunk, limit=None):
+    """
+    读取块数据
+
+    Args:
+        source: 与iter_chunks相同的文件或缓冲区
+        chunk: PNGChunk
+        limit: 最多读取的字节数，例如只需要文本块开头的关键字时
+
+    Returns:
+        bytes: 块数据
+    """
+    length = chunk.length if limit is None else min(chunk.length, limit)
+    if hasattr(source, 'readinto'):
+        source.seek(chunk.data_offset)
+        return source.read(length)
+    return bytes(source[chunk.data_offset:chunk.data_offset + length])
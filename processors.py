@@ -0,0 +1,1863 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图像元数据处理器
+各格式的流式元数据去除算法，不依赖Qt，GUI与命令行模式共用
+"""
+
+import abc
+import contextlib
+import io
+import os
+import struct
+
+from atomic import FSYNC_NONE, make_temp_path, sync_output, replace_file, remove_temp_file
+from fastcopy import (copy_ranges, link_or_copy_file, open_output, unlink_output, map_file,
+                      buffered_reader, file_size as _file_size)
+from limits import DEFAULT_LIMITS, LimitExceededError
+from formats import (FormatHandler, UnsupportedStructureError, register_handler, find_handler, read_header,
+                     supported_extensions)
+from png_chunks import PNG_SIGNATURE, IHDR, IHDR_DATA, iter_chunks, read_chunk_data
+from timing import (StageTimer, NULL_TIMER, STAGE_SNIFF, STAGE_PARSE, STAGE_DECIDE,
+                    STAGE_WRITE)
+
+
+# 不含元数据的文件的输出方式
+CLEAN_REWRITE = 'rewrite'     # 与其他文件一样逐块重写
+CLEAN_COPY = 'copy'           # 整个文件复制
+CLEAN_HARDLINK = 'hardlink'   # 同一文件系统时创建硬链接，否则整个复制
+CLEAN_STRATEGIES = (CLEAN_REWRITE, CLEAN_COPY, CLEAN_HARDLINK)
+
+# 原地处理时不含元数据、未做任何修改的文件的输出方式
+OUTPUT_UNCHANGED = 'unchanged'
+
+
+# PNG块处理器 - 基于流的元数据去除算法
+class PNGBlockProcessor:
+    """高效PNG元数据去除器 - 基于块的流式处理算法"""
+    
+    # PNG文件签名 (8字节)
+    PNG_SIGNATURE = PNG_SIGNATURE
+    
+    # 块类型均为4字节bytes，与png_chunks.iter_chunks返回的类型直接比较
+    # 关键块 (Critical Chunks) - 必须保留
+    CRITICAL_CHUNKS = {b'IHDR', b'PLTE', b'IDAT', b'IEND'}
+    
+    # 安全辅助块白名单 - 对图像显示重要但不包含工作流
+    SAFE_ANCILLARY_CHUNKS = {
+        b'sRGB',   # sRGB颜色空间
+        b'gAMA',   # Gamma校正
+        b'iCCP',   # ICC颜色配置文件
+        b'pHYs',   # 物理像素尺寸
+        b'cHRM',   # 色度信息
+        b'bKGD',   # 背景色
+        b'hIST',   # 直方图
+        b'tRNS',   # 透明度信息
+    }
+    
+    # 需要丢弃的块类型（包含工作流元数据）
+    METADATA_CHUNKS = {
+        b'tEXt', b'zTXt', b'iTXt',  # 文本元数据
+        b'eXIf',                    # EXIF数据
+        b'tIME',                    # 最后修改时间
+    }
+    
+    def __init__(self, limits=None):
+        """
+        Args:
+            limits: 可选的ResourceLimits，限制块长度、块数量和输出大小
+        """
+        self.limits = limits or DEFAULT_LIMITS
+    
+    def process_png_streaming(self, input_path: str, output_path: str, scan: dict = None,
+                              timer=NULL_TIMER) -> bool:
+        """
+        流式处理PNG文件 - 只重组文件结构，完全不碰图像数据
+        
+        先只读取块头规划需要保留的字节范围，再交给内核直接复制，
+        IDAT等块的数据不会经过Python对象。
+        
+        Args:
+            input_path: 输入PNG文件路径
+            output_path: 输出PNG文件路径
+            scan: 已有的scan_png结果，传入时不再重复解析块头
+            timer: 可选的StageTimer，记录解析、规划和写入各阶段的耗时
+            
+        Returns:
+            bool: 处理是否成功
+        """
+        try:
+            # 使用无缓冲读取，规划阶段只读取每个块的8字节块头
+            with open(input_path, 'rb', buffering=0) as input_file:
+                self._process_file(input_file, output_path, scan=scan, timer=timer)
+                return True
+                
+        except Exception as e:
+            print(f"PNG处理失败: {str(e)}")
+            return False
+    
+    def _process_file(self, input_file, output_path: str, scan: dict = None, timer=NULL_TIMER):
+        """处理已打开的PNG文件，失败时抛出异常"""
+        # 1. 扫描块结构（同时验证PNG签名）
+        if scan is None:
+            with timer.stage(STAGE_PARSE):
+                scan = self._scan_file(input_file)
+        if not scan['is_png']:
+            raise ValueError("不是有效的PNG文件")
+        
+        # 2. 规划需要保留的字节范围
+        with timer.stage(STAGE_DECIDE):
+            keep_ranges, chunks_processed, chunks_skipped = self._plan_keep_ranges(scan['chunks'])
+            self.limits.check_output(sum(length for _, length in keep_ranges))
+        
+        # 3. 按范围复制签名和保留的块
+        with timer.stage(STAGE_WRITE):
+            with open_output(output_path) as output_file:
+                copy_ranges(input_file, output_file, keep_ranges, self.limits)
+        
+        print(f"处理完成: 保留{chunks_processed}个块，跳过{chunks_skipped}个元数据块")
+    
+    def scan_png(self, file_path: str) -> dict:
+        """
+        快速扫描PNG结构 - 只读取8字节块头，块数据全部用seek跳过
+        
+        已经干净的文件只需读取几百字节即可判断，不必读取和重写整个文件。
+        
+        Args:
+            file_path: PNG文件路径
+            
+        Returns:
+            dict: 扫描结果
+                is_png: 是否为PNG文件
+                file_size: 文件大小
+                chunks: [PNGChunk, ...]，块类型为4字节bytes
+                has_metadata: 是否包含METADATA_CHUNKS中的块
+                trailing_bytes: IEND之后多余的字节数
+                needs_stripping: 是否需要重写（包含元数据或尾部多余数据）
+        """
+        with open(file_path, 'rb', buffering=0) as input_file:
+            return self._scan_file(input_file)
+    
+    def _scan_file(self, input_file) -> dict:
+        """扫描已打开的PNG文件，块数据损坏或不完整时抛出ValueError"""
+        file_size = _file_size(input_file)
+        
+        input_file.seek(0)
+        if input_file.read(8) != self.PNG_SIGNATURE:
+            return {'is_png': False, 'file_size': file_size, 'chunks': [],
+                    'has_metadata': False, 'trailing_bytes': 0, 'needs_stripping': False}
+        
+        # 只读取每个块的8字节块头，块数据用seek跳过，不把整个文件读入或映射到内存
+        # 块长度已由iter_chunks与实际文件大小比较，这里再检查配置的长度和数量上限
+        limits = self.limits
+        chunks = []
+        for chunk in iter_chunks(input_file, end=file_size):
+            chunks.append(chunk)
+            limits.check_chunk(chunk.type, chunk.length, len(chunks))
+        
+        metadata_chunks = self.METADATA_CHUNKS
+        has_metadata = any(chunk.type in metadata_chunks for chunk in chunks)
+        trailing_bytes = file_size - (chunks[-1].end if chunks else 8)
+        return {
+            'is_png': True,
+            'file_size': file_size,
+            'chunks': chunks,
+            'has_metadata': has_metadata,
+            'trailing_bytes': trailing_bytes,
+            'needs_stripping': has_metadata or trailing_bytes > 0
+        }
+    
+    def _plan_keep_ranges(self, chunks):
+        """
+        根据扫描得到的块列表，生成需要保留的字节范围
+        
+        Returns:
+            tuple: (保留范围列表, 保留块数, 跳过块数)
+        """
+        # PNG签名始终保留
+        keep_ranges = [(0, 8)]
+        chunks_processed = 0
+        chunks_skipped = 0
+        
+        for chunk in chunks:
+            chunk_type = chunk.type
+            
+            # 决策逻辑：保留或丢弃块
+            # 关键块必须保留
+            is_critical = chunk_type in self.CRITICAL_CHUNKS
+            
+            # 安全辅助块可以保留
+            is_safe_ancillary = chunk_type in self.SAFE_ANCILLARY_CHUNKS
+            
+            # 需要丢弃的元数据块
+            is_metadata = chunk_type in self.METADATA_CHUNKS
+            
+            if is_critical or is_safe_ancillary:
+                # 这是"好"块，原封不动保留
+                keep_ranges.append((chunk.offset, chunk.size))
+                chunks_processed += 1
+            elif is_metadata:
+                # 这是"坏"块（包含工作流），直接跳过
+                chunks_skipped += 1
+            else:
+                # 未知的辅助块，默认保留以确保兼容性
+                keep_ranges.append((chunk.offset, chunk.size))
+                chunks_processed += 1
+                print(f"警告: 保留未知类型的块: {chunk_type.decode('latin-1')}")
+        
+        return keep_ranges, chunks_processed, chunks_skipped
+    
+    def is_png_file(self, file_path: str) -> bool:
+        """检查文件是否为PNG格式"""
+        try:
+            with open(file_path, 'rb') as f:
+                signature = f.read(8)
+                return signature == self.PNG_SIGNATURE
+        except:
+            return False
+    
+    def get_file_info(self, file_path: str) -> dict:
+        """获取PNG文件的基本信息"""
+        try:
+            with open(file_path, 'rb', buffering=0) as f:
+                # 跳过PNG签名，只读取第一个块（IHDR）
+                f.seek(8)
+                chunk = next(iter_chunks(f), None)
+                if chunk is None or chunk.type != IHDR or chunk.length != IHDR_DATA.size:
+                    return {}
+                
+                # 解析IHDR数据
+                width, height, bit_depth, color_type, compression_method, \
+                filter_method, interlace_method = IHDR_DATA.unpack(read_chunk_data(f, chunk))
+                
+                return {
+                    'width': width,
+                    'height': height,
+                    'bit_depth': bit_depth,
+                    'color_type': color_type,
+                    'is_png': True
+                }
+        except Exception as e:
+            print(f"获取文件信息失败: {str(e)}")
+            return {'is_png': False}
+
+
+# JPEG段处理器 - 基于标记段的流式元数据去除算法
+class JPEGSegmentProcessor:
+    """高效JPEG元数据去除器 - 逐段遍历标记，完全不解码像素"""
+    
+    # JPEG文件起始标记 (SOI)
+    JPEG_SOI = b'\xFF\xD8'
+    
+    # 图像结束标记 (EOI) 和扫描开始标记 (SOS)
+    MARKER_EOI = 0xD9
+    MARKER_SOS = 0xDA
+    
+    # 没有长度字段的独立标记: TEM 和 RST0-RST7
+    STANDALONE_MARKERS = {0x01} | set(range(0xD0, 0xD8))
+    
+    # 需要丢弃的段类型（包含元数据）
+    METADATA_MARKERS = {
+        0xE1: 'APP1',    # EXIF / XMP
+        0xED: 'APP13',   # IPTC (Photoshop)
+        0xFE: 'COM',     # 注释
+    }
+    
+    # 熵编码数据的扫描缓冲区大小
+    SCAN_BUFFER_SIZE = 64 * 1024
+    
+    def __init__(self, limits=None):
+        """
+        Args:
+            limits: 可选的ResourceLimits，限制段数量和处理时间
+        """
+        self.limits = limits or DEFAULT_LIMITS
+        # 最近一次处理中被丢弃的段名称
+        self.removed_segments = []
+    
+    def process_jpeg_streaming(self, input_path: str, output_path: str) -> bool:
+        """
+        流式处理JPEG文件 - 只丢弃元数据段，SOF/DHT/DQT/SOS及熵编码数据原样复制
+        
+        Args:
+            input_path: 输入JPEG文件路径
+            output_path: 输出JPEG文件路径
+            
+        Returns:
+            bool: 处理是否成功
+        """
+        try:
+            with open(input_path, 'rb') as input_file:
+                self._process_file(input_file, output_path)
+                return True
+                
+        except Exception as e:
+            print(f"JPEG处理失败: {str(e)}")
+            return False
+    
+    def _process_file(self, input_file, output_path: str):
+        """
+        处理已打开的JPEG文件，失败时抛出异常
+        
+        标记按字节读取，input_file需要带缓冲。
+        """
+        with open_output(output_path) as output_file:
+            # 1. 验证并写入SOI标记
+            soi = input_file.read(2)
+            if soi != self.JPEG_SOI:
+                raise ValueError("不是有效的JPEG文件")
+            output_file.write(soi)
+            
+            segments_processed = 0
+            segments_skipped = 0
+            self.removed_segments = []
+            
+            # 2. 逐段处理，SOS之后的熵编码数据由扫描函数复制并返回下一个标记
+            marker = self._read_marker(input_file)
+            while True:
+                if marker is None:
+                    raise ValueError("JPEG数据不完整: 缺少EOI标记")
+                
+                if marker == self.MARKER_EOI:
+                    output_file.write(bytes((0xFF, marker)))
+                    break
+                
+                if marker in self.STANDALONE_MARKERS:
+                    output_file.write(bytes((0xFF, marker)))
+                    marker = self._read_marker(input_file)
+                    continue
+                
+                # 读取段长度 (2字节，包含长度字段本身)
+                length_bytes = input_file.read(2)
+                if len(length_bytes) != 2:
+                    raise ValueError(f"段长度不完整: 0x{marker:02X}")
+                segment_length = struct.unpack('>H', length_bytes)[0]
+                if segment_length < 2:
+                    raise ValueError(f"段长度无效: 0x{marker:02X}")
+                self.limits.check_chunk(f"0x{marker:02X}", segment_length,
+                                        segments_processed + segments_skipped + 1)
+                
+                segment_data = input_file.read(segment_length - 2)
+                if len(segment_data) != segment_length - 2:
+                    raise ValueError(f"段数据不完整: 0x{marker:02X}")
+                
+                # 3. 决策逻辑：元数据段丢弃，其余段原样写回
+                if marker in self.METADATA_MARKERS:
+                    segments_skipped += 1
+                    self.removed_segments.append(self.METADATA_MARKERS[marker])
+                else:
+                    output_file.write(bytes((0xFF, marker)))
+                    output_file.write(length_bytes)
+                    output_file.write(segment_data)
+                    segments_processed += 1
+                
+                # 4. SOS之后紧跟熵编码数据，原样复制直到下一个标记
+                if marker == self.MARKER_SOS:
+                    marker = self._copy_entropy_coded_data(input_file, output_file)
+                else:
+                    marker = self._read_marker(input_file)
+            
+            print(f"处理完成: 保留{segments_processed}个段，跳过{segments_skipped}个元数据段")
+    
+    def _read_marker(self, input_file):
+        """读取下一个标记，跳过填充字节0xFF；文件结束时返回None"""
+        prefix = input_file.read(1)
+        if not prefix:
+            return None
+        if prefix != b'\xFF':
+            raise ValueError(f"标记格式错误: 0x{prefix[0]:02X}")
+        
+        while True:
+            marker = input_file.read(1)
+            if not marker:
+                return None
+            if marker != b'\xFF':
+                return marker[0]
+    
+    def _copy_entropy_coded_data(self, input_file, output_file):
+        """
+        原样复制熵编码数据，直到遇到真正的标记；output_file为None时只查找标记，不写出
+        
+        0xFF00 (字节填充) 和 RST0-RST7 属于扫描数据的一部分。
+        
+        Returns:
+            int | None: 扫描数据之后的标记，文件结束时返回None
+        """
+        pending = b''
+        while True:
+            self.limits.check_time()
+            block = input_file.read(self.SCAN_BUFFER_SIZE)
+            if not block:
+                if output_file is not None:
+                    output_file.write(pending)
+                return None
+            
+            data = pending + block if pending else block
+            view = memoryview(data)
+            pos = 0
+            while True:
+                index = data.find(b'\xFF', pos)
+                if index == -1:
+                    if output_file is not None:
+                        output_file.write(view)
+                    pending = b''
+                    break
+                if index == len(data) - 1:
+                    # 0xFF位于缓冲区末尾，留到下一轮判断
+                    if output_file is not None:
+                        output_file.write(view[:index])
+                    pending = b'\xFF'
+                    break
+                
+                next_byte = data[index + 1]
+                if next_byte == 0x00 or 0xD0 <= next_byte <= 0xD7 or next_byte == 0xFF:
+                    pos = index + 1
+                    continue
+                
+                # 找到标记：写出之前的数据，并把读多的部分退回文件
+                if output_file is not None:
+                    output_file.write(view[:index])
+                input_file.seek(-(len(data) - index - 2), os.SEEK_CUR)
+                return next_byte
+    
+    def _scan_file(self, input_file) -> dict:
+        """
+        检查JPEG是否包含需要去除的内容，遇到第一个元数据段即停止
+        
+        带元数据的文件通常在开头几个段就能确定；不含元数据的文件要遍历到EOI
+        （渐进式JPEG的各次扫描之间也可能有段），并检查EOI之后是否有多余数据。
+        段数据用seek跳过，熵编码数据只查找标记、不写出。input_file需要带缓冲。
+        
+        Returns:
+            dict: file_size、has_metadata、trailing_bytes、needs_stripping
+        """
+        file_size = _file_size(input_file)
+        input_file.seek(0)
+        if input_file.read(2) != self.JPEG_SOI:
+            raise ValueError("不是有效的JPEG文件")
+        
+        segment_count = 0
+        marker = self._read_marker(input_file)
+        while True:
+            if marker is None:
+                raise ValueError("JPEG数据不完整: 缺少EOI标记")
+            if marker == self.MARKER_EOI:
+                break
+            if marker in self.METADATA_MARKERS:
+                return {'file_size': file_size, 'has_metadata': True, 'trailing_bytes': 0,
+                        'needs_stripping': True}
+            if marker in self.STANDALONE_MARKERS:
+                marker = self._read_marker(input_file)
+                continue
+            
+            length_bytes = input_file.read(2)
+            if len(length_bytes) != 2:
+                raise ValueError(f"段长度不完整: 0x{marker:02X}")
+            segment_length = struct.unpack('>H', length_bytes)[0]
+            if segment_length < 2 or input_file.tell() + segment_length - 2 > file_size:
+                raise ValueError(f"段数据不完整: 0x{marker:02X}")
+            segment_count += 1
+            self.limits.check_chunk(f"0x{marker:02X}", segment_length, segment_count)
+            input_file.seek(segment_length - 2, os.SEEK_CUR)
+            
+            if marker == self.MARKER_SOS:
+                marker = self._copy_entropy_coded_data(input_file, None)
+            else:
+                marker = self._read_marker(input_file)
+        
+        # 重写时EOI之后的数据会被丢弃
+        trailing_bytes = file_size - input_file.tell()
+        return {'file_size': file_size, 'has_metadata': False, 'trailing_bytes': trailing_bytes,
+                'needs_stripping': trailing_bytes > 0}
+    
+    def _scan_header_segments(self, input_file) -> list:
+        """
+        扫描第一个SOS之前的标记段，只读取标记和长度，段数据用seek跳过
+        
+        元数据段位于图像数据之前，审计时不必读取熵编码数据。
+        
+        Returns:
+            list: [(标记, 段起始偏移, 段长度), ...]，段长度包含2字节标记
+        """
+        file_size = _file_size(input_file)
+        input_file.seek(0)
+        if input_file.read(2) != self.JPEG_SOI:
+            raise ValueError("不是有效的JPEG文件")
+        
+        segments = []
+        offset = 2
+        while offset + 2 <= file_size:
+            input_file.seek(offset)
+            header = input_file.read(4)
+            if header[0] != 0xFF:
+                raise ValueError(f"标记格式错误: 0x{header[0]:02X}")
+            marker = header[1]
+            if marker == 0xFF:
+                # 填充字节
+                offset += 1
+                continue
+            if marker in (self.MARKER_SOS, self.MARKER_EOI):
+                break
+            if marker in self.STANDALONE_MARKERS:
+                offset += 2
+                continue
+            
+            if len(header) != 4:
+                raise ValueError(f"段长度不完整: 0x{marker:02X}")
+            segment_length = struct.unpack('>H', header[2:4])[0]
+            if segment_length < 2 or offset + 2 + segment_length > file_size:
+                raise ValueError(f"段数据不完整: 0x{marker:02X}")
+            segments.append((marker, offset, segment_length + 2))
+            self.limits.check_chunk(f"0x{marker:02X}", segment_length, len(segments))
+            offset += 2 + segment_length
+        
+        return segments
+    
+    def is_jpeg_file(self, file_path: str) -> bool:
+        """检查文件是否为JPEG格式"""
+        try:
+            with open(file_path, 'rb') as f:
+                return f.read(2) == self.JPEG_SOI
+        except:
+            return False
+
+
+# WebP块处理器 - 基于RIFF块的流式元数据去除算法
+class WebPChunkProcessor:
+    """高效WebP元数据去除器 - 逐块遍历RIFF结构，VP8/VP8L/ANIM等图像数据原样复制"""
+    
+    # RIFF文件头: 'RIFF' + 4字节小端长度 + 'WEBP'
+    RIFF_SIGNATURE = b'RIFF'
+    WEBP_SIGNATURE = b'WEBP'
+    
+    # 需要丢弃的元数据块
+    METADATA_CHUNKS = {'EXIF', 'XMP '}
+    
+    # ICC颜色配置块，根据keep_icc决定是否保留
+    ICC_CHUNK = 'ICCP'
+    
+    # 扩展格式块，其中的标志位声明了文件包含哪些可选块
+    VP8X_CHUNK = 'VP8X'
+    VP8X_FLAG_ICC = 0x20
+    VP8X_FLAG_EXIF = 0x08
+    VP8X_FLAG_XMP = 0x04
+    
+    def __init__(self, keep_icc: bool = True, limits=None):
+        """
+        Args:
+            keep_icc: 是否保留ICC颜色配置（ICCP块）
+            limits: 可选的ResourceLimits，限制块长度和块数量
+        """
+        self.keep_icc = keep_icc
+        self.limits = limits or DEFAULT_LIMITS
+        # 最近一次处理中被丢弃的块名称
+        self.removed_chunks = []
+    
+    def process_webp_streaming(self, input_path: str, output_path: str, scan: dict = None,
+                               timer=NULL_TIMER) -> bool:
+        """
+        流式处理WebP文件 - 丢弃元数据块，清除VP8X中对应的标志位并修正RIFF长度
+        
+        Args:
+            input_path: 输入WebP文件路径
+            output_path: 输出WebP文件路径
+            scan: 已有的scan_webp结果，传入时不再重复解析块头
+            timer: 可选的StageTimer，记录解析、规划和写入各阶段的耗时
+            
+        Returns:
+            bool: 处理是否成功
+        """
+        try:
+            with open(input_path, 'rb', buffering=0) as input_file:
+                self._process_file(input_file, output_path, scan=scan, timer=timer)
+                return True
+                
+        except Exception as e:
+            print(f"WebP处理失败: {str(e)}")
+            return False
+    
+    def _process_file(self, input_file, output_path: str, scan: dict = None, timer=NULL_TIMER):
+        """处理已打开的WebP文件，失败时抛出异常"""
+        # 1. 扫描块结构（同时验证RIFF/WEBP签名）
+        if scan is None:
+            with timer.stage(STAGE_PARSE):
+                scan = self._scan_file(input_file)
+        if not scan['is_webp']:
+            raise ValueError("不是有效的WebP文件")
+        
+        # 2. 规划输出内容：保留的块按字节范围复制，VP8X块需要改写标志位
+        with timer.stage(STAGE_DECIDE):
+            pieces = self._plan_output(input_file, scan['chunks'])
+        
+        # 3. 写入文件头、保留的块，最后回填RIFF长度
+        with timer.stage(STAGE_WRITE):
+            with open_output(output_path) as output_file:
+                output_file.write(self.RIFF_SIGNATURE + b'\x00\x00\x00\x00' + self.WEBP_SIGNATURE)
+                ranges = []
+                for piece in pieces:
+                    if isinstance(piece, bytes):
+                        copy_ranges(input_file, output_file, ranges, self.limits)
+                        ranges = []
+                        output_file.write(piece)
+                    else:
+                        ranges.append(piece)
+                copy_ranges(input_file, output_file, ranges, self.limits)
+                
+                riff_size = output_file.tell() - 8
+                output_file.seek(4)
+                output_file.write(struct.pack('<I', riff_size))
+        
+        kept = len(scan['chunks']) - len(self.removed_chunks)
+        print(f"处理完成: 保留{kept}个块，跳过{len(self.removed_chunks)}个元数据块")
+    
+    def scan_webp(self, file_path: str) -> dict:
+        """
+        快速扫描WebP结构 - 只读取8字节块头，块数据全部用seek跳过
+        
+        Args:
+            file_path: WebP文件路径
+            
+        Returns:
+            dict: 扫描结果
+                is_webp: 是否为WebP文件
+                file_size: 文件大小
+                chunks: [(块类型, 块起始偏移, 数据长度), ...]
+                vp8x_flags: VP8X块的标志位，没有VP8X块时为None
+                trailing_bytes: RIFF数据之后多余的字节数
+                needs_stripping: 是否需要重写
+        """
+        with open(file_path, 'rb', buffering=0) as input_file:
+            return self._scan_file(input_file)
+    
+    def _scan_file(self, input_file) -> dict:
+        """扫描已打开的WebP文件，块数据损坏或不完整时抛出ValueError"""
+        file_size = _file_size(input_file)
+        
+        input_file.seek(0)
+        header = input_file.read(12)
+        if len(header) != 12 or header[:4] != self.RIFF_SIGNATURE or header[8:] != self.WEBP_SIGNATURE:
+            return {'is_webp': False, 'file_size': file_size, 'chunks': [], 'vp8x_flags': None,
+                    'trailing_bytes': 0, 'needs_stripping': False}
+        
+        riff_end = 8 + struct.unpack('<I', header[4:8])[0]
+        if riff_end > file_size:
+            raise ValueError(f"RIFF数据不完整: 声明{riff_end}字节，文件只有{file_size}字节")
+        
+        chunks = []
+        vp8x_flags = None
+        offset = 12
+        while offset + 8 <= riff_end:
+            input_file.seek(offset)
+            fourcc, chunk_length = struct.unpack('<4sI', input_file.read(8))
+            if offset + 8 + chunk_length > riff_end:
+                raise ValueError(f"块数据不完整: {fourcc!r}")
+            
+            chunk_type = fourcc.decode('latin-1')
+            if chunk_type == self.VP8X_CHUNK and not chunks and chunk_length >= 1:
+                vp8x_flags = input_file.read(1)[0]
+            chunks.append((chunk_type, offset, chunk_length))
+            self.limits.check_chunk(chunk_type, chunk_length, len(chunks))
+            
+            # 奇数长度的块后面有一个填充字节
+            offset += 8 + chunk_length + (chunk_length & 1)
+        
+        has_metadata = any(self._is_removed(chunk[0]) for chunk in chunks)
+        stale_flags = vp8x_flags is not None and vp8x_flags & self._cleared_flags() != 0
+        trailing_bytes = file_size - riff_end
+        return {
+            'is_webp': True,
+            'file_size': file_size,
+            'chunks': chunks,
+            'vp8x_flags': vp8x_flags,
+            'trailing_bytes': trailing_bytes,
+            'needs_stripping': has_metadata or stale_flags or trailing_bytes > 0,
+        }
+    
+    def _is_removed(self, chunk_type: str) -> bool:
+        return chunk_type in self.METADATA_CHUNKS or (chunk_type == self.ICC_CHUNK and not self.keep_icc)
+    
+    def _cleared_flags(self) -> int:
+        """需要从VP8X中清除的标志位"""
+        flags = self.VP8X_FLAG_EXIF | self.VP8X_FLAG_XMP
+        if not self.keep_icc:
+            flags |= self.VP8X_FLAG_ICC
+        return flags
+    
+    def _plan_output(self, input_file, chunks):
+        """
+        规划输出内容
+        
+        Returns:
+            list: 按顺序排列的 (偏移, 长度) 字节范围或需要直接写入的bytes
+        """
+        pieces = []
+        self.removed_chunks = []
+        riff_end = 8 + struct.unpack('<I', self._read_at(input_file, 4, 4))[0]
+        
+        for chunk_type, offset, chunk_length in chunks:
+            if self._is_removed(chunk_type):
+                self.removed_chunks.append(chunk_type.strip())
+                continue
+            
+            # 包含填充字节（个别编码器省略了最后一个块的填充字节）
+            size = min(8 + chunk_length + (chunk_length & 1), riff_end - offset)
+            if chunk_type == self.VP8X_CHUNK and pieces == [] and chunk_length >= 1:
+                # 改写VP8X的第一个字节（标志位），其余部分原样复制
+                flags = self._read_at(input_file, offset + 8, 1)[0] & ~self._cleared_flags()
+                pieces.append(self._read_at(input_file, offset, 8) + bytes([flags]))
+                pieces.append((offset + 9, size - 9))
+            else:
+                pieces.append((offset, size))
+        
+        return pieces
+    
+    def _read_at(self, input_file, offset, length):
+        input_file.seek(offset)
+        return input_file.read(length)
+    
+    def is_webp_file(self, file_path: str) -> bool:
+        """检查文件是否为WebP格式"""
+        try:
+            with open(file_path, 'rb') as f:
+                header = f.read(12)
+                return header[:4] == self.RIFF_SIGNATURE and header[8:12] == self.WEBP_SIGNATURE
+        except:
+            return False
+
+
+# GIF块处理器 - 基于块结构的流式元数据去除算法
+class GIFBlockProcessor:
+    """高效GIF元数据去除器 - 遍历块结构，图像描述符和LZW数据子块原样复制，保留所有帧"""
+    
+    # GIF文件签名
+    GIF_SIGNATURES = (b'GIF87a', b'GIF89a')
+    
+    # 块引导字节
+    EXTENSION_INTRODUCER = 0x21
+    IMAGE_SEPARATOR = 0x2C
+    TRAILER = 0x3B
+    
+    # 扩展块标签
+    LABEL_GRAPHIC_CONTROL = 0xF9
+    LABEL_COMMENT = 0xFE
+    LABEL_APPLICATION = 0xFF
+    LABEL_PLAIN_TEXT = 0x01
+    
+    # 需要保留的应用扩展：循环次数等动画参数
+    ANIMATION_APPLICATIONS = {b'NETSCAPE2.0', b'ANIMEXTS1.0'}
+    
+    # ICC颜色配置的应用扩展，根据keep_icc决定是否保留
+    ICC_APPLICATION = b'ICCRGBG1012'
+    
+    def __init__(self, keep_icc: bool = True, limits=None):
+        """
+        Args:
+            keep_icc: 是否保留ICC颜色配置（ICCRGBG1应用扩展）
+            limits: 可选的ResourceLimits，限制块长度和块数量
+        """
+        self.keep_icc = keep_icc
+        self.limits = limits or DEFAULT_LIMITS
+        # 最近一次处理中被丢弃的块名称
+        self.removed_blocks = []
+    
+    def process_gif_streaming(self, input_path: str, output_path: str, scan: dict = None,
+                              timer=NULL_TIMER) -> bool:
+        """
+        流式处理GIF文件 - 只丢弃注释和应用扩展块，所有帧原样复制
+        
+        Args:
+            input_path: 输入GIF文件路径
+            output_path: 输出GIF文件路径
+            scan: 已有的scan_gif结果，传入时不再重复解析块结构
+            timer: 可选的StageTimer，记录解析、规划和写入各阶段的耗时
+            
+        Returns:
+            bool: 处理是否成功
+        """
+        try:
+            with open(input_path, 'rb', buffering=0) as input_file:
+                self._process_file(input_file, output_path, scan=scan, timer=timer)
+                return True
+                
+        except Exception as e:
+            print(f"GIF处理失败: {str(e)}")
+            return False
+    
+    def _process_file(self, input_file, output_path: str, scan: dict = None, timer=NULL_TIMER):
+        """处理已打开的GIF文件，失败时抛出异常"""
+        # 1. 扫描块结构（同时验证GIF签名）
+        if scan is None:
+            with timer.stage(STAGE_PARSE):
+                scan = self._scan_file(input_file)
+        if not scan['is_gif']:
+            raise ValueError("不是有效的GIF文件")
+        
+        # 2. 规划需要保留的字节范围
+        with timer.stage(STAGE_DECIDE):
+            keep_ranges = []
+            self.removed_blocks = []
+            for block_type, offset, length in scan['blocks']:
+                if self._is_removed(block_type):
+                    self.removed_blocks.append(block_type)
+                else:
+                    keep_ranges.append((offset, length))
+        
+        # 3. 按范围复制，缺少结束标记的文件补上结束标记
+        with timer.stage(STAGE_WRITE):
+            with open_output(output_path) as output_file:
+                copy_ranges(input_file, output_file, keep_ranges, self.limits)
+                if not scan['has_trailer']:
+                    output_file.write(bytes([self.TRAILER]))
+        
+        kept = len(scan['blocks']) - len(self.removed_blocks)
+        print(f"处理完成: 保留{kept}个块，跳过{len(self.removed_blocks)}个元数据块")
+    
+    def scan_gif(self, file_path: str) -> dict:
+        """
+        扫描GIF块结构
+        
+        使用mmap按子块长度逐个跳过LZW数据，数据本身不复制到Python对象中。
+        
+        Args:
+            file_path: GIF文件路径
+            
+        Returns:
+            dict: 扫描结果
+                is_gif: 是否为GIF文件
+                file_size: 文件大小
+                blocks: [(块类型, 起始偏移, 长度), ...]，块类型为 HEADER / IMAGE / GCE /
+                    PLAINTEXT / COMMENT / APP:标识符 / EXT:标签 / TRAILER
+                has_trailer: 是否有结束标记
+                trailing_bytes: 结束标记之后多余的字节数
+                needs_stripping: 是否需要重写
+        """
+        with open(file_path, 'rb', buffering=0) as input_file:
+            return self._scan_file(input_file)
+    
+    def _scan_file(self, input_file) -> dict:
+        """扫描已打开的GIF文件，块数据损坏或不完整时抛出ValueError"""
+        file_size = _file_size(input_file)
+        
+        input_file.seek(0)
+        if file_size < 13 or input_file.read(6) not in self.GIF_SIGNATURES:
+            return {'is_gif': False, 'file_size': file_size, 'blocks': [], 'has_trailer': False,
+                    'trailing_bytes': 0, 'needs_stripping': False}
+        
+        limits = self.limits
+        with map_file(input_file) as data:
+            blocks = []
+            
+            # 文件头、逻辑屏幕描述符和全局颜色表
+            offset = 13
+            if data[10] & 0x80:
+                offset += 3 << ((data[10] & 0x07) + 1)
+            blocks.append(('HEADER', 0, offset))
+            
+            has_trailer = False
+            while offset < file_size:
+                start = offset
+                introducer = data[offset]
+                
+                if introducer == self.TRAILER:
+                    blocks.append(('TRAILER', offset, 1))
+                    offset += 1
+                    has_trailer = True
+                    break
+                elif introducer == self.IMAGE_SEPARATOR:
+                    # 图像描述符 (10字节) + 局部颜色表 + LZW最小码长 + 数据子块
+                    if offset + 10 > file_size:
+                        raise ValueError("图像描述符不完整")
+                    packed = data[offset + 9]
+                    offset += 10
+                    if packed & 0x80:
+                        offset += 3 << ((packed & 0x07) + 1)
+                    offset = self._skip_sub_blocks(data, offset + 1, file_size)
+                    blocks.append(('IMAGE', start, offset - start))
+                    limits.check_chunk('IMAGE', offset - start, len(blocks))
+                elif introducer == self.EXTENSION_INTRODUCER:
+                    if offset + 2 > file_size:
+                        raise ValueError("扩展块不完整")
+                    block_type = self._extension_type(data, offset)
+                    offset = self._skip_sub_blocks(data, offset + 2, file_size)
+                    blocks.append((block_type, start, offset - start))
+                    limits.check_chunk(block_type, offset - start, len(blocks))
+                else:
+                    raise ValueError(f"未知的块引导字节: 0x{introducer:02X} (偏移{offset})")
+        
+        trailing_bytes = file_size - offset
+        has_metadata = any(self._is_removed(block[0]) for block in blocks)
+        return {
+            'is_gif': True,
+            'file_size': file_size,
+            'blocks': blocks,
+            'has_trailer': has_trailer,
+            'trailing_bytes': trailing_bytes,
+            'needs_stripping': has_metadata or trailing_bytes > 0 or not has_trailer,
+        }
+    
+    def _extension_type(self, data, offset) -> str:
+        """根据扩展标签（应用扩展还需要标识符）得到块类型"""
+        label = data[offset + 1]
+        if label == self.LABEL_GRAPHIC_CONTROL:
+            return 'GCE'
+        if label == self.LABEL_PLAIN_TEXT:
+            return 'PLAINTEXT'
+        if label == self.LABEL_COMMENT:
+            return 'COMMENT'
+        if label == self.LABEL_APPLICATION:
+            # 第一个子块为11字节: 8字节应用标识符 + 3字节认证码
+            if offset + 3 + 11 <= len(data) and data[offset + 2] == 11:
+                identifier = data[offset + 3:offset + 14]
+                return 'APP:' + identifier.decode('latin-1')
+            return 'APP:'
+        return f'EXT:{label:02X}'
+    
+    def _skip_sub_blocks(self, data, offset, file_size) -> int:
+        """跳过一串数据子块（每个子块以长度字节开头，以长度0结束），返回结束后的偏移"""
+        while True:
+            if offset >= file_size:
+                raise ValueError("数据子块不完整")
+            size = data[offset]
+            offset += 1 + size
+            if size == 0:
+                return offset
+    
+    def _is_removed(self, block_type: str) -> bool:
+        if block_type == 'COMMENT':
+            return True
+        if block_type.startswith('APP:'):
+            identifier = block_type[4:].encode('latin-1')
+            if identifier in self.ANIMATION_APPLICATIONS:
+                return False
+            if identifier == self.ICC_APPLICATION and self.keep_icc:
+                return False
+            return True
+        return False
+    
+    def is_gif_file(self, file_path: str) -> bool:
+        """检查文件是否为GIF格式"""
+        try:
+            with open(file_path, 'rb') as f:
+                return f.read(6) in self.GIF_SIGNATURES
+        except:
+            return False
+
+
+# TIFF处理器 - 基于IFD链的元数据去除算法
+class TIFFProcessor:
+    """高效TIFF元数据去除器 - 解析IFD链，删除元数据标签后重新排列，条带/瓦片数据按偏移直接复制"""
+    
+    # 字节序标记: 小端 'II*\0'，大端 'MM\0*'
+    TIFF_SIGNATURES = {b'II*\x00': '<', b'MM\x00*': '>'}
+    
+    # 需要删除的元数据标签
+    METADATA_TAGS = {
+        270: 'ImageDescription',
+        305: 'Software',
+        306: 'DateTime',
+        315: 'Artist',
+        700: 'XMP',
+        33723: 'IPTC',
+        34377: 'Photoshop',
+        34665: 'ExifIFD',
+        34853: 'GPSIFD',
+    }
+    
+    # ICC颜色配置标签，根据keep_icc决定是否保留
+    ICC_TAG = 34675
+    
+    # 旧式空闲空间记录，重新排列后不再有意义，直接删除
+    FREE_SPACE_TAGS = {288, 289}
+    
+    # 图像数据偏移标签 -> 对应的字节数标签
+    DATA_OFFSET_TAGS = {
+        273: 279,   # StripOffsets -> StripByteCounts
+        324: 325,   # TileOffsets -> TileByteCounts
+    }
+    
+    # 值中包含文件偏移、无法安全重新排列的标签
+    UNSUPPORTED_TAGS = {
+        330: 'SubIFDs',
+        513: 'JPEGInterchangeFormat',
+        514: 'JPEGInterchangeFormatLength',
+    }
+    
+    # 字段类型 -> 单个值的字节数
+    TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 13: 4}
+    TYPE_SHORT = 3
+    TYPE_LONG = 4
+    TYPE_IFD = 13
+    
+    # 经典TIFF使用32位偏移
+    MAX_FILE_SIZE = 0xFFFFFFFF
+    
+    # 防止循环引用的IFD链
+    MAX_IFDS = 10000
+    
+    def __init__(self, keep_icc: bool = True, limits=None):
+        """
+        Args:
+            keep_icc: 是否保留ICC颜色配置（InterColorProfile标签）
+            limits: 可选的ResourceLimits，限制块长度和块数量
+        """
+        self.keep_icc = keep_icc
+        self.limits = limits or DEFAULT_LIMITS
+        # 最近一次处理中被删除的标签名称
+        self.removed_tags = []
+    
+    def process_tiff_streaming(self, input_path: str, output_path: str, scan: dict = None,
+                               timer=NULL_TIMER) -> bool:
+        """
+        处理TIFF文件 - 删除元数据标签，IFD和标签值重新写入，图像数据按范围复制
+        
+        Args:
+            input_path: 输入TIFF文件路径
+            output_path: 输出TIFF文件路径
+            scan: 已有的scan_tiff结果，传入时不再重复解析IFD
+            timer: 可选的StageTimer，记录解析、规划和写入各阶段的耗时
+            
+        Returns:
+            bool: 处理是否成功，文件使用了无法安全重新排列的结构（例如SubIFDs）时也返回False
+        """
+        try:
+            with open(input_path, 'rb', buffering=0) as input_file:
+                self._process_file(input_file, output_path, scan=scan, timer=timer)
+                return True
+                
+        except Exception as e:
+            print(f"TIFF处理失败: {str(e)}")
+            return False
+    
+    def _process_file(self, input_file, output_path: str, scan: dict = None, timer=NULL_TIMER):
+        """处理已打开的TIFF文件，失败时抛出异常"""
+        # 1. 解析IFD链
+        if scan is None:
+            with timer.stage(STAGE_PARSE):
+                scan = self._scan_file(input_file)
+        if not scan['is_tiff']:
+            raise ValueError("不是有效的TIFF文件")
+        
+        with map_file(input_file) as data:
+            # 2. 规划输出文件布局
+            with timer.stage(STAGE_DECIDE):
+                layout = self._plan_layout(data, scan)
+            
+            # 3. 依次写入文件头、每个IFD及其标签值和图像数据
+            with timer.stage(STAGE_WRITE):
+                with open_output(output_path) as output_file:
+                    self._write_layout(data, input_file, output_file, scan['byte_order'], layout)
+        
+        print(f"处理完成: 保留{len(scan['ifds'])}个IFD，删除{len(self.removed_tags)}个元数据标签")
+    
+    def scan_tiff(self, file_path: str) -> dict:
+        """
+        扫描TIFF的IFD链，只读取IFD表和标签值所在的页面，不读取图像数据
+        
+        Args:
+            file_path: TIFF文件路径
+            
+        Returns:
+            dict: 扫描结果
+                is_tiff: 是否为TIFF文件
+                file_size: 文件大小
+                byte_order: struct字节序 ('<' 或 '>')
+                ifds: 每个IFD的标签列表 [(标签, 类型, 数量, 值字段偏移), ...]
+                metadata_tags: 文件中包含的元数据标签名称
+                needs_stripping: 是否需要重写
+        """
+        with open(file_path, 'rb', buffering=0) as input_file:
+            return self._scan_file(input_file)
+    
+    def _scan_file(self, input_file) -> dict:
+        """扫描已打开的TIFF文件，结构损坏时抛出ValueError，不支持的结构抛出UnsupportedStructureError"""
+        file_size = _file_size(input_file)
+        
+        input_file.seek(0)
+        header = input_file.read(8)
+        byte_order = self.TIFF_SIGNATURES.get(header[:4])
+        if len(header) != 8 or byte_order is None:
+            return {'is_tiff': False, 'file_size': file_size, 'byte_order': None, 'ifds': [],
+                    'metadata_tags': [], 'needs_stripping': False}
+        
+        with map_file(input_file) as data:
+            ifds = []
+            metadata_tags = []
+            entry_total = 0
+            seen = set()
+            ifd_offset = struct.unpack(byte_order + 'I', header[4:8])[0]
+            
+            while ifd_offset:
+                if ifd_offset in seen or len(ifds) >= self.MAX_IFDS:
+                    raise ValueError("IFD链存在循环引用")
+                seen.add(ifd_offset)
+                if ifd_offset + 2 > file_size:
+                    raise ValueError(f"IFD偏移超出文件范围: {ifd_offset}")
+                
+                entry_count = struct.unpack_from(byte_order + 'H', data, ifd_offset)[0]
+                entries_end = ifd_offset + 2 + entry_count * 12
+                if entries_end + 4 > file_size:
+                    raise ValueError("IFD数据不完整")
+                
+                entries = []
+                for index in range(entry_count):
+                    entry_offset = ifd_offset + 2 + index * 12
+                    tag, field_type, count = struct.unpack_from(byte_order + 'HHI', data, entry_offset)
+                    value_size = self.TYPE_SIZES.get(field_type, 1) * count
+                    if value_size > 4:
+                        value_offset = struct.unpack_from(byte_order + 'I', data, entry_offset + 8)[0]
+                        if value_offset + value_size > file_size:
+                            raise ValueError(f"标签{tag}的值超出文件范围")
+                    
+                    if self._is_removed(tag):
+                        metadata_tags.append(self._tag_name(tag))
+                    elif tag in self.UNSUPPORTED_TAGS:
+                        raise UnsupportedStructureError(f"不支持包含{self.UNSUPPORTED_TAGS[tag]}标签的TIFF")
+                    elif field_type == self.TYPE_IFD or field_type not in self.TYPE_SIZES:
+                        raise UnsupportedStructureError(f"不支持标签{tag}的字段类型{field_type}")
+                    entries.append((tag, field_type, count, entry_offset + 8))
+                    entry_total += 1
+                    self.limits.check_chunk(f"标签{tag}", value_size, entry_total)
+                
+                tags = {entry[0] for entry in entries}
+                if not any(tag in tags for tag in self.DATA_OFFSET_TAGS):
+                    raise UnsupportedStructureError("IFD中没有条带或瓦片数据")
+                
+                ifds.append(entries)
+                ifd_offset = struct.unpack_from(byte_order + 'I', data, entries_end)[0]
+        
+        return {
+            'is_tiff': True,
+            'file_size': file_size,
+            'byte_order': byte_order,
+            'ifds': ifds,
+            'metadata_tags': metadata_tags,
+            'needs_stripping': bool(metadata_tags),
+        }
+    
+    def _is_removed(self, tag: int) -> bool:
+        return tag in self.METADATA_TAGS or (tag == self.ICC_TAG and not self.keep_icc)
+    
+    def _tag_name(self, tag: int) -> str:
+        return self.METADATA_TAGS.get(tag, 'ICCProfile')
+    
+    def _read_values(self, data, byte_order, field_type, count, value_field):
+        """读取整数类型标签的所有值"""
+        fmt = {self.TYPE_SHORT: 'H', self.TYPE_LONG: 'I'}.get(field_type)
+        if fmt is None:
+            raise ValueError(f"偏移标签的字段类型无效: {field_type}")
+        value_size = self.TYPE_SIZES[field_type] * count
+        offset = value_field
+        if value_size > 4:
+            offset = struct.unpack_from(byte_order + 'I', data, value_field)[0]
+        return struct.unpack_from(f"{byte_order}{count}{fmt}", data, offset)
+    
+    def _plan_layout(self, data, scan):
+        """
+        计算输出文件中每个IFD、标签值和图像数据的位置
+        
+        Returns:
+            list: 每个IFD的布局 {'offset', 'entries', 'data_ranges': [(原偏移, 长度, 新偏移), ...], 'next'}
+        """
+        byte_order = scan['byte_order']
+        file_size = scan['file_size']
+        self.removed_tags = []
+        layout = []
+        position = 8
+        
+        for entries in scan['ifds']:
+            kept = []
+            for tag, field_type, count, value_field in entries:
+                if self._is_removed(tag):
+                    self.removed_tags.append(self._tag_name(tag))
+                elif tag not in self.FREE_SPACE_TAGS:
+                    kept.append((tag, field_type, count, value_field))
+            
+            # IFD表: 2字节数量 + 12字节*标签数 + 4字节下一个IFD偏移
+            ifd = {'offset': position, 'entries': [], 'data_ranges': []}
+            position += 2 + 12 * len(kept) + 4
+            
+            # 图像数据的原始位置
+            byte_counts = {}
+            for tag, field_type, count, value_field in kept:
+                if tag in self.DATA_OFFSET_TAGS.values():
+                    byte_counts[tag] = self._read_values(data, byte_order, field_type, count, value_field)
+            
+            for tag, field_type, count, value_field in kept:
+                if tag in self.DATA_OFFSET_TAGS:
+                    # 偏移统一改写为LONG，值在写入图像数据的位置确定后再填入
+                    offsets = self._read_values(data, byte_order, field_type, count, value_field)
+                    counts = byte_counts.get(self.DATA_OFFSET_TAGS[tag])
+                    if counts is None or len(counts) != len(offsets):
+                        raise ValueError(f"标签{tag}缺少对应的字节数")
+                    for offset, length in zip(offsets, counts):
+                        if offset + length > file_size:
+                            raise ValueError("图像数据超出文件范围")
+                    entry = {'tag': tag, 'type': self.TYPE_LONG, 'count': count,
+                             'source': list(zip(offsets, counts))}
+                else:
+                    entry = {'tag': tag, 'type': field_type, 'count': count, 'value_field': value_field}
+                
+                value_size = self.TYPE_SIZES[entry['type']] * count
+                if value_size > 4:
+                    # 标签值按字（2字节）对齐
+                    position += position & 1
+                    entry['value_offset'] = position
+                    position += value_size
+                ifd['entries'].append(entry)
+            
+            # 图像数据紧跟在标签值之后
+            for entry in ifd['entries']:
+                if 'source' in entry:
+                    new_offsets = []
+                    for offset, length in entry['source']:
+                        position += position & 1
+                        new_offsets.append(position)
+                        ifd['data_ranges'].append((offset, length, position))
+                        position += length
+                    entry['new_offsets'] = new_offsets
+            
+            position += position & 1
+            layout.append(ifd)
+        
+        if position > self.MAX_FILE_SIZE:
+            raise ValueError("输出文件超过经典TIFF的4GB限制")
+        
+        for ifd, next_ifd in zip(layout, layout[1:] + [None]):
+            ifd['next'] = next_ifd['offset'] if next_ifd is not None else 0
+        return layout
+    
+    def _write_layout(self, data, input_file, output_file, byte_order, layout):
+        """按_plan_layout计算的布局写入输出文件"""
+        signature = b'II*\x00' if byte_order == '<' else b'MM\x00*'
+        output_file.write(signature + struct.pack(byte_order + 'I', layout[0]['offset']))
+        
+        for ifd in layout:
+            self._pad_to(output_file, ifd['offset'])
+            
+            # IFD表
+            table = [struct.pack(byte_order + 'H', len(ifd['entries']))]
+            values = []
+            for entry in ifd['entries']:
+                if 'new_offsets' in entry:
+                    raw = struct.pack(f"{byte_order}{entry['count']}I", *entry['new_offsets'])
+                else:
+                    value_size = self.TYPE_SIZES[entry['type']] * entry['count']
+                    source = entry['value_field']
+                    if value_size > 4:
+                        source = struct.unpack_from(byte_order + 'I', data, source)[0]
+                    raw = data[source:source + value_size]
+                
+                field = struct.pack(byte_order + 'HHI', entry['tag'], entry['type'], entry['count'])
+                if 'value_offset' in entry:
+                    field += struct.pack(byte_order + 'I', entry['value_offset'])
+                    values.append((entry['value_offset'], raw))
+                else:
+                    field += raw.ljust(4, b'\x00')
+                table.append(field)
+            table.append(struct.pack(byte_order + 'I', ifd['next']))
+            output_file.write(b''.join(table))
+            
+            # 超过4字节的标签值
+            for value_offset, raw in values:
+                self._pad_to(output_file, value_offset)
+                output_file.write(raw)
+            
+            # 图像数据交给内核按范围复制，不经过Python对象
+            for offset, length, new_offset in ifd['data_ranges']:
+                self._pad_to(output_file, new_offset)
+                copy_ranges(input_file, output_file, [(offset, length)], self.limits)
+    
+    def _pad_to(self, output_file, position):
+        """补零到指定位置（对齐用的填充字节）"""
+        current = output_file.tell()
+        if current < position:
+            output_file.write(b'\x00' * (position - current))
+        elif current > position:
+            raise ValueError(f"TIFF布局计算错误: 当前位置{current}超过目标位置{position}")
+    
+    def is_tiff_file(self, file_path: str) -> bool:
+        """检查文件是否为TIFF格式"""
+        try:
+            with open(file_path, 'rb') as f:
+                return f.read(4) in self.TIFF_SIGNATURES
+        except:
+            return False
+
+
+# PIL重新编码时保留的图像信息：只影响显示效果，不属于元数据
+PIL_KEPT_INFO_KEYS = ('transparency', 'duration', 'loop', 'background', 'compression')
+
+
+def _check_frame_pixels(size):
+    """按PIL的解压炸弹上限检查一帧的像素数；Image.open只检查第一帧，部分格式seek到后续帧时不再检查"""
+    from PIL import Image
+    
+    if Image.MAX_IMAGE_PIXELS is None:
+        return
+    pixels = size[0] * size[1]
+    if pixels > 2 * Image.MAX_IMAGE_PIXELS:
+        raise Image.DecompressionBombError(
+            f"图像像素数{pixels}超过上限{2 * Image.MAX_IMAGE_PIXELS}，可能是解压炸弹")
+
+
+def _copy_frame_pixels(img):
+    """在C层整块复制当前帧的像素和调色板，只保留PIL_KEPT_INFO_KEYS中的信息"""
+    img.load()
+    frame = img.copy()
+    frame.info = {key: img.info[key] for key in PIL_KEPT_INFO_KEYS if key in img.info}
+    return frame
+
+
+def process_non_png_image(image_path, output_path: str, timer=NULL_TIMER, limits=DEFAULT_LIMITS):
+    """
+    使用PIL重新编码没有逐块处理器的格式（BMP、特殊结构的TIFF等）
+    
+    像素和调色板整块复制到新图像，不经过getdata生成逐像素的Python对象，峰值内存约为原始像素大小的两倍；
+    复制出的图像不带原文件的标签和info，多帧图片逐帧复制后一起保存
+    
+    Args:
+        image_path: 图片路径，也可以是已打开的二进制文件
+        output_path: 输出文件路径
+        timer: 记录解码和写入耗时的StageTimer
+        limits: 当前文件的ResourceLimits，用于检查处理时间
+    """
+    # 延迟导入PIL，只有需要重新编码的格式才付出导入开销
+    from PIL import Image, ImageSequence
+    
+    try:
+        with timer.stage(STAGE_PARSE):
+            with Image.open(image_path) as img:
+                img_format = img.format
+                frames = []
+                # 逐帧向后seek，不先读取n_frames（读取后回到第一帧会让部分TIFF的调色板失效）
+                for frame in ImageSequence.Iterator(img):
+                    _check_frame_pixels(frame.size)
+                    frames.append(_copy_frame_pixels(frame))
+                    # 解码期间无法中断，每解码一帧检查一次是否已经超时
+                    limits.check_time()
+        
+        # 保存图片，不传入任何元数据
+        with timer.stage(STAGE_WRITE):
+            save_options = {'format': img_format}
+            if img_format == 'JPEG':
+                save_options['quality'] = 100
+            if len(frames) > 1:
+                if img_format in Image.SAVE_ALL:
+                    save_options.update(save_all=True, append_images=frames[1:])
+                else:
+                    print(f"{img_format}不支持保存多帧，只保存第一帧")
+            if isinstance(output_path, str):
+                # PIL同样以截断方式打开输出文件，先删除可能是硬链接的旧输出
+                unlink_output(output_path)
+            frames[0].save(output_path, **save_options)
+    except Exception as e:
+        raise Exception(f"非PNG图像处理失败: {str(e)}")
+
+
+# 审计时读取的文本块前缀长度（PNG关键字最长79字节）
+TEXT_KEYWORD_READ_SIZE = 80
+
+# EXIF数据IFD0中指向GPS子IFD的标签
+EXIF_GPS_IFD_TAG = 34853
+
+# JPEG APP1段中EXIF和XMP数据的标识
+JPEG_EXIF_PREFIX = b'Exif\x00\x00'
+JPEG_XMP_PREFIX = b'http://ns.adobe.com/xap/1.0/\x00'
+
+
+def _read_at(input_file, offset, length):
+    input_file.seek(offset)
+    return input_file.read(length)
+
+
+def _exif_has_gps(exif_data) -> bool:
+    """EXIF数据（TIFF结构，可以带Exif前缀）的IFD0中是否有GPS子IFD"""
+    if exif_data.startswith(JPEG_EXIF_PREFIX):
+        exif_data = exif_data[len(JPEG_EXIF_PREFIX):]
+    byte_order = TIFFProcessor.TIFF_SIGNATURES.get(bytes(exif_data[:4]))
+    if byte_order is None or len(exif_data) < 8:
+        return False
+    
+    ifd_offset = struct.unpack_from(byte_order + 'I', exif_data, 4)[0]
+    if ifd_offset + 2 > len(exif_data):
+        return False
+    entry_count = struct.unpack_from(byte_order + 'H', exif_data, ifd_offset)[0]
+    for index in range(entry_count):
+        entry_offset = ifd_offset + 2 + index * 12
+        if entry_offset + 2 > len(exif_data):
+            break
+        if struct.unpack_from(byte_order + 'H', exif_data, entry_offset)[0] == EXIF_GPS_IFD_TAG:
+            return True
+    return False
+
+
+def _exif_keyword(exif_data):
+    return 'GPS' if _exif_has_gps(exif_data) else None
+
+
+# 各格式的处理器，按文件头识别后直接处理已经打开的文件
+class BlockFormatHandler(FormatHandler):
+    """先扫描块结构、再决定直接复制还是按块重写的格式处理器"""
+    
+    # 处理失败时的错误信息前缀
+    error_message = None
+    
+    @abc.abstractmethod
+    def create_processor(self, strip_icc: bool, limits=DEFAULT_LIMITS):
+        """创建该格式的块处理器"""
+    
+    @abc.abstractmethod
+    def removed(self, processor, scan) -> list:
+        """被移除的块/标签名称"""
+    
+    def process(self, input_file, image_path: str, output_path: str, clean_strategy: str = CLEAN_COPY,
+                strip_icc: bool = False, timer=NULL_TIMER, limits=DEFAULT_LIMITS) -> dict:
+        processor = self.create_processor(strip_icc, limits)
+        with timer.stage(STAGE_PARSE):
+            try:
+                scan = processor._scan_file(input_file)
+            except ValueError as e:
+                raise Exception(f"{self.error_message}: {str(e)}")
+        
+        with timer.stage(STAGE_DECIDE):
+            use_fast_path = not scan['needs_stripping'] and clean_strategy != CLEAN_REWRITE
+        
+        if use_fast_path:
+            # 输出与输入完全相同，直接链接或整个复制，不再逐块重写
+            with timer.stage(STAGE_WRITE):
+                strategy = link_or_copy_file(image_path, output_path,
+                                             allow_hardlink=clean_strategy == CLEAN_HARDLINK,
+                                             input_file=input_file)
+            return {'format': self.name, 'needs_stripping': False, 'output_strategy': strategy,
+                    'removed': [], 'bytes_in': scan['file_size']}
+        
+        # 复用扫描结果按块重写
+        try:
+            processor._process_file(input_file, output_path, scan=scan, timer=timer)
+        except Exception as e:
+            raise Exception(f"{self.error_message}: {str(e)}")
+        return {'format': self.name, 'needs_stripping': scan['needs_stripping'],
+                'output_strategy': CLEAN_REWRITE, 'removed': self.removed(processor, scan),
+                'bytes_in': scan['file_size']}
+    
+    @abc.abstractmethod
+    def metadata_entries(self, processor, scan, input_file) -> list:
+        """根据扫描结果列出会被去除的元数据 [(类型, 关键字, 字节数), ...]"""
+    
+    def audit(self, input_file):
+        # 按默认设置（保留ICC）扫描，与处理时去除的内容一致
+        processor = self.create_processor(False)
+        try:
+            scan = processor._scan_file(input_file)
+        except ValueError as e:
+            raise Exception(f"{self.error_message}: {str(e)}")
+        
+        entries = self.metadata_entries(processor, scan, input_file)
+        if scan.get('trailing_bytes', 0) > 0:
+            entries.append(('TRAILING', None, scan['trailing_bytes']))
+        return entries
+
+
+class PNGHandler(BlockFormatHandler):
+    """PNG: 只读取块头扫描，需要时按字节范围重写"""
+    
+    name = 'PNG'
+    magic = (PNGBlockProcessor.PNG_SIGNATURE,)
+    extensions = ('.png',)
+    error_message = "PNG块处理失败"
+    
+    # 关键字位于数据开头、以0结尾的文本块
+    TEXT_CHUNKS = {b'tEXt', b'zTXt', b'iTXt'}
+    
+    def create_processor(self, strip_icc, limits=DEFAULT_LIMITS):
+        return PNGBlockProcessor(limits)
+    
+    def removed(self, processor, scan):
+        return [chunk.type.decode('latin-1') for chunk in scan['chunks']
+                if chunk.type in processor.METADATA_CHUNKS]
+    
+    def metadata_entries(self, processor, scan, input_file):
+        entries = []
+        for chunk in scan['chunks']:
+            if chunk.type not in processor.METADATA_CHUNKS:
+                continue
+            keyword = None
+            if chunk.type in self.TEXT_CHUNKS:
+                prefix = read_chunk_data(input_file, chunk, limit=TEXT_KEYWORD_READ_SIZE)
+                keyword = prefix.split(b'\x00', 1)[0].decode('latin-1')
+            elif chunk.type == b'eXIf':
+                keyword = _exif_keyword(read_chunk_data(input_file, chunk))
+            entries.append((chunk.type.decode('latin-1'), keyword, chunk.size))
+        return entries
+
+
+class WebPHandler(BlockFormatHandler):
+    """WebP: 按RIFF块处理，VP8/VP8L图像数据原样复制"""
+    
+    name = 'WEBP'
+    extensions = ('.webp',)
+    error_message = "WebP块处理失败"
+    
+    def matches(self, header):
+        return (header[:4] == WebPChunkProcessor.RIFF_SIGNATURE
+                and header[8:12] == WebPChunkProcessor.WEBP_SIGNATURE)
+    
+    def create_processor(self, strip_icc, limits=DEFAULT_LIMITS):
+        return WebPChunkProcessor(keep_icc=not strip_icc, limits=limits)
+    
+    def removed(self, processor, scan):
+        return processor.removed_chunks
+    
+    def metadata_entries(self, processor, scan, input_file):
+        entries = []
+        for chunk_type, offset, chunk_length in scan['chunks']:
+            if not processor._is_removed(chunk_type):
+                continue
+            keyword = None
+            if chunk_type == 'EXIF':
+                keyword = _exif_keyword(_read_at(input_file, offset + 8, chunk_length))
+            entries.append((chunk_type.strip(), keyword, 8 + chunk_length + (chunk_length & 1)))
+        return entries
+
+
+class GIFHandler(BlockFormatHandler):
+    """GIF: 按块结构处理，所有帧的LZW数据原样复制"""
+    
+    name = 'GIF'
+    magic = GIFBlockProcessor.GIF_SIGNATURES
+    extensions = ('.gif',)
+    error_message = "GIF块处理失败"
+    
+    def create_processor(self, strip_icc, limits=DEFAULT_LIMITS):
+        return GIFBlockProcessor(keep_icc=not strip_icc, limits=limits)
+    
+    def removed(self, processor, scan):
+        return processor.removed_blocks
+    
+    def metadata_entries(self, processor, scan, input_file):
+        return [(block_type, None, length) for block_type, _, length in scan['blocks']
+                if processor._is_removed(block_type)]
+
+
+class TIFFHandler(BlockFormatHandler):
+    """TIFF: 按IFD链处理，条带/瓦片数据按偏移原样复制"""
+    
+    name = 'TIFF'
+    magic = tuple(TIFFProcessor.TIFF_SIGNATURES)
+    extensions = ('.tiff', '.tif')
+    error_message = "TIFF块处理失败"
+    
+    def create_processor(self, strip_icc, limits=DEFAULT_LIMITS):
+        return TIFFProcessor(keep_icc=not strip_icc, limits=limits)
+    
+    def removed(self, processor, scan):
+        return processor.removed_tags
+    
+    def metadata_entries(self, processor, scan, input_file):
+        # 字节数为IFD表项及其值的大小，EXIF/GPS子IFD的内容不计入
+        entries = []
+        for ifd in scan['ifds']:
+            for tag, field_type, count, _ in ifd:
+                if processor._is_removed(tag):
+                    value_size = processor.TYPE_SIZES.get(field_type, 1) * count
+                    keyword = 'GPS' if tag == EXIF_GPS_IFD_TAG else None
+                    entries.append((processor._tag_name(tag), keyword,
+                                    12 + (value_size if value_size > 4 else 0)))
+        return entries
+    
+    def audit(self, input_file):
+        try:
+            return super().audit(input_file)
+        except UnsupportedStructureError:
+            # SubIFDs等结构处理时交给PIL，无法逐个标签审计
+            return None
+    
+    def process(self, input_file, image_path, output_path, clean_strategy=CLEAN_COPY,
+                strip_icc=False, timer=NULL_TIMER, limits=DEFAULT_LIMITS):
+        try:
+            return super().process(input_file, image_path, output_path, clean_strategy,
+                                   strip_icc, timer, limits)
+        except UnsupportedStructureError as e:
+            # SubIFDs等无法重新排列的结构，退回PIL重新编码
+            print(f"TIFF结构不支持直接复制，改用PIL处理: {str(e)}")
+            input_file.seek(0)
+            result = PIL_HANDLER.process(input_file, image_path, output_path, clean_strategy,
+                                         strip_icc, timer, limits)
+            result['format'] = self.name
+            return result
+
+
+class JPEGHandler(FormatHandler):
+    """JPEG: 使用标记段流式处理，不解码像素"""
+    
+    name = 'JPEG'
+    magic = (JPEGSegmentProcessor.JPEG_SOI,)
+    extensions = ('.jpg', '.jpeg')
+    
+    def process(self, input_file, image_path, output_path, clean_strategy=CLEAN_COPY,
+                strip_icc=False, timer=NULL_TIMER, limits=DEFAULT_LIMITS):
+        processor = JPEGSegmentProcessor(limits)
+        # 标记按字节读取，临时套上缓冲区
+        with buffered_reader(input_file) as reader:
+            with timer.stage(STAGE_PARSE):
+                try:
+                    scan = processor._scan_file(reader)
+                except ValueError as e:
+                    raise Exception(f"JPEG段处理失败: {str(e)}")
+            
+            with timer.stage(STAGE_DECIDE):
+                use_fast_path = not scan['needs_stripping'] and clean_strategy != CLEAN_REWRITE
+            
+            if not use_fast_path:
+                with timer.stage(STAGE_WRITE):
+                    reader.seek(0)
+                    try:
+                        processor._process_file(reader, output_path)
+                    except Exception as e:
+                        raise Exception(f"JPEG段处理失败: {str(e)}")
+                return {'format': self.name, 'needs_stripping': scan['needs_stripping'],
+                        'output_strategy': CLEAN_REWRITE, 'removed': processor.removed_segments,
+                        'bytes_in': scan['file_size']}
+        
+        # 与其他格式一样，不含元数据的文件直接链接或整个复制
+        with timer.stage(STAGE_WRITE):
+            strategy = link_or_copy_file(image_path, output_path,
+                                         allow_hardlink=clean_strategy == CLEAN_HARDLINK,
+                                         input_file=input_file)
+        return {'format': self.name, 'needs_stripping': False, 'output_strategy': strategy,
+                'removed': [], 'bytes_in': scan['file_size']}
+    
+    def audit(self, input_file):
+        processor = JPEGSegmentProcessor()
+        try:
+            segments = processor._scan_header_segments(input_file)
+        except ValueError as e:
+            raise Exception(f"JPEG段处理失败: {str(e)}")
+        
+        entries = []
+        for marker, offset, length in segments:
+            if marker not in processor.METADATA_MARKERS:
+                continue
+            segment_type = processor.METADATA_MARKERS[marker]
+            keyword = None
+            if marker == 0xE1:
+                # APP1按数据开头的标识区分EXIF和XMP
+                payload = _read_at(input_file, offset + 4, length - 4)
+                if payload.startswith(JPEG_EXIF_PREFIX):
+                    segment_type = 'EXIF'
+                    keyword = _exif_keyword(payload)
+                elif payload.startswith(JPEG_XMP_PREFIX):
+                    segment_type = 'XMP'
+            entries.append((segment_type, keyword, length))
+        return entries
+
+
+class PILHandler(FormatHandler):
+    """其他格式: 使用PIL解码后重新保存；也是没有处理器匹配时的默认处理器"""
+    
+    name = 'OTHER'
+    magic = (b'BM',)
+    extensions = ('.bmp',)
+    
+    def process(self, input_file, image_path, output_path, clean_strategy=CLEAN_COPY,
+                strip_icc=False, timer=NULL_TIMER, limits=DEFAULT_LIMITS):
+        with buffered_reader(input_file) as reader:
+            process_non_png_image(reader, output_path, timer=timer, limits=limits)
+        return {'format': self.name, 'needs_stripping': True, 'output_strategy': CLEAN_REWRITE,
+                'removed': [], 'bytes_in': _file_size(input_file)}
+
+
+PIL_HANDLER = PILHandler()
+
+register_handler(PNGHandler())
+register_handler(JPEGHandler())
+register_handler(WebPHandler())
+register_handler(GIFHandler())
+register_handler(TIFFHandler())
+register_handler(PIL_HANDLER, fallback=True)
+
+# 支持的图片扩展名
+SUPPORTED_EXTENSIONS = supported_extensions()
+
+
+def _is_in_place(image_path, output_path, in_place):
+    """
+    是否原地处理：调用方明确指定，或输出路径就是输入路径
+
+    只比较路径，不比较inode：以硬链接方式生成的旧输出与输入共享inode，
+    但再次处理时应替换输出位置上的文件，而不是替换输入文件。
+    """
+    return in_place or os.path.normcase(os.path.abspath(output_path)) == \
+        os.path.normcase(os.path.abspath(image_path))
+
+
+def process_image_file(image_path: str, output_path: str, clean_strategy: str = CLEAN_COPY,
+                       collect_timings: bool = False, strip_icc: bool = False,
+                       fsync: str = FSYNC_NONE, limits=None, in_place: bool = False) -> dict:
+    """
+    处理单个图像文件，根据文件头从格式注册表中选择处理器
+    
+    定义在模块级别，以便进程池中的工作进程可以直接调用。文件只打开一次，
+    读取的文件头用于选择处理器，之后处理器直接使用同一个文件对象。
+    
+    原地处理时（in_place为True，或output_path就是image_path）先写入同一目录下的临时文件，
+    完成后原子替换原文件并保留权限和时间戳；不含元数据的文件保持不变。
+    
+    Args:
+        image_path: 输入文件路径
+        output_path: 输出文件路径
+        clean_strategy: 不含元数据的文件的输出方式 (CLEAN_STRATEGIES之一)
+        collect_timings: 是否记录各处理阶段的耗时
+        strip_icc: 是否同时去除WebP、GIF和TIFF中的ICC颜色配置
+        fsync: 输出文件同步到磁盘的方式 (atomic.FSYNC_POLICIES之一)
+        limits: 可选的ResourceLimits，超出块长度、块数量、输出大小或处理时间上限时处理失败
+        in_place: 是否原地处理，替换image_path（忽略output_path）
+    
+    Returns:
+        dict: 处理结果
+            format: 文件格式
+            needs_stripping: 文件原本是否含有需要去除的内容
+            output_strategy: 输出方式 ('rewrite'、'copy'、'hardlink'，原地处理时不需要修改的文件为'unchanged')
+            removed: 被移除的块/段类型列表
+            bytes_in: 输入文件大小
+            bytes_out: 输出文件大小
+            timings: 各阶段耗时 {阶段: 秒}，仅在collect_timings为True时存在
+    
+    Raises:
+        Exception: 处理失败时抛出
+    """
+    timer = StageTimer() if collect_timings else NULL_TIMER
+    limits = (limits or DEFAULT_LIMITS).for_file()
+    
+    in_place = _is_in_place(image_path, output_path, in_place)
+    if in_place:
+        output_path = image_path
+        target_path = make_temp_path(image_path)
+        if clean_strategy == CLEAN_COPY:
+            # 不需要修改的文件只创建硬链接，随后直接删除，避免整个复制一遍
+            clean_strategy = CLEAN_HARDLINK
+    else:
+        target_path = output_path
+    
+    try:
+        with contextlib.ExitStack() as stack:
+            # 打开文件并读取文件头判断格式
+            with timer.stage(STAGE_SNIFF):
+                input_file = stack.enter_context(open(image_path, 'rb', buffering=0))
+                handler = find_handler(read_header(input_file))
+            
+            result = handler.process(input_file, image_path, target_path, clean_strategy,
+                                     strip_icc=strip_icc, timer=timer, limits=limits)
+        
+        if in_place and result['output_strategy'] != CLEAN_REWRITE:
+            remove_temp_file(target_path)
+            result['output_strategy'] = OUTPUT_UNCHANGED
+        else:
+            limits.check_output(os.path.getsize(target_path))
+            if in_place:
+                replace_file(target_path, image_path, fsync, timer=timer)
+            else:
+                sync_output(output_path, fsync, timer=timer)
+    except BaseException as e:
+        if in_place:
+            remove_temp_file(target_path)
+        elif isinstance(e, LimitExceededError):
+            # 不保留超出大小上限的输出文件
+            remove_temp_file(output_path)
+        raise
+    
+    result['bytes_out'] = os.path.getsize(output_path)
+    if timer.stages is not None:
+        result['timings'] = timer.stages
+    return result
+
+
+def process_image_data(image_path: str, data: bytes, output_file, clean_strategy: str = CLEAN_COPY,
+                       strip_icc: bool = False, timer=NULL_TIMER, limits=None) -> dict:
+    """
+    处理已经读入内存的图像文件，输出写入output_file（流水线模式的处理阶段）
+    
+    不需要去除元数据的文件也会把原内容写入output_file，由write_image_output决定
+    复制、硬链接还是保持不变。
+    
+    Args:
+        image_path: 输入文件路径（用于错误信息和后续写入）
+        data: 输入文件的全部内容
+        output_file: 可写的文件对象，通常为io.BytesIO
+        clean_strategy: 不含元数据的文件的输出方式
+        strip_icc: 是否同时去除WebP、GIF和TIFF中的ICC颜色配置
+        timer: 记录各阶段耗时的StageTimer
+        limits: 可选的ResourceLimits，与process_image_file相同
+    
+    Returns:
+        dict: 处理结果，字段与process_image_file相同，但不包含bytes_out和timings
+    """
+    limits = (limits or DEFAULT_LIMITS).for_file()
+    input_file = io.BytesIO(data)
+    with timer.stage(STAGE_SNIFF):
+        handler = find_handler(read_header(input_file))
+    result = handler.process(input_file, image_path, output_file, clean_strategy,
+                             strip_icc=strip_icc, timer=timer, limits=limits)
+    limits.check_output(output_file.tell())
+    return result
+
+
+def write_image_output(image_path: str, output_path: str, result: dict, data,
+                       clean_strategy: str = CLEAN_COPY, fsync: str = FSYNC_NONE,
+                       timer=NULL_TIMER, in_place: bool = False) -> dict:
+    """
+    把process_image_data生成的输出写入磁盘（流水线模式的写入阶段）
+    
+    与process_image_file相同，原地处理时写入临时文件后原子替换。
+    
+    Args:
+        image_path: 输入文件路径
+        output_path: 输出文件路径
+        result: process_image_data的处理结果，会补充bytes_out并可能修改output_strategy
+        data: 输出内容（bytes或memoryview）
+        clean_strategy: 不含元数据的文件的输出方式
+        fsync: 输出文件同步到磁盘的方式
+        timer: 记录各阶段耗时的StageTimer
+        in_place: 是否原地处理，替换image_path（忽略output_path）
+    
+    Returns:
+        dict: 补充后的处理结果
+    """
+    in_place = _is_in_place(image_path, output_path, in_place)
+    if in_place:
+        output_path = image_path
+    
+    if result['output_strategy'] != CLEAN_REWRITE:
+        # 内容与输入相同：原地处理时保持不变，允许时创建硬链接，否则写出内存中的副本
+        if in_place:
+            result['output_strategy'] = OUTPUT_UNCHANGED
+        elif clean_strategy == CLEAN_HARDLINK:
+            with timer.stage(STAGE_WRITE):
+                result['output_strategy'] = link_or_copy_file(image_path, output_path, allow_hardlink=True)
+        else:
+            with timer.stage(STAGE_WRITE):
+                _write_data(output_path, data)
+            sync_output(output_path, fsync, timer=timer)
+    elif in_place:
+        temp_path = make_temp_path(image_path)
+        try:
+            with timer.stage(STAGE_WRITE):
+                _write_data(temp_path, data)
+            replace_file(temp_path, image_path, fsync, timer=timer)
+        except BaseException:
+            remove_temp_file(temp_path)
+            raise
+    else:
+        with timer.stage(STAGE_WRITE):
+            _write_data(output_path, data)
+        sync_output(output_path, fsync, timer=timer)
+    
+    result['bytes_out'] = os.path.getsize(output_path)
+    if timer.stages is not None:
+        result['timings'] = timer.stages
+    return result
+
+
+def _write_data(path, data):
+    with open_output(path) as f:
+        f.write(data)
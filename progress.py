@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进度汇总
+每个文件完成时只累加计数，按固定时间间隔生成一次进度报告，
+避免处理大量小文件时每个文件都发送信号、阻塞界面，不依赖Qt
+"""
+
+import time
+
+
+class ProgressTracker:
+    """累计处理进度，按时间间隔合并成进度报告"""
+
+    def __init__(self, total, interval=0.1, clock=time.monotonic):
+        """
+        Args:
+            total: 文件总数
+            interval: 两次进度报告之间的最短间隔（秒）
+            clock: 计时函数，测试时可以替换
+        """
+        self.total = total
+        self.interval = interval
+        self.clock = clock
+
+        self.done = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.last_file = None
+        self.last_error = None
+
+        self._started = clock()
+        self._last_report = None
+        self._unreported = False
+        self._statuses = []   # 上次报告之后的 (行号, 状态)
+
+    def record(self, row, status, filename, error=None, bytes_in=0, bytes_out=0):
+        """
+        记录一个已完成的文件
+
+        Args:
+            row: 文件在输入列表中的位置
+            status: 文件的处理状态
+            filename: 输出文件名
+            error: 处理失败时的异常，报告中只保留错误信息文字
+            bytes_in: 读取的字节数
+            bytes_out: 写入的字节数
+
+        Returns:
+            dict: 距离上次报告超过interval时返回进度报告，否则返回None
+        """
+        self.done += 1
+        if error is not None:
+            self.failed += 1
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.last_file = filename
+        self.last_error = str(error) if error is not None else None
+        self._statuses.append((row, status))
+        self._unreported = True
+
+        # 第一个文件立即报告，之后按时间间隔合并
+        now = self.clock()
+        if self._last_report is not None and now - self._last_report < self.interval:
+            return None
+        return self._report(now)
+
+    def flush(self):
+        """
+        生成最终的进度报告
+
+        Returns:
+            dict: 上次报告之后还有新完成的文件时返回进度报告，否则返回None
+        """
+        if not self._unreported:
+            return None
+        return self._report(self.clock())
+
+    def _report(self, now):
+        self._last_report = now
+        self._unreported = False
+        elapsed = now - self._started
+        files_per_sec = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.done
+        eta = remaining / files_per_sec if files_per_sec > 0 else None
+
+        statuses = self._statuses
+        self._statuses = []
+        return {
+            'done': self.done,
+            'total': self.total,
+            'failed': self.failed,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'elapsed': elapsed,
+            'files_per_sec': files_per_sec,
+            'mb_per_sec': self.bytes_in / elapsed / (1024 * 1024) if elapsed > 0 else 0.0,
+            'eta': eta,
+            'last_file': self.last_file,
+            'last_error': self.last_error,
+            'statuses': statuses,
+        }
+
+
+def format_duration(seconds):
+    """把秒数格式化为 时:分:秒 或 分:秒"""
+    if seconds is None:
+        return "--:--"
+    seconds = int(round(seconds))
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+def format_report(report):
+    """生成适合状态栏显示的一行进度文字"""
+    return (f"已处理 {report['done']}/{report['total']}"
+            f" · {report['files_per_sec']:.1f} 文件/秒"
+            f" · {report['mb_per_sec']:.1f} MB/秒"
+            f" · 剩余 {format_duration(report['eta'])}")
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试元数据审计
+验证各格式的元数据类型、关键字和字节数统计，并行结果与串行一致，且审计不写入任何文件
+"""
+
+import io
+import os
+import sys
+import json
+import struct
+import subprocess
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, PngImagePlugin
+from audit import audit_file, run_audit
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def gps_exif():
+    """带GPS子IFD的EXIF数据"""
+    exif = Image.Exif()
+    exif[0x0131] = "editor"
+    exif[0x8825] = {1: "N", 2: (1.0, 2.0, 3.0)}
+    return exif.tobytes()
+
+
+def create_corpus(directory):
+    """创建各种格式的测试图片，返回 {名称: 路径}"""
+    image = Image.new('RGB', (24, 24), color=(30, 90, 150))
+    paths = {name: os.path.join(directory, filename) for name, filename in (
+        ('workflow', "workflow.png"), ('clean', "clean.png"), ('exif_png', "exif.png"),
+        ('jpeg', "photo.jpg"), ('gif', "comment.gif"), ('webp', "exif.webp"),
+        ('tiff', "gps.tiff"), ('bmp', "plain.bmp"), ('broken', "broken.png"))}
+
+    metadata = PngImagePlugin.PngInfo()
+    metadata.add_text("workflow", "{\"nodes\": []}" * 20)
+    metadata.add_text("prompt", "a cat")
+    metadata.add_itxt("parameters", "steps: 20", zip=True)
+    image.save(paths['workflow'], "PNG", pnginfo=metadata)
+    image.save(paths['clean'], "PNG")
+    image.save(paths['exif_png'], "PNG", exif=gps_exif())
+
+    # JPEG: 带GPS的EXIF，以及在SOI之后手工插入的XMP段
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", exif=gps_exif())
+    xmp = b'http://ns.adobe.com/xap/1.0/\x00<x:xmpmeta>secret</x:xmpmeta>'
+    jpeg = buffer.getvalue()
+    with open(paths['jpeg'], 'wb') as f:
+        f.write(jpeg[:2] + b'\xFF\xE1' + struct.pack('>H', len(xmp) + 2) + xmp + jpeg[2:])
+
+    image.save(paths['gif'], "GIF", comment=b"made with a secret tool")
+    image.save(paths['webp'], "WEBP", lossless=True, exif=gps_exif())
+    image.save(paths['tiff'], "TIFF", exif=gps_exif())
+    image.save(paths['bmp'], "BMP")
+    with open(paths['broken'], 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n' + b'\x00\x00\xff\xffIHDR')
+    return paths
+
+
+def entry_types(result):
+    return sorted(entry[0] for entry in result['entries'])
+
+
+def snapshot(directory):
+    """文件名 -> (大小, 修改时间)，用于确认审计没有写入任何文件"""
+    return {name: (os.stat(os.path.join(directory, name)).st_size,
+                   os.stat(os.path.join(directory, name)).st_mtime_ns)
+            for name in os.listdir(directory)}
+
+
+def test_audit_file_formats():
+    """测试各格式的元数据审计结果"""
+    print("🧪 测试单个文件审计...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        paths = create_corpus(temp_dir)
+
+        result = audit_file(paths['workflow'])
+        assert result['format'] == 'PNG' and result['scanned']
+        keywords = {entry[1]: entry for entry in result['entries']}
+        assert set(keywords) == {'workflow', 'prompt', 'parameters'}, keywords
+        assert keywords['workflow'][0] == 'tEXt' and keywords['parameters'][0] == 'iTXt'
+        assert keywords['workflow'][2] > 20 * 13, "字节数应包含整个块"
+
+        assert audit_file(paths['clean'])['entries'] == []
+        assert audit_file(paths['exif_png'])['entries'][0][:2] == ('eXIf', 'GPS')
+
+        result = audit_file(paths['jpeg'])
+        assert entry_types(result) == ['EXIF', 'XMP'], result
+        assert ('EXIF', 'GPS') in [entry[:2] for entry in result['entries']]
+
+        assert entry_types(audit_file(paths['gif'])) == ['COMMENT']
+        assert [entry[:2] for entry in audit_file(paths['webp'])['entries']] == [('EXIF', 'GPS')]
+        # PIL把EXIF中的Software等标签直接写入TIFF的IFD0
+        result = audit_file(paths['tiff'])
+        assert entry_types(result) == ['GPSIFD', 'Software'], result
+        assert ('GPSIFD', 'GPS') in [entry[:2] for entry in result['entries']]
+
+        result = audit_file(paths['bmp'])
+        assert result['format'] == 'OTHER' and not result['scanned']
+        assert "PNG块处理失败" in audit_file(paths['broken'])['error']
+
+        print("  ✅ 各格式审计结果正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_run_audit_summary():
+    """测试汇总统计，并行结果与串行一致"""
+    print("\n🧪 测试审计汇总...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        paths = list(create_corpus(temp_dir).values())
+        before = snapshot(temp_dir)
+
+        summary = run_audit(paths)
+        assert summary['total_files'] == 9 and summary['failed'] == 1
+        assert summary['failed_files'] == [os.path.join(temp_dir, "broken.png")]
+        assert summary['scanned_files'] == 7, "BMP不支持逐块审计"
+        assert summary['files_with_metadata'] == 6
+        assert summary['keywords']['GPS']['files'] == 4
+        assert summary['keywords']['workflow']['files'] == 1
+        assert summary['types']['EXIF']['files'] == 2, "JPEG和WebP各有一个EXIF"
+        assert summary['formats']['PNG']['files'] == 3
+        assert summary['formats']['PNG']['files_with_metadata'] == 2
+        assert summary['metadata_bytes'] == sum(item['bytes'] for item in summary['types'].values())
+        assert summary['metadata_size_histogram']['<=0'] == 1, "只有clean.png不含元数据"
+        assert sum(summary['metadata_size_histogram'].values()) == summary['scanned_files']
+
+        assert run_audit(paths, max_workers=2) == summary, "并行结果应与串行一致"
+        assert snapshot(temp_dir) == before, "审计不应写入任何文件"
+
+        print("  ✅ 审计汇总正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_cli_audit():
+    """测试audit子命令的统计输出和逐文件JSONL"""
+    print("\n🧪 测试命令行audit子命令...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        corpus_dir = os.path.join(temp_dir, "corpus")
+        os.makedirs(corpus_dir)
+        paths = create_corpus(corpus_dir)
+        os.remove(paths['broken'])
+        files_path = os.path.join(temp_dir, "files.jsonl")
+
+        result = subprocess.run(
+            [sys.executable, "-m", "cli", "audit", corpus_dir, "--files-jsonl", files_path],
+            cwd=PROJECT_DIR, capture_output=True, text=True, encoding='utf-8'
+        )
+        assert result.returncode == 0, result.stderr
+        summary = json.loads(result.stdout)
+        assert summary['total_files'] == 8 and summary['keywords']['prompt']['files'] == 1
+
+        with open(files_path, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        assert len(records) == 8
+        workflow = next(record for record in records if record['input'].endswith("workflow.png"))
+        assert ('tEXt', 'prompt') in [(entry['type'], entry['keyword']) for entry in workflow['entries']]
+
+        print("  ✅ 命令行审计输出正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试元数据审计")
+    print("=" * 50)
+
+    try:
+        test_audit_file_formats()
+        test_run_audit_summary()
+        test_cli_audit()
+
+        print("\n" + "=" * 50)
+        print("🎉 元数据审计测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
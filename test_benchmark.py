@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试吞吐量基准测试
+验证测试图片集可复现、所有处理路径都有测量结果，以及与基准结果的比较
+"""
+
+import os
+import sys
+import tempfile
+import shutil
+import hashlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import generate_corpus, run_benchmarks, build_report, compare_to_baseline, percentile
+
+
+def corpus_digest(corpus):
+    digest = hashlib.sha256()
+    for path, image_format in corpus:
+        digest.update(image_format.encode('ascii'))
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def test_corpus_is_reproducible():
+    """测试相同种子生成完全相同的图片集"""
+    print("🧪 测试图片集可复现...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        first = generate_corpus(os.path.join(temp_dir, "a"), seed=7, files_per_format=2, max_dimension=64)
+        second = generate_corpus(os.path.join(temp_dir, "b"), seed=7, files_per_format=2, max_dimension=64)
+        other = generate_corpus(os.path.join(temp_dir, "c"), seed=8, files_per_format=2, max_dimension=64)
+
+        assert len(first) == 12
+        assert corpus_digest(first) == corpus_digest(second)
+        assert corpus_digest(first) != corpus_digest(other)
+
+        # 生成的PNG和JPEG包含需要去除的元数据
+        png_path = [path for path, image_format in first if image_format == 'PNG'][0]
+        with open(png_path, 'rb') as f:
+            data = f.read()
+        for chunk_type in (b'tEXt', b'zTXt', b'iTXt', b'eXIf'):
+            assert chunk_type in data, chunk_type
+
+        jpeg_path = [path for path, image_format in first if image_format == 'JPEG'][0]
+        with open(jpeg_path, 'rb') as f:
+            data = f.read()
+        assert b'\xFF\xED' in data and b'Exif\x00\x00' in data
+
+        print("  ✅ 图片集可复现!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_run_and_compare():
+    """测试运行所有处理路径并与基准结果比较"""
+    print("\n🧪 测试运行基准测试...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        corpus = generate_corpus(os.path.join(temp_dir, "corpus"), files_per_format=2, max_dimension=64)
+        results = run_benchmarks(corpus, os.path.join(temp_dir, "output"), jobs=2)
+        report = build_report(corpus, results, seed=0)
+
+        expected = {'png_streaming', 'jpeg_streaming', 'webp_streaming', 'gif_streaming', 'tiff_streaming',
+                    'non_png_pil', 'process_image_file',
+                    'batch_serial', 'batch_process', 'batch_pipeline'}
+        assert set(report['benchmarks']) == expected
+        assert report['benchmarks']['batch_serial']['failed'] == 0
+        assert report['benchmarks']['batch_process']['failed'] == 0
+        assert report['benchmarks']['batch_pipeline']['failed'] == 0
+        assert set(report['benchmarks']['process_image_file']['latency']) == {'PNG', 'JPEG', 'GIF', 'TIFF', 'BMP', 'WEBP'}
+        assert report['corpus']['formats']['PNG']['files'] == 2
+        # 每条处理路径单独记录峰值内存
+        for name in expected:
+            peak = report['benchmarks'][name]['peak_rss_kb']
+            assert peak is None or peak['self'] > 0, (name, peak)
+        if report['benchmarks']['batch_process']['peak_rss_kb'] is not None:
+            assert report['benchmarks']['batch_process']['peak_rss_kb']['children'] > 0, "应包含工作进程的峰值内存"
+        print(f"  📊 PNG流式处理: {report['benchmarks']['png_streaming']['files_per_sec']:.0f} 文件/秒")
+
+        # 基准吞吐量是本次的两倍时判定为性能下降
+        baseline = {'benchmarks': {name: dict(result, files_per_sec=result['files_per_sec'] * 2)
+                                   for name, result in report['benchmarks'].items()}}
+        regressions = compare_to_baseline(report, baseline, tolerance=0.1)
+        assert {item['benchmark'] for item in regressions} == expected
+        assert compare_to_baseline(report, report, tolerance=0.1) == []
+
+        assert percentile([1, 2, 3, 4], 0.5) == 2
+        assert percentile([1, 2, 3, 4], 0.99) == 4
+
+        print("  ✅ 基准测试运行正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试吞吐量基准测试")
+    print("=" * 50)
+
+    try:
+        test_corpus_is_reproducible()
+        test_run_and_compare()
+
+        print("\n" + "=" * 50)
+        print("🎉 吞吐量基准测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试处理结果缓存
+验证未修改文件被跳过、文件或处理选项变化后重新处理，以及按最近使用时间淘汰
+"""
+
+import os
+import sys
+import sqlite3
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, PngImagePlugin
+from batch import BatchRunner
+from cache import ResultCache
+from limits import ResourceLimits
+
+
+def create_png(path, text):
+    metadata = PngImagePlugin.PngInfo()
+    metadata.add_text("workflow", text)
+    Image.new('RGB', (16, 16), color='red').save(path, "PNG", pnginfo=metadata)
+
+
+def test_cache_skips_unchanged_files():
+    """测试重复运行时跳过未修改的文件"""
+    print("🧪 测试缓存跳过未修改的文件...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        inputs = [os.path.join(temp_dir, f"image_{i}.png") for i in range(3)]
+        for i, path in enumerate(inputs):
+            create_png(path, "workflow %d" % i)
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(output_dir)
+        db_path = os.path.join(temp_dir, "cache.sqlite")
+
+        def run(use_content_hash=False):
+            cache = ResultCache(db_path, use_content_hash=use_content_hash)
+            runner = BatchRunner(inputs, output_dir, keep_original_name=True, cache=cache)
+            stats = runner.run()
+            stats['cache_options'] = runner._cache_options
+            return stats
+
+        stats = run()
+        assert stats['successful'] == 3 and stats['skipped_files'] == []
+
+        stats = run()
+        print(f"  第二次运行跳过: {stats['skipped_files']}")
+        assert stats['successful'] == 3
+        assert sorted(stats['skipped_files']) == ["image_0.png", "image_1.png", "image_2.png"]
+
+        # 修改输入文件、删除输出文件后需要重新处理
+        create_png(inputs[0], "changed workflow")
+        os.utime(inputs[0], ns=(1, 1))
+        os.remove(os.path.join(output_dir, "image_1.png"))
+        stats = run()
+        print(f"  修改后跳过: {stats['skipped_files']}")
+        assert stats['skipped_files'] == ["image_2.png"]
+
+        # 校验内容摘要：没有摘要的旧记录不会命中，重新处理后命中
+        assert run(use_content_hash=True)['skipped_files'] == []
+        stats = run(use_content_hash=True)
+        assert len(stats['skipped_files']) == 3
+
+        cache = ResultCache(db_path)
+        cached = cache.lookup(inputs[1], os.path.join(output_dir, "image_1.png"), stats['cache_options'])
+        assert cached['removed'] == ["tEXt"]
+        cache.close()
+
+        print("  ✅ 缓存跳过验证通过!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_cache_lru_eviction():
+    """测试超过容量时淘汰最久未使用的记录"""
+    print("\n🧪 测试缓存淘汰...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        db_path = os.path.join(temp_dir, "cache.sqlite")
+        paths = []
+        for i in range(4):
+            input_path = os.path.join(temp_dir, f"in_{i}.png")
+            output_path = os.path.join(temp_dir, f"out_{i}.png")
+            for path in (input_path, output_path):
+                with open(path, 'wb') as f:
+                    f.write(b'%d' % i)
+            paths.append((input_path, output_path))
+
+        cache = ResultCache(db_path, max_entries=3)
+        for input_path, output_path in paths[:3]:
+            cache.store(input_path, output_path)
+        # 重复记录同一个文件不增加记录数
+        cache.store(*paths[2])
+        assert cache._entry_count == 3
+        # 访问第一条记录，使第二条成为最久未使用
+        assert cache.lookup(*paths[0]) is not None
+        cache.store(*paths[3])
+        cache.close()
+        assert cache._entry_count == 3, "淘汰后记录数应随之减少"
+
+        cache = ResultCache(db_path, max_entries=3)
+        assert cache.lookup(*paths[0]) is not None
+        assert cache._entry_count == 3, "打开数据库时统计已有的记录数"
+        assert cache.lookup(*paths[1]) is None, "最久未使用的记录应被淘汰"
+        assert cache.lookup(*paths[2]) is not None
+        assert cache.lookup(*paths[3]) is not None
+        cache.close()
+
+        print("  ✅ 缓存淘汰验证通过!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_cache_options():
+    """测试处理选项不同时不复用缓存记录，以及旧版本数据库的升级"""
+    print("\n🧪 测试缓存的处理选项...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        inputs = [os.path.join(temp_dir, f"image_{i}.png") for i in range(2)]
+        for i, path in enumerate(inputs):
+            create_png(path, "workflow %d" % i)
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(output_dir)
+        db_path = os.path.join(temp_dir, "cache.sqlite")
+
+        def run(**options):
+            return BatchRunner(inputs, output_dir, keep_original_name=True,
+                               cache=ResultCache(db_path), **options).run()
+
+        assert run()['skipped_files'] == []
+        assert len(run()['skipped_files']) == 2
+        assert run(strip_icc=True)['skipped_files'] == [], "去除ICC的选项不同时应重新处理"
+        assert len(run(strip_icc=True)['skipped_files']) == 2
+        assert run(strip_icc=True, clean_strategy="rewrite")['skipped_files'] == []
+        assert run(strip_icc=True, clean_strategy="rewrite",
+                   limits=ResourceLimits(max_output_bytes=1 << 20))['skipped_files'] == []
+
+        # 没有options列的旧数据库：补上列后旧记录不再命中
+        old_db_path = os.path.join(temp_dir, "old.sqlite")
+        connection = sqlite3.connect(old_db_path)
+        connection.execute(
+            'CREATE TABLE results (input_path TEXT PRIMARY KEY, input_size INTEGER, input_mtime_ns INTEGER, '
+            'input_inode INTEGER, input_digest TEXT, output_path TEXT, output_size INTEGER, '
+            'output_mtime_ns INTEGER, output_digest TEXT, removed TEXT, last_used REAL)'
+        )
+        input_stat = os.stat(inputs[0])
+        output_path = os.path.join(output_dir, "image_0.png")
+        output_stat = os.stat(output_path)
+        connection.execute('INSERT INTO results VALUES (?, ?, ?, ?, NULL, ?, ?, ?, NULL, ?, 0)',
+                           (os.path.realpath(inputs[0]), input_stat.st_size, input_stat.st_mtime_ns,
+                            input_stat.st_ino, os.path.abspath(output_path), output_stat.st_size,
+                            output_stat.st_mtime_ns, '["tEXt"]'))
+        connection.commit()
+        connection.close()
+        cache = ResultCache(old_db_path)
+        assert cache.lookup(inputs[0], output_path, options="{}") is None
+        cache.store(inputs[0], output_path, ["tEXt"], options="{}")
+        assert cache.lookup(inputs[0], output_path, options="{}") is not None
+        cache.close()
+
+        print("  ✅ 处理选项不同时重新处理!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试处理结果缓存")
+    print("=" * 50)
+
+    try:
+        test_cache_skips_unchanged_files()
+        test_cache_lru_eviction()
+        test_cache_options()
+
+        print("\n" + "=" * 50)
+        print("🎉 处理结果缓存测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
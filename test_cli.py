@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试命令行模式
+验证JSON统计输出，以及整个调用链不导入PyQt5
+"""
+
+import json
+import os
+import sys
+import subprocess
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, PngImagePlugin
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def create_test_files(temp_dir):
+    """创建两个带元数据的PNG文件和一个无效文件"""
+    for i in range(2):
+        metadata = PngImagePlugin.PngInfo()
+        metadata.add_text("prompt", "test %d" % i)
+        Image.new('RGB', (16, 16)).save(os.path.join(temp_dir, f"image_{i}.png"), "PNG", pnginfo=metadata)
+    with open(os.path.join(temp_dir, "broken.png"), 'w') as f:
+        f.write("这不是一个PNG文件")
+    with open(os.path.join(temp_dir, "notes.txt"), 'w') as f:
+        f.write("不支持的扩展名会被忽略")
+
+
+def test_cli_strip():
+    """测试strip子命令的统计输出"""
+    print("🧪 测试命令行strip子命令...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        create_test_files(temp_dir)
+        output_dir = os.path.join(temp_dir, "output")
+
+        for jobs in ("1", "2"):
+            result = subprocess.run(
+                [sys.executable, "-m", "cli", "strip", temp_dir, "-o", output_dir, "--jobs", jobs, "--no-cache"],
+                cwd=PROJECT_DIR, capture_output=True, text=True, encoding='utf-8'
+            )
+            stats = json.loads(result.stdout)
+            print(f"  jobs={jobs}: {stats['successful']}/{stats['total_files']} 成功")
+
+            assert result.returncode == 1, "存在失败文件时应返回非零退出码"
+            assert stats['total_files'] == 3
+            assert stats['successful'] == 2
+            assert stats['failed_files'] == ["broken.png"]
+            assert "broken.png" in stats['failure_reasons']
+
+        print("  ✅ 命令行统计输出正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_cli_does_not_import_qt():
+    """测试命令行调用链不导入PyQt5"""
+    print("\n🧪 测试命令行不导入PyQt5...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        create_test_files(temp_dir)
+        code = (
+            "import sys, cli\n"
+            "cli.main(['strip', sys.argv[1], '-o', sys.argv[2], '--no-cache'])\n"
+            "assert not [m for m in sys.modules if m.startswith('PyQt5')], 'PyQt5被导入'\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code, os.path.join(temp_dir, "image_0.png"), os.path.join(temp_dir, "out")],
+            cwd=PROJECT_DIR, capture_output=True, text=True, encoding='utf-8'
+        )
+        assert result.returncode == 0, result.stderr
+
+        print("  ✅ 调用链中没有PyQt5!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试命令行模式")
+    print("=" * 50)
+
+    try:
+        test_cli_strip()
+        test_cli_does_not_import_qt()
+
+        print("\n" + "=" * 50)
+        print("🎉 命令行模式测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试零拷贝范围复制
+验证内核复制、退回方案以及PNG范围规划的结果一致
+"""
+
+import errno
+import io
+import os
+import sys
+import tempfile
+import shutil
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, PngImagePlugin
+import fastcopy
+from main import PNGBlockProcessor
+
+
+def expected_bytes(data, ranges):
+    return b''.join(data[offset:offset + length] for offset, length in ranges)
+
+
+def test_copy_ranges_all_strategies():
+    """测试各种复制方式得到相同结果"""
+    print("🧪 测试范围复制...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        data = os.urandom(3 * 1024 * 1024 + 17)
+        source = os.path.join(temp_dir, "source.bin")
+        with open(source, 'wb') as f:
+            f.write(data)
+
+        ranges = [(0, 8), (8, 100), (5000, 2 * 1024 * 1024), (3 * 1024 * 1024, 17)]
+        expected = b'HEAD' + expected_bytes(data, ranges)
+        unsupported = OSError(errno.ENOSYS, "not supported")
+
+        patches = {
+            "copy_file_range": [],
+            "sendfile": [mock.patch.object(fastcopy.os, 'copy_file_range', side_effect=unsupported, create=True)],
+            "readinto": [mock.patch.object(fastcopy.os, 'copy_file_range', side_effect=unsupported, create=True),
+                         mock.patch.object(fastcopy.os, 'sendfile', side_effect=unsupported, create=True)],
+        }
+
+        for name, active in patches.items():
+            target = os.path.join(temp_dir, f"{name}.bin")
+            for patch in active:
+                patch.start()
+            try:
+                with open(source, 'rb', buffering=0) as input_file, open(target, 'wb') as output_file:
+                    output_file.write(b'HEAD')
+                    written = fastcopy.copy_ranges(input_file, output_file, ranges)
+            finally:
+                for patch in active:
+                    patch.stop()
+
+            with open(target, 'rb') as f:
+                assert f.read() == expected, f"{name} 复制结果不一致"
+            assert written == len(expected) - 4
+            print(f"  ✅ {name}")
+
+        # 没有文件描述符的内存文件
+        output = io.BytesIO()
+        fastcopy.copy_ranges(io.BytesIO(data), output, ranges)
+        assert output.getvalue() == expected[4:]
+        print("  ✅ 内存文件")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_merge_and_truncated():
+    """测试范围合并和截断输入"""
+    print("\n🧪 测试范围合并和截断输入...")
+    assert fastcopy.merge_ranges([(0, 8), (8, 4), (20, 0), (30, 5)]) == [(0, 12), (30, 5)]
+
+    output = io.BytesIO()
+    try:
+        fastcopy.copy_ranges(io.BytesIO(b'12345'), output, [(0, 10)])
+        raise AssertionError("截断输入应该失败")
+    except ValueError:
+        pass
+    print("  ✅ 合并和截断处理正常!")
+
+
+def test_png_streaming_with_ranges():
+    """测试PNG按范围复制后像素不变、元数据被移除"""
+    print("\n🧪 测试PNG范围复制...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_path = os.path.join(temp_dir, "input.png")
+        output_path = os.path.join(temp_dir, "output.png")
+
+        img = Image.frombytes('RGB', (512, 512), os.urandom(512 * 512 * 3))
+        metadata = PngImagePlugin.PngInfo()
+        metadata.add_text("workflow", '{"nodes": []}')
+        metadata.add_text("parameters", "steps: 20", zip=True)
+        img.save(input_path, "PNG", pnginfo=metadata)
+
+        processor = PNGBlockProcessor()
+        assert processor.process_png_streaming(input_path, output_path)
+
+        with open(output_path, 'rb') as f:
+            stripped = f.read()
+        assert b'tEXt' not in stripped and b'zTXt' not in stripped
+        with Image.open(output_path) as result:
+            assert result.tobytes() == img.tobytes()
+
+        # 截断的文件应处理失败
+        with open(input_path, 'rb') as f:
+            data = f.read()
+        truncated = os.path.join(temp_dir, "truncated.png")
+        with open(truncated, 'wb') as f:
+            f.write(data[:len(data) // 2])
+        assert not processor.process_png_streaming(truncated, os.path.join(temp_dir, "out2.png"))
+
+        print("  ✅ PNG范围复制正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试零拷贝范围复制")
+    print("=" * 50)
+
+    try:
+        test_copy_ranges_all_strategies()
+        test_merge_and_truncated()
+        test_png_streaming_with_ranges()
+
+        print("\n" + "=" * 50)
+        print("🎉 零拷贝范围复制测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件夹导入功能
+验证递归扫描、文件头识别，以及主窗口后台导入时的去重
+"""
+
+import os
+import sys
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 没有显示服务时使用offscreen平台
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from file_walker import iter_image_files
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def create_tree(temp_dir):
+    """创建包含多层子文件夹的测试目录"""
+    files = {
+        "a.png": PNG_SIGNATURE,
+        "b.JPG": b'\xFF\xD8\xFF\xE0',
+        "notes.txt": b'text',
+        os.path.join("sub", "c.gif"): b'GIF89a',
+        os.path.join("sub", "deep", "d.tiff"): b'II*\x00',
+        os.path.join("sub", "deep", "no_extension"): PNG_SIGNATURE,
+    }
+    for relative_path, content in files.items():
+        path = os.path.join(temp_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+
+def test_iter_image_files():
+    """测试递归扫描和文件头识别"""
+    print("🧪 测试递归扫描...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        create_tree(temp_dir)
+
+        names = sorted(os.path.basename(p) for p in iter_image_files([temp_dir]))
+        print(f"  按扩展名: {names}")
+        assert names == ["a.png", "b.JPG", "c.gif", "d.tiff"]
+
+        names = sorted(os.path.basename(p) for p in iter_image_files([temp_dir], sniff_magic=True))
+        assert names == ["a.png", "b.JPG", "c.gif", "d.tiff", "no_extension"]
+
+        names = sorted(os.path.basename(p) for p in iter_image_files([temp_dir], recursive=False))
+        assert names == ["a.png", "b.JPG"]
+
+        # 直接传入的文件同样需要通过过滤
+        explicit = [os.path.join(temp_dir, "a.png"), os.path.join(temp_dir, "notes.txt")]
+        assert list(iter_image_files(explicit)) == explicit[:1]
+
+        print("  ✅ 递归扫描正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_main_window_folder_import():
+    """测试主窗口后台导入文件夹并去重"""
+    print("\n🧪 测试主窗口导入文件夹...")
+    from PyQt5.QtWidgets import QApplication
+    from main import MainWindow
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        create_tree(temp_dir)
+        window = MainWindow()
+
+        def import_and_wait(paths):
+            window.add_images_to_queue(paths)
+            for worker in list(window._scan_workers):
+                worker.wait()
+            app.processEvents()
+
+        import_and_wait([temp_dir])
+        assert window.queue_model.rowCount() == 5
+
+        # 重复导入同一文件夹和其中的文件，不会产生重复项
+        import_and_wait([temp_dir, os.path.join(temp_dir, "a.png"), temp_dir + os.sep])
+        assert window.queue_model.rowCount() == 5
+        assert len(window.queue_model.paths()) == 5
+
+        window.clear_queue()
+        import_and_wait([os.path.join(temp_dir, "sub")])
+        assert window.queue_model.rowCount() == 3
+
+        window.close()
+        print("  ✅ 主窗口导入文件夹正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试文件夹导入功能")
+    print("=" * 50)
+
+    try:
+        test_iter_image_files()
+        test_main_window_folder_import()
+
+        print("\n" + "=" * 50)
+        print("🎉 文件夹导入功能测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试格式注册表
+验证按文件头选择处理器、每个文件只打开一次，以及注册新格式后无需修改处理流程
+"""
+
+import os
+import sys
+import builtins
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, PngImagePlugin
+import formats
+from formats import FormatHandler, register_handler, unregister_handler, find_handler
+from processors import process_image_file
+from timing import NULL_TIMER
+from file_walker import is_image_file, has_image_magic
+
+
+def create_samples(temp_dir):
+    """创建各种格式的测试图片，返回 {格式: 路径}"""
+    image = Image.new('RGB', (16, 16), color=(120, 30, 200))
+    metadata = PngImagePlugin.PngInfo()
+    metadata.add_text("workflow", "prompt")
+
+    samples = {
+        'PNG': ("sample.png", dict(format="PNG", pnginfo=metadata)),
+        'JPEG': ("sample.jpg", dict(format="JPEG")),
+        'GIF': ("sample.gif", dict(format="GIF")),
+        'TIFF': ("sample.tiff", dict(format="TIFF")),
+        'WEBP': ("sample.webp", dict(format="WEBP", lossless=True)),
+        'OTHER': ("sample.bmp", dict(format="BMP")),
+    }
+    paths = {}
+    for name, (filename, options) in samples.items():
+        path = os.path.join(temp_dir, filename)
+        image.save(path, **options)
+        paths[name] = path
+    return paths
+
+
+def test_find_handler():
+    """测试按文件头选择处理器"""
+    print("🧪 测试按文件头选择处理器...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        for name, path in create_samples(temp_dir).items():
+            with open(path, 'rb') as f:
+                header = f.read(formats.HEADER_SIZE)
+            assert find_handler(header).name == name, f"{name}识别错误"
+
+        # 无法识别的文件头交给默认的PIL处理器，但文件夹扫描不会把它当作图片
+        assert find_handler(b'not an image').name == 'OTHER'
+        assert find_handler(b'not an image', use_fallback=False) is None
+        assert find_handler(b'RIFF\x00\x00\x00\x00WAVE', use_fallback=False) is None
+
+        print("  ✅ 处理器选择正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_single_open_per_file():
+    """测试处理每个文件时输入文件只打开一次"""
+    print("\n🧪 测试每个文件只打开一次...")
+    temp_dir = tempfile.mkdtemp()
+    original_open = builtins.open
+    opened = []
+
+    def counting_open(file, *args, **kwargs):
+        opened.append(file)
+        return original_open(file, *args, **kwargs)
+
+    try:
+        samples = create_samples(temp_dir)
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(output_dir)
+
+        builtins.open = counting_open
+        try:
+            for name, path in samples.items():
+                opened.clear()
+                output_path = os.path.join(output_dir, os.path.basename(path))
+                result = process_image_file(path, output_path)
+                assert result['format'] == name
+                assert opened.count(path) == 1, f"{name}的输入文件被打开了{opened.count(path)}次"
+        finally:
+            builtins.open = original_open
+
+        # PNG元数据仍然被去除
+        with Image.open(os.path.join(output_dir, "sample.png")) as image:
+            assert "workflow" not in image.info
+
+        print("  ✅ 每个文件只打开一次!")
+    finally:
+        builtins.open = original_open
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class UppercaseTextHandler(FormatHandler):
+    """测试用的格式：以TXTIMG开头的文本文件，输出转换为大写"""
+
+    name = 'TXTIMG'
+    magic = (b'TXTIMG',)
+    extensions = ('.txtimg',)
+
+    def process(self, input_file, image_path, output_path, clean_strategy, strip_icc=False,
+                timer=NULL_TIMER, limits=None):
+        data = input_file.read()
+        with open(output_path, 'wb') as f:
+            f.write(data.upper())
+        return {'format': self.name, 'needs_stripping': True, 'output_strategy': 'rewrite',
+                'removed': [], 'bytes_in': len(data)}
+
+
+def test_register_custom_handler():
+    """测试注册新格式后处理流程和文件扫描自动支持"""
+    print("\n🧪 测试注册自定义格式...")
+    temp_dir = tempfile.mkdtemp()
+    handler = UppercaseTextHandler()
+
+    # 没有实现process的处理器不能实例化
+    class IncompleteHandler(FormatHandler):
+        name = 'INCOMPLETE'
+    try:
+        IncompleteHandler()
+        assert False, "未实现process的处理器应无法实例化"
+    except TypeError:
+        pass
+
+    try:
+        input_path = os.path.join(temp_dir, "note.txtimg")
+        with open(input_path, 'wb') as f:
+            f.write(b'TXTIMG hello')
+        renamed_path = os.path.join(temp_dir, "note.dat")
+        shutil.copyfile(input_path, renamed_path)
+
+        assert not is_image_file(input_path)
+        register_handler(handler)
+        try:
+            assert is_image_file(input_path)
+            assert has_image_magic(renamed_path)
+
+            output_path = os.path.join(temp_dir, "output.txtimg")
+            result = process_image_file(input_path, output_path)
+            assert result['format'] == 'TXTIMG'
+            assert result['bytes_out'] == len(b'TXTIMG hello')
+            with open(output_path, 'rb') as f:
+                assert f.read() == b'TXTIMG HELLO'
+        finally:
+            unregister_handler(handler)
+
+        assert not is_image_file(input_path)
+        print("  ✅ 自定义格式注册正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试格式注册表")
+    print("=" * 50)
+
+    try:
+        test_find_handler()
+        test_single_open_per_file()
+        test_register_custom_handler()
+
+        print("\n" + "=" * 50)
+        print("🎉 格式注册表测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
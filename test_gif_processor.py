@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试GIF块处理器
+验证注释和应用扩展被移除、NETSCAPE循环扩展和所有动画帧原样保留
+"""
+
+import os
+import sys
+import io
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, ImageSequence
+from processors import GIFBlockProcessor, process_image_file
+
+
+def application_extension(identifier, payload):
+    """构造一个应用扩展块"""
+    block = b'\x21\xFF\x0B' + identifier
+    for i in range(0, len(payload), 255):
+        piece = payload[i:i + 255]
+        block += bytes([len(piece)]) + piece
+    return block + b'\x00'
+
+
+def create_animated_gif(path):
+    """创建带注释、XMP和NETSCAPE扩展的三帧动画GIF"""
+    frames = [Image.new('P', (24, 24), color=i * 40) for i in range(3)]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, "GIF", save_all=True, append_images=frames[1:], duration=80, loop=0,
+                   comment=b"workflow prompt")
+    data = buffer.getvalue()
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    # 在逻辑屏幕描述符和全局颜色表之后插入XMP应用扩展
+    header_end = GIFBlockProcessor().scan_gif(path)['blocks'][0][2]
+    xmp = application_extension(b'XMP DataXMP', b'<x:xmpmeta>' + b'w' * 600 + b'</x:xmpmeta>')
+    with open(path, 'wb') as f:
+        f.write(data[:header_end] + xmp + data[header_end:])
+
+
+def frame_pixels(path):
+    with Image.open(path) as image:
+        return [list(frame.convert('RGB').getdata()) for frame in ImageSequence.Iterator(image)]
+
+
+def test_strip_animated_gif():
+    """测试移除动画GIF的元数据扩展"""
+    print("🧪 测试GIF元数据移除...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_path = os.path.join(temp_dir, "animated.gif")
+        output_path = os.path.join(temp_dir, "output.gif")
+        create_animated_gif(input_path)
+
+        scan = GIFBlockProcessor().scan_gif(input_path)
+        block_types = [block[0] for block in scan['blocks']]
+        print(f"  原始块: {block_types}")
+        assert 'COMMENT' in block_types and 'APP:XMP DataXMP' in block_types
+        assert 'APP:NETSCAPE2.0' in block_types
+        assert block_types.count('IMAGE') == 3
+
+        result = process_image_file(input_path, output_path)
+        assert result['format'] == 'GIF'
+        assert sorted(result['removed']) == ['APP:XMP DataXMP', 'COMMENT']
+
+        # 输出等于输入去掉被移除的块，其余字节完全相同
+        with open(input_path, 'rb') as f:
+            input_data = f.read()
+        expected = b''.join(input_data[offset:offset + length] for block_type, offset, length in scan['blocks']
+                            if block_type not in ('COMMENT', 'APP:XMP DataXMP'))
+        with open(output_path, 'rb') as f:
+            assert f.read() == expected
+
+        with open(output_path, 'rb') as f:
+            output_data = f.read()
+        assert b'workflow prompt' not in output_data and b'xmpmeta' not in output_data
+
+        with Image.open(output_path) as stripped:
+            assert stripped.n_frames == 3
+            assert stripped.info.get('loop') == 0
+        assert frame_pixels(output_path) == frame_pixels(input_path)
+
+        # 已经干净的文件直接复制
+        result = process_image_file(output_path, os.path.join(temp_dir, "again.gif"))
+        assert not result['needs_stripping'] and result['output_strategy'] == 'copy'
+
+        print("  ✅ GIF元数据移除正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_truncated_and_corrupt_gif():
+    """测试缺少结束标记和数据不完整的GIF"""
+    print("\n🧪 测试不完整的GIF...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_path = os.path.join(temp_dir, "input.gif")
+        Image.new('P', (8, 8)).save(input_path, "GIF", comment=b"note")
+        with open(input_path, 'rb') as f:
+            data = f.read()
+        assert data.endswith(b';')
+
+        # 缺少结束标记时补上
+        missing_trailer = os.path.join(temp_dir, "missing_trailer.gif")
+        with open(missing_trailer, 'wb') as f:
+            f.write(data[:-1])
+        output_path = os.path.join(temp_dir, "output.gif")
+        process_image_file(missing_trailer, output_path)
+        with open(output_path, 'rb') as f:
+            assert f.read().endswith(b'\x00;')
+        with Image.open(output_path) as image:
+            image.load()
+
+        # 数据子块被截断
+        truncated = os.path.join(temp_dir, "truncated.gif")
+        with open(truncated, 'wb') as f:
+            f.write(data[:-4])
+        try:
+            process_image_file(truncated, output_path)
+            assert False, "不完整的文件应处理失败"
+        except Exception as e:
+            assert "GIF块处理失败" in str(e)
+
+        print("  ✅ 不完整的GIF处理正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试GIF块处理器")
+    print("=" * 50)
+
+    try:
+        test_strip_animated_gif()
+        test_truncated_and_corrupt_gif()
+
+        print("\n" + "=" * 50)
+        print("🎉 GIF块处理器测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
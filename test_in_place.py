@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试原地处理模式
+验证原子替换保留权限和时间戳、不需要修改的文件保持不变，以及处理中途失败时原文件完好
+"""
+
+import os
+import sys
+import stat
+import tempfile
+import shutil
+import contextlib
+import io
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, PngImagePlugin
+import processors
+from processors import process_image_file
+from batch import BatchRunner
+import cli
+
+
+def create_png(path, with_metadata=True):
+    """创建测试PNG，可选包含工作流文本"""
+    metadata = PngImagePlugin.PngInfo()
+    if with_metadata:
+        metadata.add_text("workflow", "secret prompt " * 50)
+    Image.new('RGB', (32, 32), color=(10, 200, 90)).save(path, "PNG", pnginfo=metadata)
+
+
+def leftover_temp_files(directory):
+    return [name for name in os.listdir(directory) if name.endswith('.tmp')]
+
+
+def test_in_place_replace():
+    """测试原地处理去除元数据，保留权限和时间戳"""
+    print("🧪 测试原地原子替换...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        path = os.path.join(temp_dir, "photo.png")
+        create_png(path)
+        os.chmod(path, 0o640)
+        os.utime(path, ns=(1_600_000_000_000_000_000, 1_600_000_000_000_000_000))
+        with Image.open(path) as image:
+            pixels = image.tobytes()
+
+        result = process_image_file(path, path, collect_timings=True, fsync='full')
+        assert result['output_strategy'] == 'rewrite'
+        assert result['bytes_out'] < result['bytes_in']
+        assert 'fsync' in result['timings'], "应记录同步到磁盘的耗时"
+
+        with Image.open(path) as image:
+            assert "workflow" not in image.info
+            assert image.tobytes() == pixels
+        file_stat = os.stat(path)
+        assert stat.S_IMODE(file_stat.st_mode) == 0o640, "权限应保持不变"
+        assert file_stat.st_mtime_ns == 1_600_000_000_000_000_000, "修改时间应保持不变"
+        assert not leftover_temp_files(temp_dir)
+
+        # 已经干净的文件不做任何修改
+        inode = os.stat(path).st_ino
+        result = process_image_file(path, path)
+        assert result['output_strategy'] == 'unchanged'
+        assert os.stat(path).st_ino == inode
+        assert not leftover_temp_files(temp_dir)
+
+        print("  ✅ 原地原子替换成功!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_failure_keeps_original():
+    """测试写入中途失败时原文件完好，临时文件被删除"""
+    print("\n🧪 测试处理中途失败...")
+    temp_dir = tempfile.mkdtemp()
+    original_copy_ranges = processors.copy_ranges
+
+    def failing_copy_ranges(input_file, output_file, ranges, limits=None):
+        # 写入一部分数据后失败，模拟磁盘已满等错误
+        output_file.write(b'\x89PNG partial')
+        raise OSError("模拟写入失败")
+
+    try:
+        path = os.path.join(temp_dir, "photo.png")
+        create_png(path)
+        with open(path, 'rb') as f:
+            original = f.read()
+
+        processors.copy_ranges = failing_copy_ranges
+        try:
+            process_image_file(path, path)
+            assert False, "写入失败应抛出异常"
+        except Exception as e:
+            assert "模拟写入失败" in str(e), str(e)
+        finally:
+            processors.copy_ranges = original_copy_ranges
+
+        with open(path, 'rb') as f:
+            assert f.read() == original, "原文件不应被修改"
+        assert not leftover_temp_files(temp_dir), "临时文件应被删除"
+
+        print("  ✅ 失败时原文件完好!")
+    finally:
+        processors.copy_ranges = original_copy_ranges
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_hardlinked_output_is_not_in_place():
+    """测试输出位置上是输入文件的硬链接时（旧输出），普通处理替换输出而不修改输入"""
+    print("\n🧪 测试硬链接旧输出...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        path = os.path.join(temp_dir, "photo.png")
+        create_png(path)
+        with open(path, 'rb') as f:
+            original = f.read()
+        inode = os.stat(path).st_ino
+
+        output_dir = os.path.join(temp_dir, "out")
+        os.makedirs(output_dir)
+        output_path = os.path.join(output_dir, "photo.png")
+        os.link(path, output_path)
+
+        for mode in (BatchRunner.EXECUTOR_SERIAL, BatchRunner.EXECUTOR_PIPELINE):
+            stats = BatchRunner([path], output_dir, keep_original_name=True,
+                                executor_mode=mode).run()
+            assert stats['successful'] == 1, stats
+            with open(path, 'rb') as f:
+                assert f.read() == original, "输入文件不应被修改"
+            assert os.stat(path).st_ino == inode, "输入文件不应被替换"
+            assert os.stat(output_path).st_ino != inode
+            with Image.open(output_path) as image:
+                assert "workflow" not in image.info
+            os.unlink(output_path)
+            os.link(path, output_path)
+        assert not leftover_temp_files(temp_dir)
+        assert not leftover_temp_files(output_dir)
+
+        print("  ✅ 硬链接旧输出被替换，输入文件完好!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_batch_and_cli_in_place():
+    """测试批量处理和命令行的原地模式"""
+    print("\n🧪 测试批量和命令行原地处理...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        paths = []
+        for i in range(3):
+            path = os.path.join(temp_dir, f"image_{i}.png")
+            create_png(path, with_metadata=i != 2)
+            paths.append(path)
+
+        runner = BatchRunner(paths, None, keep_original_name=False, in_place=True)
+        assert runner.fsync == 'file', "原地处理默认同步文件数据"
+        stats = runner.run()
+        assert stats['successful'] == 3 and stats['failed'] == 0
+        assert stats['processed_files'] == paths, "原地处理按完整路径统计"
+        assert stats['fast_path_files'] == {paths[2]: 'unchanged'}
+        for path in paths:
+            with Image.open(path) as image:
+                assert "workflow" not in image.info
+
+        # 不同文件夹中的同名文件分别统计
+        sub_dir = os.path.join(temp_dir, "sub")
+        os.makedirs(sub_dir)
+        same_name = [os.path.join(temp_dir, "same.png"), os.path.join(sub_dir, "same.png")]
+        for path in same_name:
+            create_png(path)
+        stats = BatchRunner(same_name, None, keep_original_name=True, in_place=True, fsync='none').run()
+        assert stats['processed_files'] == same_name
+        assert len(set(stats['processed_files'])) == 2
+
+        # 命令行: --in-place 与 -o 互斥
+        cli_path = os.path.join(temp_dir, "cli.png")
+        create_png(cli_path)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            exit_code = cli.main(['strip', cli_path, '--in-place', '--fsync', 'none', '--no-cache'])
+        assert exit_code == 0
+        with Image.open(cli_path) as image:
+            assert "workflow" not in image.info
+        assert not leftover_temp_files(temp_dir)
+
+        try:
+            with contextlib.redirect_stderr(io.StringIO()):
+                cli.build_parser().parse_args(['strip', cli_path, '--in-place', '-o', temp_dir])
+            assert False, "--in-place与-o不能同时使用"
+        except SystemExit:
+            pass
+
+        print("  ✅ 批量和命令行原地处理正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试原地处理模式")
+    print("=" * 50)
+
+    try:
+        test_in_place_replace()
+        test_failure_keeps_original()
+        test_hardlinked_output_is_not_in_place()
+        test_batch_and_cli_in_place()
+
+        print("\n" + "=" * 50)
+        print("🎉 原地处理模式测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
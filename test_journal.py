@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试批量处理日志
+验证记录分组写入、写到一半的日志能够恢复，以及中断后继续处理时跳过已完成的文件
+"""
+
+import os
+import sys
+import json
+import subprocess
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, PngImagePlugin
+from batch import BatchRunner
+from journal import BatchJournal, default_journal_path, read_journal
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def create_images(directory, count):
+    """创建带文本块的PNG，返回路径列表"""
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"image_{i:02d}.png")
+        metadata = PngImagePlugin.PngInfo()
+        metadata.add_text("prompt", f"image {i}")
+        Image.new('RGB', (8, 8), color=(i, 0, 0)).save(path, "PNG", pnginfo=metadata)
+        paths.append(path)
+    return paths
+
+
+def read_lines(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_grouped_flush_and_recovery():
+    """测试分组写入和截断恢复"""
+    print("🧪 测试日志分组写入和截断恢复...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        path = os.path.join(temp_dir, "journal", "batch.jsonl")
+        job = {'output_dir': temp_dir}
+        journal = BatchJournal(path, flush_records=3, flush_interval=3600)
+        journal.begin(job)
+        journal.record("/images/a.png", "a.png", removed=['tEXt'])
+        journal.record("/images/b.png", "b.png", error=ValueError("坏文件"))
+        assert len(read_lines(path)) == 1, "不足一组的记录还不应写入"
+        journal.record("/images/c.png", "c.png")
+        lines = read_lines(path)
+        assert len(lines) == 4 and lines[0]['job'] == job
+        assert lines[2]['status'] == 'failed' and lines[2]['error'] == "坏文件"
+        journal.record("/images/d.png", "d.png")
+        journal.close()
+        assert len(read_lines(path)) == 5, "关闭时写入剩余记录"
+
+        # 模拟进程在写入中途退出：最后一行只写了一半
+        with open(path, 'ab') as f:
+            f.write(b'{"input": "/images/e.png", "sta')
+        job_record, done, valid_end = read_journal(path)
+        assert job_record == job
+        assert done == {"/images/a.png", "/images/c.png", "/images/d.png"}
+        assert valid_end < os.path.getsize(path)
+
+        journal = BatchJournal(path, resume=True)
+        journal.begin(job)
+        assert journal.is_done("/images/a.png") and not journal.is_done("/images/b.png")
+        journal.record("/images/b.png", "b.png")
+        journal.close()
+        lines = read_lines(path)
+        assert len(lines) == 6, "截掉半行后追加的记录应从完整的行开始"
+        assert read_journal(path)[1] == {"/images/a.png", "/images/b.png", "/images/c.png", "/images/d.png"}
+
+        # 任务不同时重新开始
+        journal = BatchJournal(path, resume=True)
+        journal.begin({'output_dir': "/other"})
+        assert not journal.is_done("/images/a.png")
+        journal.close()
+        assert len(read_lines(path)) == 1
+
+        # 命令行和图形界面的默认日志互不覆盖
+        assert default_journal_path('gui') != default_journal_path()
+        assert os.path.dirname(default_journal_path('gui')) == os.path.dirname(default_journal_path())
+
+        print("  ✅ 日志分组写入和截断恢复正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_batch_resume():
+    """测试中断后继续处理，只处理剩余的文件"""
+    print("\n🧪 测试中断后继续处理...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_dir = os.path.join(temp_dir, "input")
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(input_dir)
+        os.makedirs(output_dir)
+        paths = create_images(input_dir, 10)
+        broken = os.path.join(input_dir, "broken.png")
+        with open(broken, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n\x00\x00\xff\xffIHDR')
+        paths.insert(2, broken)
+        journal_path = os.path.join(temp_dir, "batch.jsonl")
+
+        for mode in (BatchRunner.EXECUTOR_SERIAL, BatchRunner.EXECUTOR_PIPELINE,
+                     BatchRunner.EXECUTOR_PROCESS):
+            shutil.rmtree(output_dir)
+            os.makedirs(output_dir)
+
+            # 第一次运行处理到第5个文件时停止
+            runner = BatchRunner(paths, output_dir, keep_original_name=True,
+                                 journal=BatchJournal(journal_path))
+
+            def stop_after(filename, error, done_count, total, runner=runner):
+                if done_count == 5:
+                    runner.stop()
+
+            runner.result_callback = stop_after
+            stats = runner.run()
+            assert stats['successful'] + stats['failed'] == 5
+            assert stats['failed_files'] == ["broken.png"]
+
+            # 继续运行：跳过已完成的4个文件，重新处理失败的文件和剩余的文件
+            runner = BatchRunner(paths, output_dir, keep_original_name=True, executor_mode=mode,
+                                 max_workers=2, journal=BatchJournal(journal_path, resume=True))
+            stats = runner.run()
+            assert len(stats['skipped_files']) == 4, (mode, stats)
+            assert stats['successful'] == 10 and stats['failed_files'] == ["broken.png"], mode
+            assert len(os.listdir(output_dir)) == 10
+
+            # 全部完成后再次继续，只剩失败的文件需要重新处理
+            runner = BatchRunner(paths, output_dir, keep_original_name=True,
+                                 journal=BatchJournal(journal_path, resume=True))
+            stats = runner.run()
+            assert len(stats['skipped_files']) == 10 and stats['failed'] == 1, mode
+
+        print("  ✅ 中断后只处理剩余的文件!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_cli_resume():
+    """测试命令行的--journal和--resume参数"""
+    print("\n🧪 测试命令行继续处理...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        create_images(input_dir, 6)
+        output_dir = os.path.join(temp_dir, "output")
+        journal_path = os.path.join(temp_dir, "batch.jsonl")
+        command = [sys.executable, "-m", "cli", "strip", input_dir, "-o", output_dir, "--no-cache",
+                   "--journal", journal_path]
+
+        result = subprocess.run(command, cwd=PROJECT_DIR, capture_output=True, text=True, encoding='utf-8')
+        assert result.returncode == 0, result.stderr
+        assert len(read_lines(journal_path)) == 7
+
+        # 只保留前3个文件的记录，最后一条记录写到一半
+        with open(journal_path, encoding='utf-8') as f:
+            lines = f.readlines()
+        with open(journal_path, 'w', encoding='utf-8') as f:
+            f.writelines(lines[:4])
+            f.write(lines[4][:20])
+
+        result = subprocess.run(command + ["--resume"], cwd=PROJECT_DIR, capture_output=True,
+                                text=True, encoding='utf-8')
+        assert result.returncode == 0, result.stderr
+        stats = json.loads(result.stdout)
+        assert stats['successful'] == 6 and len(stats['skipped_files']) == 3
+        assert len(read_journal(journal_path)[1]) == 6
+
+        print("  ✅ 命令行继续处理正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试批量处理日志")
+    print("=" * 50)
+
+    try:
+        test_grouped_flush_and_recovery()
+        test_batch_resume()
+        test_cli_resume()
+
+        print("\n" + "=" * 50)
+        print("🎉 批量处理日志测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
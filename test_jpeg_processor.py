@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JPEG段处理器测试脚本
+验证元数据段被丢弃，图像数据原样保留，以及不含元数据的文件直接链接或复制
+"""
+
+import io
+import os
+import sys
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image
+from main import JPEGSegmentProcessor
+from processors import CLEAN_HARDLINK, CLEAN_REWRITE, process_image_file
+
+
+def list_markers(data):
+    """列出JPEG中SOS之前的所有段标记"""
+    markers = []
+    pos = 2
+    while pos < len(data):
+        marker = data[pos + 1]
+        markers.append(marker)
+        if marker == 0xDA:
+            break
+        length = int.from_bytes(data[pos + 2:pos + 4], 'big')
+        pos += 2 + length
+    return markers
+
+
+def create_test_jpeg(path, progressive=False):
+    """创建一个包含EXIF、XMP、IPTC和注释的测试JPEG文件"""
+    img = Image.new('RGB', (64, 48))
+    img.putdata([(x * 4 % 256, y * 5 % 256, (x * y) % 256) for y in range(48) for x in range(64)])
+
+    exif = Image.Exif()
+    exif[0x010E] = "ComfyUI workflow"
+    exif[0x0131] = "Test Software"
+
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=90, exif=exif.tobytes(), progressive=progressive)
+    data = buffer.getvalue()
+
+    # 在SOI之后插入XMP(APP1)、IPTC(APP13)和COM段
+    xmp = b'http://ns.adobe.com/xap/1.0/\x00<x:xmpmeta>workflow</x:xmpmeta>'
+    iptc = b'Photoshop 3.0\x008BIM\x04\x04\x00\x00\x00\x00\x00\x00'
+    comment = b'generated by test'
+    extra = b''
+    for marker, payload in ((0xE1, xmp), (0xED, iptc), (0xFE, comment)):
+        extra += bytes((0xFF, marker)) + (len(payload) + 2).to_bytes(2, 'big') + payload
+    data = data[:2] + extra + data[2:]
+
+    with open(path, 'wb') as f:
+        f.write(data)
+    return data
+
+
+def test_jpeg_segments_removed():
+    """测试元数据段被移除且像素完全一致"""
+    print("🧪 测试JPEG元数据段移除...")
+    processor = JPEGSegmentProcessor()
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        for progressive in (False, True):
+            input_path = os.path.join(temp_dir, f"input_{progressive}.jpg")
+            output_path = os.path.join(temp_dir, f"output_{progressive}.jpg")
+            original = create_test_jpeg(input_path, progressive)
+
+            assert processor.is_jpeg_file(input_path)
+            assert processor.process_jpeg_streaming(input_path, output_path)
+
+            with open(output_path, 'rb') as f:
+                stripped = f.read()
+
+            markers = list_markers(stripped)
+            print(f"  progressive={progressive}: 保留的段 {[hex(m) for m in markers]}")
+            assert 0xE1 not in markers, "APP1未被移除"
+            assert 0xED not in markers, "APP13未被移除"
+            assert 0xFE not in markers, "COM未被移除"
+            assert b'ComfyUI' not in stripped
+            assert b'xmpmeta' not in stripped
+
+            # 熵编码数据原样保留：扫描部分字节完全一致
+            sos = original.index(b'\xFF\xDA')
+            assert stripped.endswith(original[sos:]), "图像数据被修改"
+
+            with Image.open(input_path) as a, Image.open(output_path) as b:
+                assert a.tobytes() == b.tobytes(), "解码像素不一致"
+                assert not b.getexif(), "EXIF仍然存在"
+
+        print("  ✅ JPEG元数据段移除测试通过!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_invalid_jpeg():
+    """测试无效或截断的JPEG文件"""
+    print("\n🧪 测试无效JPEG文件...")
+    processor = JPEGSegmentProcessor()
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        not_jpeg = os.path.join(temp_dir, "not_jpeg.jpg")
+        with open(not_jpeg, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n')
+        assert not processor.is_jpeg_file(not_jpeg)
+        assert not processor.process_jpeg_streaming(not_jpeg, os.path.join(temp_dir, "out1.jpg"))
+
+        truncated = os.path.join(temp_dir, "truncated.jpg")
+        data = create_test_jpeg(os.path.join(temp_dir, "full.jpg"))
+        with open(truncated, 'wb') as f:
+            f.write(data[:len(data) // 3])
+        assert not processor.process_jpeg_streaming(truncated, os.path.join(temp_dir, "out2.jpg"))
+
+        print("  ✅ 无效JPEG处理正常!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_clean_jpeg_fast_path():
+    """测试不含元数据的JPEG直接链接或复制，扫描之间的段和EOI之后的数据仍会被去除"""
+    print("\n🧪 测试干净JPEG的快速输出...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        for progressive in (False, True):
+            buffer = io.BytesIO()
+            Image.new('RGB', (32, 32), color=(30, 60, 90)).save(buffer, 'JPEG', progressive=progressive)
+            clean_data = buffer.getvalue()
+            clean = os.path.join(temp_dir, "clean.jpg")
+            with open(clean, 'wb') as f:
+                f.write(clean_data)
+
+            output_path = os.path.join(temp_dir, "clean_output.jpg")
+            result = process_image_file(clean, output_path, CLEAN_HARDLINK)
+            assert not result['needs_stripping'] and result['output_strategy'] == CLEAN_HARDLINK
+            assert os.path.samefile(clean, output_path)
+            os.unlink(output_path)
+
+            result = process_image_file(clean, output_path, CLEAN_REWRITE)
+            assert not result['needs_stripping'] and result['output_strategy'] == CLEAN_REWRITE
+            with open(output_path, 'rb') as f:
+                assert f.read() == clean_data
+
+        # 渐进式JPEG的两次扫描之间的注释段
+        first_sos = clean_data.find(b'\xFF\xDA')
+        second_sos = clean_data.find(b'\xFF\xDA', first_sos + 2)
+        comment = b'\xFF\xFE\x00\x08hidden'
+        between = os.path.join(temp_dir, "between.jpg")
+        with open(between, 'wb') as f:
+            f.write(clean_data[:second_sos] + comment + clean_data[second_sos:])
+        result = process_image_file(between, os.path.join(temp_dir, "between_output.jpg"))
+        assert result['needs_stripping'] and result['removed'] == ['COM']
+        with open(os.path.join(temp_dir, "between_output.jpg"), 'rb') as f:
+            assert f.read() == clean_data
+
+        # EOI之后的多余数据
+        trailing = os.path.join(temp_dir, "trailing.jpg")
+        with open(trailing, 'wb') as f:
+            f.write(clean_data + b'appended payload')
+        result = process_image_file(trailing, os.path.join(temp_dir, "trailing_output.jpg"))
+        assert result['needs_stripping'] and result['output_strategy'] == CLEAN_REWRITE
+        with open(os.path.join(temp_dir, "trailing_output.jpg"), 'rb') as f:
+            assert f.read() == clean_data
+
+        print("  ✅ 干净JPEG的快速输出正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试JPEG段处理器")
+    print("=" * 50)
+
+    try:
+        test_jpeg_segments_removed()
+        test_invalid_jpeg()
+        test_clean_jpeg_fast_path()
+
+        print("\n" + "=" * 50)
+        print("🎉 JPEG段处理器测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试单个文件的资源限制
+验证伪造的超大块长度、过多的块、过大的输出和超时都以明确的原因失败，且不影响同一批的其他文件
+"""
+
+import io
+import os
+import sys
+import json
+import zlib
+import struct
+import subprocess
+import tempfile
+import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, PngImagePlugin
+import fastcopy
+from batch import BatchRunner
+from limits import LimitExceededError, ResourceLimits
+from png_chunks import PNG_SIGNATURE
+from processors import process_image_file
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_chunk(chunk_type, data):
+    return (struct.pack('>I', len(data)) + chunk_type + data
+            + struct.pack('>I', zlib.crc32(chunk_type + data)))
+
+
+def create_text_png(path, text_chunks, size=(16, 16)):
+    """创建包含指定数量文本块的PNG"""
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color=(4, 5, 6)).save(buffer, "PNG")
+    data = buffer.getvalue()
+    iend = data.rindex(b'IEND') - 4
+    texts = b''.join(make_chunk(b'tEXt', b'prompt\x00%d' % i) for i in range(text_chunks))
+    with open(path, 'wb') as f:
+        f.write(data[:iend] + texts + data[iend:])
+
+
+def create_hostile_png(path):
+    """创建长度字段声明接近4GB的PNG"""
+    ihdr = make_chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 0, 0, 0, 0))
+    with open(path, 'wb') as f:
+        f.write(PNG_SIGNATURE + ihdr + struct.pack('>I', 0xFFFFFFF0) + b'tEXt' + b'x' * 64)
+
+
+def test_chunk_limits():
+    """测试块长度和块数量上限"""
+    print("🧪 测试块长度和块数量上限...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        hostile = os.path.join(temp_dir, "hostile.png")
+        create_hostile_png(hostile)
+        try:
+            process_image_file(hostile, os.path.join(temp_dir, "out1.png"))
+            assert False, "声明4GB的块应失败"
+        except Exception as e:
+            assert "tEXt" in str(e) and "4294967280" in str(e), str(e)
+
+        many = os.path.join(temp_dir, "many.png")
+        create_text_png(many, 50)
+        limits = ResourceLimits(max_chunks=20)
+        try:
+            process_image_file(many, os.path.join(temp_dir, "out2.png"), limits=limits)
+            assert False, "超过块数量上限应失败"
+        except Exception as e:
+            assert "块数量超过上限: 20" in str(e), str(e)
+
+        limits = ResourceLimits(max_chunk_length=4)
+        try:
+            process_image_file(many, os.path.join(temp_dir, "out3.png"), limits=limits)
+            assert False, "超过块长度上限应失败"
+        except Exception as e:
+            assert "块长度超过上限: IHDR" in str(e), str(e)
+
+        # JPEG段同样受块长度限制
+        jpeg = os.path.join(temp_dir, "photo.jpg")
+        Image.new('RGB', (16, 16), color=(7, 8, 9)).save(jpeg, "JPEG")
+        try:
+            process_image_file(jpeg, os.path.join(temp_dir, "out4.jpg"),
+                               limits=ResourceLimits(max_chunk_length=8))
+            assert False, "超过段长度上限应失败"
+        except Exception as e:
+            assert "块长度超过上限" in str(e), str(e)
+
+        # 默认限制下正常文件不受影响
+        result = process_image_file(many, os.path.join(temp_dir, "out5.png"))
+        assert result['removed'] == ['tEXt'] * 50
+
+        print("  ✅ 块长度和块数量上限生效!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_output_limit_and_timeout():
+    """测试输出大小上限和超时"""
+    print("\n🧪 测试输出大小上限和超时...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        image = Image.effect_noise((64, 64), 50).convert('RGB')
+        input_path = os.path.join(temp_dir, "workflow.png")
+        metadata = PngImagePlugin.PngInfo()
+        metadata.add_text("workflow", "nodes")
+        image.save(input_path, "PNG", pnginfo=metadata)
+        jpeg_path = os.path.join(temp_dir, "photo.jpg")
+        exif = Image.Exif()
+        exif[0x0131] = "editor"
+        image.save(jpeg_path, "JPEG", quality=95, exif=exif.tobytes())
+
+        # PNG在写入前就按保留的块计算出输出大小；JPEG写入后检查，超出时删除输出文件
+        limits = ResourceLimits(max_output_bytes=1024)
+        for path, output_name in ((input_path, "output.png"), (jpeg_path, "output.jpg")):
+            with open(path, 'rb') as f:
+                original = f.read()
+            output_path = os.path.join(temp_dir, output_name)
+            try:
+                process_image_file(path, output_path, limits=limits)
+                assert False, "超过输出大小上限应失败"
+            except Exception as e:
+                assert "输出大小超过上限" in str(e), str(e)
+            assert not os.path.exists(output_path), "超出上限的输出文件应被删除"
+
+            # 原地处理时原文件保持不变，也不留下临时文件
+            try:
+                process_image_file(path, path, limits=limits)
+                assert False, "超过输出大小上限应失败"
+            except Exception as e:
+                assert "输出大小超过上限" in str(e), str(e)
+            with open(path, 'rb') as f:
+                assert f.read() == original
+            assert sorted(os.listdir(temp_dir)) == ["photo.jpg", "workflow.png"]
+
+        # JPEG超出上限的错误直接来自写入后的检查
+        try:
+            process_image_file(jpeg_path, os.path.join(temp_dir, "output.jpg"), limits=limits)
+            assert False, "超过输出大小上限应失败"
+        except LimitExceededError:
+            pass
+        assert not os.path.exists(os.path.join(temp_dir, "output.jpg"))
+
+        # 截止时间已经过去时在遍历第一个块时失败
+        try:
+            process_image_file(input_path, os.path.join(temp_dir, "output.png"),
+                               limits=ResourceLimits(timeout=-1))
+            assert False, "超时应失败"
+        except Exception as e:
+            assert "处理超时" in str(e), str(e)
+
+        print("  ✅ 输出大小上限和超时生效!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_batch_failure_reasons():
+    """测试批量处理中超出限制的文件记录失败原因，其余文件正常处理"""
+    print("\n🧪 测试批量处理的失败原因...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        paths = []
+        for name, chunks in (("small.png", 2), ("many.png", 200), ("other.png", 3)):
+            path = os.path.join(input_dir, name)
+            create_text_png(path, chunks)
+            paths.append(path)
+        hostile = os.path.join(input_dir, "hostile.png")
+        create_hostile_png(hostile)
+        paths.append(hostile)
+
+        for mode in (BatchRunner.EXECUTOR_SERIAL, BatchRunner.EXECUTOR_PIPELINE,
+                     BatchRunner.EXECUTOR_PROCESS):
+            output_dir = os.path.join(temp_dir, mode)
+            os.makedirs(output_dir)
+            runner = BatchRunner(paths, output_dir, keep_original_name=True, executor_mode=mode,
+                                 max_workers=2, limits=ResourceLimits(max_chunks=100))
+            stats = runner.run()
+
+            assert sorted(stats['failed_files']) == ["hostile.png", "many.png"], (mode, stats)
+            assert "块数量超过上限: 100" in stats['failure_reasons']["many.png"]
+            assert "块数据不完整" in stats['failure_reasons']["hostile.png"]
+            assert sorted(os.listdir(output_dir)) == ["other.png", "small.png"], mode
+
+        print("  ✅ 失败原因记录正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_copy_and_worker_timeout():
+    """测试复制数据时检查超时，以及多进程模式下终止卡住的工作进程"""
+    print("\n🧪 测试复制超时和卡住的工作进程...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        # 截止时间已经过去时，复制完第一段后失败
+        source = os.path.join(temp_dir, "source.bin")
+        with open(source, 'wb') as f:
+            f.write(os.urandom(1024))
+        expired = ResourceLimits(timeout=-1).for_file()
+        for input_file in (open(source, 'rb'), io.BytesIO(b'x' * 1024)):
+            with input_file, open(os.path.join(temp_dir, "copy.bin"), 'wb') as output_file:
+                try:
+                    fastcopy.copy_ranges(input_file, output_file, [(0, 1024)], expired)
+                    assert False, "超时应失败"
+                except LimitExceededError as e:
+                    assert "处理超时" in str(e)
+
+        if not hasattr(os, 'mkfifo'):
+            print("  ⚠️ 当前平台不支持命名管道，跳过卡住的工作进程")
+            return
+
+        # 没有写入端的命名管道让工作进程卡在open中，无法自行检查超时
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        paths = []
+        for name in ("first.png", "second.png", "third.png"):
+            path = os.path.join(input_dir, name)
+            create_text_png(path, 2)
+            paths.append(path)
+        stuck = os.path.join(input_dir, "stuck.png")
+        os.mkfifo(stuck)
+        paths.insert(1, stuck)
+
+        executor = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn'))
+        runner = None
+        try:
+            output_dir = os.path.join(temp_dir, "output")
+            os.makedirs(output_dir)
+            runner = BatchRunner(paths, output_dir, keep_original_name=True,
+                                 executor_mode=BatchRunner.EXECUTOR_PROCESS, max_workers=2,
+                                 executor=executor, limits=ResourceLimits(timeout=0.5))
+            runner.TIMEOUT_GRACE = 0.5
+            stats = runner.run()
+            assert stats['failed_files'] == ["stuck.png"], stats
+            assert "工作进程已被终止" in stats['failure_reasons']["stuck.png"]
+            assert stats['successful'] == 3
+            assert sorted(os.listdir(output_dir)) == ["first.png", "second.png", "third.png"]
+
+            # 外部进程池被终止后换成了新的进程池，可以继续使用
+            assert runner.executor is not executor
+            assert runner.executor.submit(sum, [1, 2]).result(timeout=30) == 3
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            if runner is not None and runner.executor is not executor:
+                runner.executor.shutdown(wait=True, cancel_futures=True)
+
+        print("  ✅ 复制超时和卡住的工作进程被终止!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_in_place_worker_timeout():
+    """测试原地处理时工作进程被终止，临时文件被删除"""
+    print("\n🧪 测试原地处理时卡住的工作进程...")
+    if not hasattr(os, 'mkfifo'):
+        print("  ⚠️ 当前平台不支持命名管道，跳过")
+        return
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        paths = []
+        for name in ("first.png", "second.png"):
+            path = os.path.join(temp_dir, name)
+            create_text_png(path, 2)
+            paths.append(path)
+        # 工作进程先创建临时文件，再卡在打开命名管道上
+        stuck = os.path.join(temp_dir, "stuck.png")
+        os.mkfifo(stuck)
+        paths.insert(1, stuck)
+
+        executor = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn'))
+        runner = None
+        try:
+            runner = BatchRunner(paths, None, keep_original_name=True, in_place=True, fsync='none',
+                                 executor_mode=BatchRunner.EXECUTOR_PROCESS, max_workers=2,
+                                 executor=executor, limits=ResourceLimits(timeout=0.5))
+            runner.TIMEOUT_GRACE = 0.5
+            stats = runner.run()
+            assert stats['failed_files'] == [stuck], stats
+            assert "工作进程已被终止" in stats['failure_reasons'][stuck]
+            assert stats['successful'] == 2
+            assert sorted(os.listdir(temp_dir)) == ["first.png", "second.png", "stuck.png"], \
+                "不应留下临时文件"
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            if runner is not None and runner.executor is not executor:
+                runner.executor.shutdown(wait=True, cancel_futures=True)
+
+        print("  ✅ 原地处理的临时文件被删除!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_cli_limits():
+    """测试命令行的资源限制参数"""
+    print("\n🧪 测试命令行资源限制参数...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_path = os.path.join(temp_dir, "many.png")
+        create_text_png(input_path, 30)
+        output_dir = os.path.join(temp_dir, "output")
+
+        result = subprocess.run(
+            [sys.executable, "-m", "cli", "strip", input_path, "-o", output_dir, "--no-cache",
+             "--max-chunks", "10", "--timeout", "30", "--max-output-mb", "1"],
+            cwd=PROJECT_DIR, capture_output=True, text=True, encoding='utf-8'
+        )
+        assert result.returncode == 1, result.stderr
+        stats = json.loads(result.stdout)
+        assert "块数量超过上限: 10" in stats['failure_reasons']["many.png"]
+
+        print("  ✅ 命令行资源限制参数生效!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试资源限制")
+    print("=" * 50)
+
+    try:
+        test_chunk_limits()
+        test_output_limit_and_timeout()
+        test_batch_failure_reasons()
+        test_copy_and_worker_timeout()
+        test_in_place_worker_timeout()
+        test_cli_limits()
+
+        print("\n" + "=" * 50)
+        print("🎉 资源限制测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
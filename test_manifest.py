@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试清单分片处理
+验证分片切分、锁文件领取的互斥、超时锁的重新领取、锁的释放和心跳，以及多个工作进程处理后合并的统计结果
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, PngImagePlugin
+import manifest
+from manifest import ShardWorker, create_manifest, merge_results, read_shard
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def create_images(directory, count):
+    """创建带文本块的PNG，返回路径列表"""
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"image_{i:03d}.png")
+        metadata = PngImagePlugin.PngInfo()
+        metadata.add_text("workflow", f"nodes {i}")
+        Image.new('RGB', (8, 8), color=(0, i, 0)).save(path, "PNG", pnginfo=metadata)
+        paths.append(path)
+    return paths
+
+
+def test_create_and_claim():
+    """测试分片切分、领取互斥和超时锁的重新领取"""
+    print("🧪 测试分片切分和领取...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        paths = create_images(input_dir, 25)
+        shared_dir = os.path.join(temp_dir, "shared")
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(output_dir)
+
+        manifest = create_manifest(shared_dir, paths, output_dir=output_dir, shard_size=10)
+        assert manifest['shards'] == 3 and manifest['total_files'] == 25
+        assert read_shard(shared_dir, 2) == [[path, os.path.basename(path)] for path in paths[20:]]
+        try:
+            create_manifest(shared_dir, paths, output_dir=output_dir)
+            assert False, "共享目录中已有任务时应拒绝覆盖"
+        except FileExistsError:
+            pass
+
+        # 不同的工作进程领取到不同的分片
+        first = ShardWorker(shared_dir, worker_id="host-a:1")
+        second = ShardWorker(shared_dir, worker_id="host-b:2", stale_after=60)
+        assert first.claim() == 0
+        assert second.claim() == 1
+        assert second.claim() == 2
+        assert second.claim() is None, "所有分片都已被领取"
+
+        # 锁文件长时间未更新时可以被重新领取
+        lock_path = os.path.join(shared_dir, 'claims', "shard-00000.lock")
+        old = time.time() - 120
+        os.utime(lock_path, (old, old))
+        assert first.claim() is None, "默认超时时间内不能重新领取"
+        assert second.claim() == 0
+        with open(lock_path, encoding='utf-8') as f:
+            assert f.read().startswith("host-b:2")
+
+        # 处理两个分片后合并，剩余的分片显示为未完成
+        second.process_shard(0)
+        second.process_shard(1)
+        stats = merge_results(shared_dir)
+        assert stats['completed_shards'] == 2 and stats['pending_shards'] == [2]
+        assert stats['successful'] == 20 and stats['workers'] == {"host-b:2": 2}
+        assert not os.path.exists(lock_path), "完成后应释放锁文件"
+
+        # 已完成的分片不会再被领取
+        os.unlink(os.path.join(shared_dir, 'claims', "shard-00002.lock"))
+        assert first.claim() == 2
+
+        print("  ✅ 分片切分和领取正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_release_and_heartbeat():
+    """测试只释放本进程的锁，以及处理单个文件期间后台线程持续更新锁文件"""
+    print("\n🧪 测试锁的释放和心跳...")
+    temp_dir = tempfile.mkdtemp()
+    heartbeat_interval = manifest.HEARTBEAT_INTERVAL
+
+    try:
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        paths = create_images(input_dir, 4)
+        shared_dir = os.path.join(temp_dir, "shared")
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(output_dir)
+        create_manifest(shared_dir, paths, output_dir=output_dir, shard_size=2)
+
+        # 超时后被其他进程重新领取的锁不会被原来的进程删除
+        first = ShardWorker(shared_dir, worker_id="host-a:1")
+        second = ShardWorker(shared_dir, worker_id="host-b:2", stale_after=60)
+        assert first.claim() == 0
+        lock_path = os.path.join(shared_dir, 'claims', "shard-00000.lock")
+        old = time.time() - 120
+        os.utime(lock_path, (old, old))
+        assert second.claim() == 0
+        first._release(0)
+        with open(lock_path, encoding='utf-8') as f:
+            assert f.read().startswith("host-b:2"), "不应删除其他进程的锁"
+        second._release(0)
+        assert not os.path.exists(lock_path)
+
+        # 处理期间没有结果回调时锁文件也会被更新
+        manifest.HEARTBEAT_INTERVAL = 0.05
+        mtimes = []
+
+        def slow_callback(filename, error, done_count, total):
+            os.utime(lock_path, (old, old))
+            time.sleep(0.3)
+            mtimes.append(os.stat(lock_path).st_mtime)
+
+        worker = ShardWorker(shared_dir, {'result_callback': slow_callback}, worker_id="host-c:3")
+        assert worker.claim() == 0
+        worker.process_shard(0)
+        assert len(mtimes) == 2 and all(mtime > old + 60 for mtime in mtimes), "心跳线程应更新锁文件"
+        assert not os.path.exists(lock_path)
+
+        # 处理期间锁被其他进程重新领取时停止处理，不写结果，也不删除新的锁
+        lock_path = os.path.join(shared_dir, 'claims', "shard-00001.lock")
+
+        def stolen_callback(filename, error, done_count, total):
+            if done_count == 1:
+                os.utime(lock_path, (old, old))
+                assert second.claim() == 1
+                time.sleep(0.3)
+
+        worker = ShardWorker(shared_dir, {'result_callback': stolen_callback}, worker_id="host-c:3")
+        assert worker.claim() == 1
+        stats = worker.process_shard(1)
+        assert stats['successful'] == 1, "丢失锁后应停止处理"
+        assert not os.path.exists(os.path.join(shared_dir, 'results', "shard-00001.json")), \
+            "丢失锁后不应写出结果"
+        with open(lock_path, encoding='utf-8') as f:
+            assert f.read().startswith("host-b:2"), "不应删除其他进程的锁"
+
+        print("  ✅ 锁的释放和心跳正确!")
+    finally:
+        manifest.HEARTBEAT_INTERVAL = heartbeat_interval
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_stale_lock_race():
+    """测试删除超时锁时锁已被重新领取：放回原处，不覆盖第三个进程创建的锁"""
+    print("\n🧪 测试超时锁的竞争...")
+    temp_dir = tempfile.mkdtemp()
+    original_rename = os.rename
+
+    try:
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        paths = create_images(input_dir, 2)
+        shared_dir = os.path.join(temp_dir, "shared")
+        create_manifest(shared_dir, paths, output_dir=temp_dir, shard_size=2)
+        claims_dir = os.path.join(shared_dir, 'claims')
+        lock_path = os.path.join(claims_dir, "shard-00000.lock")
+        worker = ShardWorker(shared_dir, worker_id="host-a:1")
+
+        for third_token in (None, "host-c:3 1.0"):
+            with open(lock_path, 'w', encoding='utf-8') as f:
+                f.write("host-old:0 1.0")
+            old = time.time() - 7200
+            os.utime(lock_path, (old, old))
+
+            def racing_rename(src, dst):
+                if src != lock_path:
+                    return original_rename(src, dst)
+                # 读出内容之后、重命名之前，分片被另一个进程重新领取
+                with open(lock_path, 'w', encoding='utf-8') as f:
+                    f.write("host-b:2 1.0")
+                original_rename(src, dst)
+                # 重命名之后，第三个进程发现锁文件不存在并领取了分片
+                if third_token is not None:
+                    with open(lock_path, 'x', encoding='utf-8') as f:
+                        f.write(third_token)
+
+            os.rename = racing_rename
+            try:
+                assert not worker._break_stale_lock(lock_path)
+            finally:
+                os.rename = original_rename
+            with open(lock_path, encoding='utf-8') as f:
+                assert f.read() == (third_token or "host-b:2 1.0"), "锁文件不应被覆盖"
+            assert os.listdir(claims_dir) == ["shard-00000.lock"], "不应留下移走的锁文件"
+
+        print("  ✅ 超时锁的竞争处理正确!")
+    finally:
+        os.rename = original_rename
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_cli_multiple_workers():
+    """测试多个工作进程同时处理同一个清单"""
+    print("\n🧪 测试多个工作进程...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        create_images(input_dir, 40)
+        broken = os.path.join(input_dir, "broken.png")
+        with open(broken, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n\x00\x00\xff\xffIHDR')
+        shared_dir = os.path.join(temp_dir, "shared")
+        output_dir = os.path.join(temp_dir, "output")
+
+        cli = [sys.executable, "-m", "cli", "manifest"]
+        result = subprocess.run(cli + ["create", shared_dir, input_dir, "-o", output_dir, "--shard-size", "4"],
+                                cwd=PROJECT_DIR, capture_output=True, text=True, encoding='utf-8')
+        assert result.returncode == 0, result.stderr
+
+        workers = [subprocess.Popen(cli + ["work", shared_dir, "--no-cache"], cwd=PROJECT_DIR,
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                    encoding='utf-8')
+                   for _ in range(3)]
+        shard_counts = []
+        for worker in workers:
+            stdout, stderr = worker.communicate(timeout=120)
+            assert worker.returncode == 0, stderr
+            shard_counts.append(len(stdout.splitlines()))
+        assert sum(shard_counts) == 11, f"每个分片只应被处理一次: {shard_counts}"
+
+        result = subprocess.run(cli + ["merge", shared_dir], cwd=PROJECT_DIR, capture_output=True,
+                                text=True, encoding='utf-8')
+        assert result.returncode == 1, "存在失败文件时退出码为1"
+        stats = json.loads(result.stdout)
+        assert stats['total_files'] == 41 and stats['successful'] == 40
+        assert stats['failed_files'] == ["broken.png"]
+        assert stats['pending_shards'] == [] and stats['completed_shards'] == 11
+        assert len(os.listdir(output_dir)) == 40
+        assert os.listdir(os.path.join(shared_dir, 'claims')) == []
+
+        print(f"  ✅ 3个工作进程分别处理了 {shard_counts} 个分片!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试清单分片处理")
+    print("=" * 50)
+
+    try:
+        test_create_and_claim()
+        test_release_and_heartbeat()
+        test_stale_lock_race()
+        test_cli_multiple_workers()
+
+        print("\n" + "=" * 50)
+        print("🎉 清单分片处理测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试多进程并行处理功能
+验证进程池模式下的统计结果、信号和停止逻辑
+"""
+
+import os
+import sys
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, PngImagePlugin
+from main import ImageProcessor
+
+
+def create_test_files(temp_dir, count):
+    """创建带元数据的PNG文件和一个无效文件"""
+    test_files = []
+    for i in range(count):
+        path = os.path.join(temp_dir, f"image_{i}.png")
+        metadata = PngImagePlugin.PngInfo()
+        metadata.add_text("workflow", '{"nodes": [%d]}' % i)
+        Image.new('RGB', (32, 32), color=(i * 20, 0, 0)).save(path, "PNG", pnginfo=metadata)
+        test_files.append(path)
+
+    invalid_file = os.path.join(temp_dir, "invalid.txt")
+    with open(invalid_file, 'w') as f:
+        f.write("这不是图片文件")
+    test_files.append(invalid_file)
+    return test_files
+
+
+def test_process_pool_stats():
+    """测试进程池模式的统计结果"""
+    print("🧪 测试进程池并行处理...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        test_files = create_test_files(temp_dir, 6)
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(output_dir)
+
+        processor = ImageProcessor(test_files, output_dir, keep_original_name=True,
+                                   executor_mode=ImageProcessor.EXECUTOR_PROCESS,
+                                   max_workers=2)
+
+        progress_values = []
+        messages = []
+        stats_result = []
+        processor.progress_updated.connect(progress_values.append)
+        processor.task_completed.connect(messages.append)
+        processor.all_tasks_completed.connect(stats_result.append)
+
+        # 直接在当前线程中运行
+        processor.run()
+
+        stats = stats_result[0]
+        print(f"  📊 统计结果: 成功 {stats['successful']}，失败 {stats['failed']}")
+        assert stats['total_files'] == len(test_files)
+        assert stats['successful'] == 6
+        assert stats['failed'] == 1
+        assert stats['failed_files'] == ["invalid.txt"]
+        assert sorted(stats['processed_files']) == sorted(f"image_{i}.png" for i in range(6))
+        # 进度信号按时间间隔合并，最后一次报告总是100%
+        assert 1 <= len(messages) <= len(test_files)
+        assert progress_values[-1] == 100
+
+        for i in range(6):
+            with open(os.path.join(output_dir, f"image_{i}.png"), 'rb') as f:
+                assert b'tEXt' not in f.read(), "元数据未被移除"
+
+        print("  ✅ 进程池统计验证通过!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_process_pool_stop():
+    """测试停止后取消剩余任务"""
+    print("\n🧪 测试进程池停止...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        test_files = create_test_files(temp_dir, 40)
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(output_dir)
+
+        processor = ImageProcessor(test_files, output_dir, keep_original_name=True,
+                                   executor_mode=ImageProcessor.EXECUTOR_PROCESS,
+                                   max_workers=1)
+
+        stats_result = []
+        processor.task_completed.connect(lambda message: processor.stop())
+        processor.all_tasks_completed.connect(stats_result.append)
+        processor.run()
+
+        stats = stats_result[0]
+        finished = stats['successful'] + stats['failed']
+        print(f"  📊 停止前完成 {finished}/{stats['total_files']} 个文件")
+        assert 1 <= finished < stats['total_files']
+
+        print("  ✅ 停止逻辑验证通过!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试多进程并行处理")
+    print("=" * 50)
+
+    try:
+        test_process_pool_stats()
+        test_process_pool_stop()
+
+        print("\n" + "=" * 50)
+        print("🎉 多进程并行处理测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试PIL重新编码的后备处理
+验证调色板、各种模式和多帧图片的像素保持不变，元数据被去除，解压炸弹被拒绝，以及峰值内存接近原始像素大小
+"""
+
+import os
+import sys
+import subprocess
+import tempfile
+import shutil
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, ImageSequence
+from processors import process_non_png_image
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 子进程中测量重新编码一张大BMP前后的峰值内存（KB）
+MEMORY_SCRIPT = """
+import resource, sys
+sys.path.insert(0, sys.argv[3])
+from processors import process_non_png_image
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+process_non_png_image(sys.argv[1], sys.argv[2])
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)
+"""
+
+
+def gradient(mode, size=(40, 30)):
+    """生成各像素不同的测试图片"""
+    image = Image.linear_gradient('L').resize(size)
+    if mode == 'P':
+        return image.convert('RGB').quantize(colors=16)
+    if mode == 'RGBA':
+        rgba = image.convert('RGBA')
+        rgba.putalpha(image.transpose(Image.Transpose.FLIP_LEFT_RIGHT))
+        return rgba
+    return image.convert(mode)
+
+
+def test_modes_and_palette():
+    """测试BMP的调色板、灰度、RGB和RGBA图片"""
+    print("🧪 测试各种模式的BMP...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        for mode in ('P', 'L', 'RGB', 'RGBA'):
+            input_path = os.path.join(temp_dir, f"{mode}.bmp")
+            output_path = os.path.join(temp_dir, f"{mode}_output.bmp")
+            gradient(mode).save(input_path, "BMP")
+
+            process_non_png_image(input_path, output_path)
+            with Image.open(input_path) as original, Image.open(output_path) as stripped:
+                assert stripped.format == 'BMP' and stripped.mode == original.mode, mode
+                assert stripped.tobytes() == original.tobytes(), mode
+                if mode == 'P':
+                    assert stripped.getpalette() == original.getpalette(), "调色板应保持不变"
+
+        print("  ✅ 各种模式的像素和调色板保持不变!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_multi_frame_tiff():
+    """测试多页TIFF逐页复制，并去除标签中的元数据"""
+    print("\n🧪 测试多页TIFF...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_path = os.path.join(temp_dir, "pages.tiff")
+        output_path = os.path.join(temp_dir, "output.tiff")
+        pages = [gradient('RGB'), gradient('L', (20, 10)), gradient('P')]
+        pages[0].save(input_path, "TIFF", save_all=True, append_images=pages[1:],
+                      tiffinfo={305: "secret editor", 270: "private description"})
+
+        process_non_png_image(input_path, output_path)
+        with Image.open(input_path) as original, Image.open(output_path) as stripped:
+            assert 305 not in stripped.tag_v2 and 270 not in stripped.tag_v2
+            expected = [(page.mode, page.size, page.tobytes()) for page in ImageSequence.Iterator(original)]
+            copied = [(page.mode, page.size, page.tobytes()) for page in ImageSequence.Iterator(stripped)]
+            assert [page[0] for page in copied] == ['RGB', 'L', 'P']
+            assert copied == expected
+
+        print("  ✅ 多页TIFF的每一页都保持不变!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_decompression_bomb():
+    """测试超过PIL像素上限的图片（包括多帧图片的后续帧）被拒绝"""
+    print("\n🧪 测试解压炸弹上限...")
+    temp_dir = tempfile.mkdtemp()
+    max_pixels = Image.MAX_IMAGE_PIXELS
+
+    try:
+        input_path = os.path.join(temp_dir, "pages.tiff")
+        gradient('L', (8, 8)).save(input_path, "TIFF", save_all=True,
+                                   append_images=[gradient('L', (20, 20))])
+
+        Image.MAX_IMAGE_PIXELS = 50
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            try:
+                process_non_png_image(input_path, os.path.join(temp_dir, "output.tiff"))
+                assert False, "第二页超过像素上限应失败"
+            except Exception as e:
+                assert "decompression bomb" in str(e) or "解压炸弹" in str(e), str(e)
+
+        print("  ✅ 解压炸弹被拒绝!")
+    finally:
+        Image.MAX_IMAGE_PIXELS = max_pixels
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_peak_memory():
+    """测试重新编码大BMP的峰值内存接近原始像素大小"""
+    print("\n🧪 测试大BMP的峰值内存...")
+    try:
+        import resource  # noqa: F401
+    except ImportError:
+        print("  ⚠️ 当前平台没有resource模块，跳过")
+        return
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_path = os.path.join(temp_dir, "large.bmp")
+        size = (5000, 5000)
+        Image.new('RGB', size, color=(10, 20, 30)).save(input_path, "BMP")
+        raw_kb = size[0] * size[1] * 3 // 1024
+
+        result = subprocess.run(
+            [sys.executable, "-c", MEMORY_SCRIPT, input_path, os.path.join(temp_dir, "output.bmp"),
+             PROJECT_DIR],
+            capture_output=True, text=True
+        )
+        assert result.returncode == 0, result.stderr
+        growth_kb = int(result.stdout.strip())
+        print(f"  原始像素 {raw_kb // 1024}MB，峰值内存增加 {growth_kb // 1024}MB")
+        assert growth_kb < raw_kb * 3, "峰值内存应接近原始像素大小，而不是数十倍"
+
+        print("  ✅ 峰值内存符合预期!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试PIL后备处理")
+    print("=" * 50)
+
+    try:
+        test_modes_and_palette()
+        test_multi_frame_tiff()
+        test_decompression_bomb()
+        test_peak_memory()
+
+        print("\n" + "=" * 50)
+        print("🎉 PIL后备处理测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试读写流水线
+验证字节预算限制内存占用、流水线输出与串行处理一致，以及失败文件和停止处理的报告
+"""
+
+import os
+import sys
+import io
+import time
+import tempfile
+import shutil
+import threading
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, PngImagePlugin
+from pipeline import ByteBudget, IOPipeline
+from batch import BatchRunner
+import cli
+
+
+def create_images(directory, count=6):
+    """创建带工作流文本的PNG和JPEG，以及一个不含元数据的PNG"""
+    paths = []
+    for i in range(count):
+        image = Image.new('RGB', (48, 48), color=(i * 40, 120, 255 - i * 40))
+        if i % 2 == 0:
+            path = os.path.join(directory, f"image_{i}.png")
+            metadata = PngImagePlugin.PngInfo()
+            if i != 0:
+                metadata.add_text("workflow", "secret prompt " * 100)
+            image.save(path, "PNG", pnginfo=metadata)
+        else:
+            path = os.path.join(directory, f"image_{i}.jpg")
+            image.save(path, "JPEG", exif=b"Exif\x00\x00" + b"II*\x00\x08\x00\x00\x00\x00\x00\x00\x00\x00\x00")
+        paths.append(path)
+    return paths
+
+
+def read_outputs(directory):
+    outputs = {}
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), 'rb') as f:
+            outputs[name] = f.read()
+    return outputs
+
+
+def test_byte_budget():
+    """测试字节预算的占用、交换和关闭"""
+    print("🧪 测试字节预算...")
+    budget = ByteBudget(100)
+
+    # 没有占用时超出预算的请求也允许，保证大文件能够处理
+    assert budget.acquire(150)
+    budget.release(150)
+
+    assert budget.acquire(60)
+    acquired = threading.Event()
+
+    def acquire_more():
+        if budget.acquire(60):
+            acquired.set()
+
+    thread = threading.Thread(target=acquire_more)
+    thread.start()
+    time.sleep(0.05)
+    assert not acquired.is_set(), "超出预算时应等待"
+
+    budget.exchange(60, 30)
+    thread.join(timeout=1)
+    assert acquired.is_set(), "释放后应继续"
+    assert budget.used == 90 and budget.peak == 150
+
+    # 关闭后等待中的请求立即返回False
+    result = []
+    thread = threading.Thread(target=lambda: result.append(budget.acquire(50)))
+    thread.start()
+    budget.close()
+    thread.join(timeout=1)
+    assert result == [False]
+
+    print("  ✅ 字节预算正确!")
+
+
+def test_pipeline_order_and_budget():
+    """测试流水线按输入顺序处理，内存占用不超过预算"""
+    print("\n🧪 测试流水线顺序和预算...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        items = []
+        for i in range(20):
+            path = os.path.join(temp_dir, f"data_{i}.bin")
+            with open(path, 'wb') as f:
+                f.write(bytes([i]) * 1000)
+            items.append((i, path))
+
+        processed = []
+        results = {}
+
+        def process(key, data, read_seconds):
+            processed.append(key)
+            assert data == bytes([key]) * 1000
+            return data[:500], 500
+
+        def write(key, output):
+            time.sleep(0.002)
+            return len(output)
+
+        def done(key, result, error):
+            assert error is None, error
+            results[key] = result
+
+        pipeline = IOPipeline(budget_bytes=3000, prefetch_workers=4, write_workers=2)
+        pipeline.run(items, process, write, done)
+
+        assert processed == list(range(20)), "应按输入顺序处理"
+        assert results == {i: 500 for i in range(20)}
+        assert 0 < pipeline.budget.peak <= 3000, f"峰值占用超出预算: {pipeline.budget.peak}"
+        assert pipeline.budget.used == 0
+
+        print("  ✅ 流水线顺序和预算正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_pipeline_matches_serial():
+    """测试流水线模式的输出和统计结果与串行处理一致"""
+    print("\n🧪 测试流水线与串行处理一致...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        paths = create_images(input_dir)
+
+        # 损坏的PNG报告失败原因，不影响其他文件
+        corrupt_path = os.path.join(input_dir, "corrupt.png")
+        with open(corrupt_path, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n' + b'\x00\x00\xff\xffIHDR')
+        paths.append(corrupt_path)
+
+        serial_dir = os.path.join(temp_dir, "serial")
+        pipeline_dir = os.path.join(temp_dir, "pipeline")
+        os.makedirs(serial_dir)
+        os.makedirs(pipeline_dir)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            serial_stats = BatchRunner(paths, serial_dir, keep_original_name=True).run()
+            pipeline_stats = BatchRunner(paths, pipeline_dir, keep_original_name=True,
+                                         executor_mode=BatchRunner.EXECUTOR_PIPELINE,
+                                         pipeline_budget=4096, collect_timings=True).run()
+
+        assert pipeline_stats['failed_files'] == ["corrupt.png"]
+        assert "corrupt.png" in pipeline_stats['failure_reasons']
+        # 后台写入按完成顺序报告，文件列表的顺序可能与串行处理不同
+        for key in ('successful', 'fast_path_files', 'bytes_in', 'bytes_out'):
+            assert pipeline_stats[key] == serial_stats[key], f"{key}不一致: {pipeline_stats[key]} != {serial_stats[key]}"
+        for key in ('processed_files', 'clean_files'):
+            assert sorted(pipeline_stats[key]) == sorted(serial_stats[key]), f"{key}不一致"
+        assert read_outputs(pipeline_dir) == read_outputs(serial_dir), "输出文件内容不一致"
+        assert 'read' in pipeline_stats['timings']['stages'], "应记录预读耗时"
+
+        print("  ✅ 流水线与串行处理一致!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_pipeline_in_place_and_stop():
+    """测试流水线原地处理、命令行参数和停止处理"""
+    print("\n🧪 测试流水线原地处理和停止...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        paths = create_images(temp_dir)
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            exit_code = cli.main(['strip', *paths, '--in-place', '--pipeline', '--pipeline-budget', '1',
+                                  '--no-cache'])
+        assert exit_code == 0
+        for path in paths:
+            with Image.open(path) as image:
+                assert "workflow" not in image.info
+        assert not [name for name in os.listdir(temp_dir) if name.endswith('.tmp')], "不应留下临时文件"
+
+        # 处理第一个文件后停止，其余文件不再处理
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(output_dir)
+        runner = BatchRunner(paths, output_dir, keep_original_name=True,
+                             executor_mode=BatchRunner.EXECUTOR_PIPELINE,
+                             result_callback=lambda *args: runner.stop())
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = runner.run()
+        assert 1 <= stats['successful'] < len(paths), stats['processed_files']
+        assert stats['failed'] == 0
+
+        print("  ✅ 流水线原地处理和停止正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试读写流水线")
+    print("=" * 50)
+
+    try:
+        test_byte_budget()
+        test_pipeline_order_and_budget()
+        test_pipeline_matches_serial()
+        test_pipeline_in_place_and_stop()
+
+        print("\n" + "=" * 50)
+        print("🎉 读写流水线测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
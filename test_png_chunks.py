@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试PNG块迭代器
+验证文件、memoryview和mmap得到相同的块列表，块记录不复制块数据，以及损坏的长度字段被拒绝
+"""
+
+import os
+import sys
+import io
+import mmap
+import zlib
+import struct
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, PngImagePlugin
+from png_chunks import PNG_SIGNATURE, PNGChunk, iter_chunks, read_chunk_data
+import processors
+from processors import PNGBlockProcessor, process_image_file
+
+
+def make_chunk(chunk_type, data):
+    return (struct.pack('>I', len(data)) + chunk_type + data
+            + struct.pack('>I', zlib.crc32(chunk_type + data)))
+
+
+def create_many_chunks_png(path, text_chunks=3000):
+    """创建包含数千个文本块的PNG"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), color=(1, 2, 3)).save(buffer, "PNG")
+    data = buffer.getvalue()
+    iend = data.rindex(b'IEND') - 4
+    texts = b''.join(make_chunk(b'tEXt', b'prompt\x00%d' % i) for i in range(text_chunks))
+    with open(path, 'wb') as f:
+        f.write(data[:iend] + texts + data[iend:])
+
+
+def chunk_tuples(chunks):
+    return [(chunk.type, chunk.offset, chunk.length, chunk.crc_offset) for chunk in chunks]
+
+
+def test_iter_chunks_sources():
+    """测试文件、memoryview和mmap的遍历结果一致"""
+    print("🧪 测试块迭代器...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        path = os.path.join(temp_dir, "text.png")
+        metadata = PngImagePlugin.PngInfo()
+        metadata.add_text("workflow", "nodes")
+        Image.new('RGB', (16, 16), color=(9, 8, 7)).save(path, "PNG", pnginfo=metadata)
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        with open(path, 'rb', buffering=0) as f:
+            from_file = chunk_tuples(iter_chunks(f))
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                from_mmap = chunk_tuples(iter_chunks(mapped))
+        from_view = chunk_tuples(iter_chunks(memoryview(data)))
+
+        assert from_file == from_mmap == from_view
+        types = [item[0] for item in from_view]
+        assert types[0] == b'IHDR' and types[-1] == b'IEND' and b'tEXt' in types
+
+        # CRC偏移和块数据位置正确
+        for chunk in iter_chunks(data):
+            body = data[chunk.offset + 4:chunk.crc_offset]
+            assert struct.unpack_from('>I', data, chunk.crc_offset)[0] == zlib.crc32(body)
+        text = next(chunk for chunk in iter_chunks(data) if chunk.type == b'tEXt')
+        assert read_chunk_data(data, text) == b'workflow\x00nodes'
+        with open(path, 'rb', buffering=0) as f:
+            assert read_chunk_data(f, text, limit=8) == b'workflow'
+
+        # 块记录使用__slots__，不为每个块创建字典
+        assert not hasattr(text, '__dict__')
+        assert isinstance(text, PNGChunk) and text.size == text.length + 12
+
+        print("  ✅ 块迭代器结果一致!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_corrupt_lengths():
+    """测试长度字段损坏、文件不完整和IEND之后的数据"""
+    print("\n🧪 测试损坏的块长度...")
+    ihdr = make_chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 0, 0, 0, 0))
+    iend = make_chunk(b'IEND', b'')
+
+    # 长度字段声明4GB
+    hostile = PNG_SIGNATURE + ihdr + struct.pack('>I', 0xFFFFFFF0) + b'tEXt' + b'x' * 20
+    try:
+        list(iter_chunks(hostile))
+        assert False, "超出数据范围的块应抛出ValueError"
+    except ValueError as e:
+        assert "tEXt" in str(e)
+
+    # IEND之后的数据不再遍历；不足一个块头的剩余数据直接结束
+    data = PNG_SIGNATURE + ihdr + iend + b'trailing data'
+    assert [chunk.type for chunk in iter_chunks(data)] == [b'IHDR', b'IEND']
+    assert [chunk.type for chunk in iter_chunks(PNG_SIGNATURE + ihdr + b'abc')] == [b'IHDR']
+
+    print("  ✅ 损坏的块长度被拒绝!")
+
+
+def test_many_chunks():
+    """测试包含数千个块的文件"""
+    print("\n🧪 测试数千个块的PNG...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_path = os.path.join(temp_dir, "many.png")
+        output_path = os.path.join(temp_dir, "output.png")
+        create_many_chunks_png(input_path)
+
+        # 扫描按块头seek读取，不映射整个文件
+        original_map_file = processors.map_file
+
+        def no_map_file(input_file):
+            raise AssertionError("PNG扫描不应映射整个文件")
+
+        processors.map_file = no_map_file
+        try:
+            scan = PNGBlockProcessor().scan_png(input_path)
+        finally:
+            processors.map_file = original_map_file
+        assert sum(chunk.type == b'tEXt' for chunk in scan['chunks']) == 3000
+        assert scan['needs_stripping']
+
+        result = process_image_file(input_path, output_path)
+        assert result['removed'] == ['tEXt'] * 3000
+        with open(output_path, 'rb') as f:
+            output = f.read()
+        assert [chunk.type for chunk in iter_chunks(output)].count(b'tEXt') == 0
+        with Image.open(output_path) as image:
+            assert image.size == (8, 8) and not image.text
+
+        info = PNGBlockProcessor().get_file_info(output_path)
+        assert info == {'width': 8, 'height': 8, 'bit_depth': 8, 'color_type': 2, 'is_png': True}
+
+        print("  ✅ 数千个块的PNG处理正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试PNG块迭代器")
+    print("=" * 50)
+
+    try:
+        test_iter_chunks_sources()
+        test_corrupt_lengths()
+        test_many_chunks()
+
+        print("\n" + "=" * 50)
+        print("🎉 PNG块迭代器测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
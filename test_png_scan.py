@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试PNG快速扫描
+验证只读块头的扫描结果，以及批量处理中对干净文件的分类
+"""
+
+import os
+import sys
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, PngImagePlugin
+from main import PNGBlockProcessor
+from batch import BatchRunner
+
+
+def create_png(path, with_metadata, trailing=b''):
+    """创建测试PNG文件，可选包含元数据和IEND之后的多余数据"""
+    metadata = PngImagePlugin.PngInfo()
+    if with_metadata:
+        metadata.add_text("workflow", '{"nodes": []}')
+    Image.new('RGB', (64, 64), color='green').save(path, "PNG", pnginfo=metadata)
+    if trailing:
+        with open(path, 'ab') as f:
+            f.write(trailing)
+
+
+def test_scan_png():
+    """测试扫描结果"""
+    print("🧪 测试PNG快速扫描...")
+    processor = PNGBlockProcessor()
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        clean = os.path.join(temp_dir, "clean.png")
+        dirty = os.path.join(temp_dir, "dirty.png")
+        trailing = os.path.join(temp_dir, "trailing.png")
+        create_png(clean, with_metadata=False)
+        create_png(dirty, with_metadata=True)
+        create_png(trailing, with_metadata=False, trailing=b'hidden workflow')
+
+        scan = processor.scan_png(clean)
+        types = [chunk.type for chunk in scan['chunks']]
+        print(f"  干净文件的块: {types}")
+        assert scan['is_png']
+        assert types[0] == b'IHDR' and types[-1] == b'IEND'
+        assert scan['chunks'][0].offset == 8, "IHDR应紧跟在签名之后"
+        assert scan['chunks'][0].length == 13
+        assert not scan['has_metadata']
+        assert not scan['needs_stripping']
+
+        scan = processor.scan_png(dirty)
+        assert b'tEXt' in [chunk.type for chunk in scan['chunks']]
+        assert scan['has_metadata'] and scan['needs_stripping']
+
+        scan = processor.scan_png(trailing)
+        assert scan['trailing_bytes'] == len(b'hidden workflow')
+        assert scan['needs_stripping']
+
+        not_png = os.path.join(temp_dir, "not_png.png")
+        with open(not_png, 'wb') as f:
+            f.write(b'GIF89a')
+        assert not processor.scan_png(not_png)['is_png']
+
+        print("  ✅ 扫描结果正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_batch_classifies_clean_files():
+    """测试批量处理统计中记录干净文件"""
+    print("\n🧪 测试干净文件分类...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        clean = os.path.join(temp_dir, "clean.png")
+        dirty = os.path.join(temp_dir, "dirty.png")
+        create_png(clean, with_metadata=False)
+        create_png(dirty, with_metadata=True)
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(output_dir)
+
+        stats = BatchRunner([clean, dirty], output_dir, keep_original_name=True).run()
+        assert stats['successful'] == 2
+        assert stats['clean_files'] == ["clean.png"]
+
+        print("  ✅ 干净文件分类正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_clean_file_fast_path():
+    """测试干净文件的复制和硬链接输出方式"""
+    print("\n🧪 测试干净文件快速输出...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        clean = os.path.join(temp_dir, "clean.png")
+        dirty = os.path.join(temp_dir, "dirty.png")
+        create_png(clean, with_metadata=False)
+        create_png(dirty, with_metadata=True)
+        with open(clean, 'rb') as f:
+            clean_data = f.read()
+
+        for strategy, expected in (("rewrite", {}),
+                                   ("copy", {"clean.png": "copy"}),
+                                   ("hardlink", {"clean.png": "hardlink"})):
+            output_dir = os.path.join(temp_dir, strategy)
+            os.makedirs(output_dir)
+            stats = BatchRunner([clean, dirty], output_dir, keep_original_name=True,
+                                clean_strategy=strategy).run()
+            print(f"  {strategy}: {stats['fast_path_files']}")
+            assert stats['successful'] == 2
+            assert stats['fast_path_files'] == expected
+
+            output_clean = os.path.join(output_dir, "clean.png")
+            with open(output_clean, 'rb') as f:
+                assert f.read() == clean_data, "干净文件的输出应与输入完全相同"
+            assert os.path.samefile(output_clean, clean) == (strategy == "hardlink")
+
+            with open(os.path.join(output_dir, "dirty.png"), 'rb') as f:
+                assert b'tEXt' not in f.read()
+
+        # 再次运行时覆盖已存在的输出
+        stats = BatchRunner([clean], os.path.join(temp_dir, "copy"), keep_original_name=True,
+                            clean_strategy="hardlink").run()
+        assert stats['fast_path_files'] == {"clean.png": "hardlink"}
+
+        print("  ✅ 干净文件快速输出正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_outputs_replace_links_and_names():
+    """测试输出位置上的硬链接被替换而不是被写穿，以及不同文件夹中的同名文件分别输出"""
+    print("\n🧪 测试输出位置上的硬链接和同名文件...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        first_dir = os.path.join(temp_dir, "first")
+        second_dir = os.path.join(temp_dir, "second")
+        output_dir = os.path.join(temp_dir, "output")
+        for directory in (first_dir, second_dir, output_dir):
+            os.makedirs(directory)
+        original = os.path.join(temp_dir, "original.png")
+        create_png(original, with_metadata=True, trailing=b'original')
+        with open(original, 'rb') as f:
+            original_data = f.read()
+
+        # 上一次以硬链接方式生成的输出与另一个文件共享数据
+        os.link(original, os.path.join(output_dir, "image.png"))
+        first = os.path.join(first_dir, "image.png")
+        second = os.path.join(second_dir, "image.png")
+        create_png(first, with_metadata=True)
+        create_png(second, with_metadata=False)
+
+        for strategy in ("rewrite", "copy"):
+            stats = BatchRunner([first, second], output_dir, keep_original_name=True,
+                                clean_strategy=strategy).run()
+            assert stats['successful'] == 2
+            assert stats['processed_files'] == ["image.png", "image_1.png"], stats['processed_files']
+            with open(original, 'rb') as f:
+                assert f.read() == original_data, "不应改写与旧输出共享数据的文件"
+            assert not os.path.samefile(original, os.path.join(output_dir, "image.png"))
+            with open(os.path.join(output_dir, "image_1.png"), 'rb') as f:
+                assert f.read() == open(second, 'rb').read()
+            os.unlink(os.path.join(output_dir, "image_1.png"))
+            os.unlink(os.path.join(output_dir, "image.png"))
+            os.link(original, os.path.join(output_dir, "image.png"))
+            os.link(original, os.path.join(output_dir, "image_1.png"))
+
+        print("  ✅ 硬链接被替换，同名文件分别输出!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试PNG快速扫描")
+    print("=" * 50)
+
+    try:
+        test_scan_png()
+        test_batch_classifies_clean_files()
+        test_clean_file_fast_path()
+        test_outputs_replace_links_and_names()
+
+        print("\n" + "=" * 50)
+        print("🎉 PNG快速扫描测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
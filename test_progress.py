@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试合并进度报告
+验证进度按时间间隔合并、速度和剩余时间的计算，以及批量处理时的最终报告
+"""
+
+import os
+import sys
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, PngImagePlugin
+from batch import BatchRunner, STATUS_DONE, STATUS_FAILED
+from progress import ProgressTracker, format_duration
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_tracker_coalescing():
+    """测试按时间间隔合并进度报告"""
+    print("🧪 测试进度合并...")
+    clock = FakeClock()
+    tracker = ProgressTracker(10, interval=0.1, clock=clock)
+
+    # 第一个文件立即报告
+    clock.now = 0.5
+    report = tracker.record(0, STATUS_DONE, "0.png", bytes_in=1024 * 1024, bytes_out=1000)
+    assert report is not None and report['done'] == 1
+    assert report['statuses'] == [(0, STATUS_DONE)]
+
+    # 间隔内完成的文件合并到下一次报告
+    for row in range(1, 4):
+        clock.now += 0.01
+        assert tracker.record(row, STATUS_DONE, f"{row}.png", bytes_in=1024 * 1024) is None
+
+    clock.now = 1.0
+    report = tracker.record(4, STATUS_FAILED, "4.png", error=ValueError("损坏"))
+    print(f"  📊 报告: {report['done']}/{report['total']}, {report['files_per_sec']:.1f} 文件/秒")
+    assert report['done'] == 5 and report['failed'] == 1
+    assert [row for row, _ in report['statuses']] == [1, 2, 3, 4]
+    assert report['bytes_in'] == 4 * 1024 * 1024 and report['bytes_out'] == 1000
+    assert report['files_per_sec'] == 5.0
+    assert report['mb_per_sec'] == 4.0
+    assert report['eta'] == 1.0
+    assert report['last_file'] == "4.png" and report['last_error'] == "损坏"
+
+    # 没有新完成的文件时不再生成最终报告
+    assert tracker.flush() is None
+    assert format_duration(None) == "--:--"
+    assert format_duration(3725) == "1:02:05"
+
+    print("  ✅ 进度合并正确!")
+
+
+def test_runner_progress_callback():
+    """测试批量处理的进度回调"""
+    print("\n🧪 测试批量处理进度回调...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        inputs = []
+        for i in range(20):
+            path = os.path.join(temp_dir, f"image_{i}.png")
+            metadata = PngImagePlugin.PngInfo()
+            metadata.add_text("workflow", "x" * 100)
+            Image.new('RGB', (8, 8)).save(path, "PNG", pnginfo=metadata)
+            inputs.append(path)
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(output_dir)
+
+        reports = []
+        stats = BatchRunner(inputs, output_dir, keep_original_name=True,
+                            progress_callback=reports.append, progress_interval=60).run()
+
+        # 第一个文件和最终报告，中间的文件全部合并
+        assert len(reports) == 2, len(reports)
+        assert reports[-1]['done'] == 20
+        statuses = [status for report in reports for status in report['statuses']]
+        assert sorted(row for row, _ in statuses) == list(range(20))
+
+        total_in = sum(os.path.getsize(path) for path in inputs)
+        total_out = sum(os.path.getsize(os.path.join(output_dir, name)) for name in os.listdir(output_dir))
+        assert reports[-1]['bytes_in'] == stats['bytes_in'] == total_in
+        assert reports[-1]['bytes_out'] == stats['bytes_out'] == total_out
+        assert total_out < total_in
+
+        print("  ✅ 批量处理进度回调正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试合并进度报告")
+    print("=" * 50)
+
+    try:
+        test_tracker_coalescing()
+        test_runner_progress_callback()
+
+        print("\n" + "=" * 50)
+        print("🎉 合并进度报告测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,7 @@ from unittest.mock import Mock, patch
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # 导入主程序类
+from processors import PNGBlockProcessor, process_non_png_image
 from main import ImageProcessor, ProcessingResultsDialog
 
 def create_test_files():
@@ -70,6 +71,7 @@ def test_stats_collection():
     try:
         # 创建ImageProcessor实例
         processor = ImageProcessor(test_files, output_dir, keep_original_name=True)
+        png_processor = PNGBlockProcessor()
         
         # 模拟信号连接
         stats_result = []
@@ -88,12 +90,12 @@ def test_stats_collection():
             output_path = os.path.join(output_dir, filename)
             
             try:
-                if processor.png_processor.is_png_file(image_path):
-                    success = processor.png_processor.process_png_streaming(image_path, output_path)
+                if png_processor.is_png_file(image_path):
+                    success = png_processor.process_png_streaming(image_path, output_path)
                     if not success:
                         raise Exception("PNG块处理失败")
                 else:
-                    processor._process_non_png_image(image_path, output_path, filename)
+                    process_non_png_image(image_path, output_path)
                 
                 processor.processed_files.append(filename)
                 print(f"  ✅ 成功: {filename}")
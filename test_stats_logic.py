@@ -13,6 +13,7 @@ import shutil
 # 添加当前目录到路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from processors import PNGBlockProcessor, process_non_png_image
 from main import ImageProcessor
 
 def test_stats_logic():
@@ -52,6 +53,7 @@ def test_stats_logic():
         
         # 创建处理器实例
         processor = ImageProcessor(test_files, output_dir, keep_original_name=True)
+        png_processor = PNGBlockProcessor()
         
         # 手动执行处理逻辑并统计
         total = len(test_files)
@@ -65,13 +67,13 @@ def test_stats_logic():
             
             try:
                 # 使用PNG处理器
-                if processor.png_processor.is_png_file(image_path):
-                    success = processor.png_processor.process_png_streaming(image_path, output_path)
+                if png_processor.is_png_file(image_path):
+                    success = png_processor.process_png_streaming(image_path, output_path)
                     if not success:
                         raise Exception("PNG块处理失败")
                 else:
                     # 尝试使用PIL处理
-                    processor._process_non_png_image(image_path, output_path, filename)
+                    process_non_png_image(image_path, output_path)
                 
                 processor.processed_files.append(filename)
                 print(f"  ✅ 成功")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试任务队列模型
+验证紧凑路径存储的去重、批量区间删除，以及处理结果按行更新状态
+"""
+
+import os
+import sys
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 没有显示服务时使用offscreen平台
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PIL import Image, PngImagePlugin
+from batch import BatchRunner, STATUS_PENDING, STATUS_DONE, STATUS_FAILED
+from path_store import PathStore
+
+
+def test_path_store():
+    """测试路径存储的去重和区间删除"""
+    print("🧪 测试路径存储...")
+    store = PathStore()
+    directory = os.path.abspath("images")
+
+    for i in range(10):
+        assert store.add(directory, f"{i}.png")
+    assert not store.add(directory, "3.png"), "重复文件不应加入队列"
+    assert store.add(os.path.join(directory, "sub"), "3.png")
+    assert len(store) == 11
+
+    store.remove_range(2, 4)
+    assert len(store) == 8
+    assert [store.name(row) for row in range(3)] == ["0.png", "1.png", "5.png"]
+    assert store.path(2) == os.path.join(directory, "5.png")
+    assert len(store.statuses) == 8
+
+    # 删除后可以重新加入
+    assert store.add(directory, "3.png")
+
+    # 快照只包含创建时已有的行
+    view = store.snapshot()
+    store.add(directory, "new.png")
+    assert len(view) == 9 and len(list(view)) == 9
+    assert view[0] == os.path.join(directory, "0.png")
+
+    print("  ✅ 路径存储正确!")
+
+
+def test_queue_model_statuses():
+    """测试队列模型的批量删除和状态更新"""
+    print("\n🧪 测试队列模型状态...")
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtWidgets import QApplication
+    from main import TaskQueueModel
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        model = TaskQueueModel()
+        names = ["good_0.png", "broken.png", "good_1.png", "extra.png"]
+        for name in names:
+            path = os.path.join(temp_dir, name)
+            if name == "broken.png":
+                with open(path, 'wb') as f:
+                    f.write(b'\x89PNG\r\n\x1a\n' + b'\x00\x00\x10\x00IHDR')
+            else:
+                metadata = PngImagePlugin.PngInfo()
+                metadata.add_text("workflow", name)
+                Image.new('RGB', (8, 8)).save(path, "PNG", pnginfo=metadata)
+
+        assert model.add_files([(temp_dir, name) for name in names]) == 4
+        assert model.add_files([(temp_dir, "good_0.png")]) == 0
+
+        # 多个重叠、相邻的选中区间一次删除
+        model.remove_ranges([(3, 3), (3, 3)])
+        assert model.rowCount() == 3
+
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(output_dir)
+        runner = BatchRunner(model.paths(), output_dir, keep_original_name=True,
+                             status_callback=model.set_status)
+        stats = runner.run()
+        assert stats['failed_files'] == ["broken.png"]
+
+        statuses = [model.store.statuses[row] for row in range(3)]
+        assert statuses == [STATUS_DONE, STATUS_FAILED, STATUS_DONE], statuses
+        assert model.data(model.index(1)) == "broken.png  [失败]"
+        assert model.data(model.index(0), Qt.ToolTipRole) == os.path.join(temp_dir, "good_0.png")
+
+        model.reset_statuses()
+        assert model.store.statuses[1] == STATUS_PENDING
+        assert model.data(model.index(1)) == "broken.png"
+
+        app.processEvents()
+        print("  ✅ 队列模型状态正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试任务队列模型")
+    print("=" * 50)
+
+    try:
+        test_path_store()
+        test_queue_model_statuses()
+
+        print("\n" + "=" * 50)
+        print("🎉 任务队列模型测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
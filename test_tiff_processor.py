@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试TIFF IFD处理器
+验证元数据标签和EXIF/GPS子IFD被删除、多页和瓦片TIFF的图像数据原样保留
+"""
+
+import os
+import sys
+import io
+import struct
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, ImageSequence, TiffImagePlugin
+from formats import UnsupportedStructureError
+from processors import TIFFProcessor, process_image_file
+
+
+def create_multipage_tiff(path):
+    """创建带描述、软件、时间和作者标签的三页LZW压缩TIFF"""
+    pages = [Image.new('RGB', (40, 30), color=(i * 60, 100, 200 - i * 50)) for i in range(3)]
+    for i, page in enumerate(pages):
+        page.putpixel((i, i), (255, 255, 255))
+
+    tags = TiffImagePlugin.ImageFileDirectory_v2()
+    tags[270] = "workflow prompt " * 20   # ImageDescription
+    tags[305] = "secret editor"           # Software
+    tags[306] = "2024:01:01 12:00:00"     # DateTime
+    tags[315] = "someone"                 # Artist
+
+    pages[0].save(path, "TIFF", save_all=True, append_images=pages[1:], compression="tiff_lzw",
+                  tiffinfo=tags)
+
+
+def create_exif_tiff(path):
+    """创建带EXIF和GPS子IFD的未压缩TIFF（libtiff压缩时无法写入子IFD）"""
+    tags = TiffImagePlugin.ImageFileDirectory_v2()
+    tags[34665] = {0x9003: "2024:01:01 12:00:00"}   # EXIF子IFD: DateTimeOriginal
+    tags[34853] = {1: "N"}                          # GPS子IFD: GPSLatitudeRef
+    image = Image.new('RGB', (20, 20), color=(10, 20, 30))
+    image.putpixel((5, 5), (255, 0, 0))
+    image.save(path, "TIFF", tiffinfo=tags)
+
+
+def create_tiled_big_endian_tiff(path, extra_entries=()):
+    """手工构造大端序、16x16瓦片的32x32灰度TIFF，附带作者和XMP标签"""
+    tiles = [bytes((tile * 50 + i) % 256 for i in range(256)) for tile in range(4)]
+    artist = b'someone\x00'
+    xmp = b'<x:xmpmeta>' + b'x' * 100 + b'</x:xmpmeta>'
+
+    # 文件布局: 文件头 | 瓦片数据 | 作者 | XMP | 偏移数组 | 字节数数组 | IFD
+    data_start = 8
+    artist_offset = data_start + sum(len(tile) for tile in tiles)
+    xmp_offset = artist_offset + len(artist)
+    offsets_offset = xmp_offset + len(xmp)
+    counts_offset = offsets_offset + 16
+    ifd_offset = counts_offset + 16
+
+    tile_offsets = [data_start + 256 * i for i in range(4)]
+    entries = [
+        (256, 3, 1, struct.pack('>HH', 32, 0)),       # ImageWidth
+        (257, 3, 1, struct.pack('>HH', 32, 0)),       # ImageLength
+        (258, 3, 1, struct.pack('>HH', 8, 0)),        # BitsPerSample
+        (259, 3, 1, struct.pack('>HH', 1, 0)),        # Compression
+        (262, 3, 1, struct.pack('>HH', 1, 0)),        # PhotometricInterpretation
+        (277, 3, 1, struct.pack('>HH', 1, 0)),        # SamplesPerPixel
+        (315, 2, len(artist), struct.pack('>I', artist_offset)),
+        (322, 3, 1, struct.pack('>HH', 16, 0)),       # TileWidth
+        (323, 3, 1, struct.pack('>HH', 16, 0)),       # TileLength
+        (324, 4, 4, struct.pack('>I', offsets_offset)),
+        (325, 4, 4, struct.pack('>I', counts_offset)),
+        (700, 1, len(xmp), struct.pack('>I', xmp_offset)),
+    ]
+    entries.extend(extra_entries)
+    entries.sort()
+
+    ifd = struct.pack('>H', len(entries))
+    for tag, field_type, count, value in entries:
+        ifd += struct.pack('>HHI', tag, field_type, count) + value
+    ifd += struct.pack('>I', 0)
+
+    with open(path, 'wb') as f:
+        f.write(b'MM\x00*' + struct.pack('>I', ifd_offset))
+        f.write(b''.join(tiles) + artist + xmp)
+        f.write(struct.pack('>4I', *tile_offsets) + struct.pack('>4I', *[256] * 4))
+        f.write(ifd)
+
+
+def page_pixels(path):
+    with Image.open(path) as image:
+        return [page.tobytes() for page in ImageSequence.Iterator(image)]
+
+
+def test_strip_multipage_tiff():
+    """测试移除多页TIFF的元数据标签"""
+    print("🧪 测试多页TIFF元数据移除...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_path = os.path.join(temp_dir, "pages.tiff")
+        output_path = os.path.join(temp_dir, "output.tiff")
+        create_multipage_tiff(input_path)
+
+        processor = TIFFProcessor()
+        scan = processor.scan_tiff(input_path)
+        assert scan['is_tiff'] and scan['needs_stripping']
+        assert len(scan['ifds']) == 3, f"应有3个IFD，实际: {len(scan['ifds'])}"
+        for name in ('ImageDescription', 'Software', 'DateTime', 'Artist'):
+            assert name in scan['metadata_tags'], f"扫描结果缺少{name}"
+
+        result = process_image_file(input_path, output_path)
+        assert result['format'] == 'TIFF' and result['output_strategy'] == 'rewrite'
+        assert result['bytes_out'] < result['bytes_in']
+
+        with Image.open(output_path) as image:
+            assert image.n_frames == 3
+            for tag in (270, 305, 306, 315):
+                assert tag not in image.tag_v2, f"标签{tag}未被删除"
+            assert image.tag_v2[259] == 5, "压缩方式应保持LZW"
+        assert page_pixels(output_path) == page_pixels(input_path), "页面像素不一致"
+
+        # 输出文件不再含有任何元数据标签，再次处理走快速路径
+        assert not TIFFProcessor().scan_tiff(output_path)['needs_stripping']
+        again = process_image_file(output_path, os.path.join(temp_dir, "again.tiff"))
+        assert again['output_strategy'] == 'copy'
+
+        print("  ✅ 多页TIFF元数据移除成功!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_strip_exif_sub_ifds():
+    """测试删除指向EXIF和GPS子IFD的标签"""
+    print("\n🧪 测试EXIF/GPS子IFD移除...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_path = os.path.join(temp_dir, "exif.tiff")
+        output_path = os.path.join(temp_dir, "output.tiff")
+        create_exif_tiff(input_path)
+
+        result = process_image_file(input_path, output_path)
+        assert sorted(result['removed']) == ['ExifIFD', 'GPSIFD'], result['removed']
+
+        with Image.open(output_path) as image:
+            assert 34665 not in image.tag_v2 and 34853 not in image.tag_v2
+            assert not image.getexif().get_ifd(0x8769)
+        with open(output_path, 'rb') as f:
+            assert b'2024:01:01' not in f.read(), "EXIF子IFD的内容不应被复制"
+        assert page_pixels(output_path) == page_pixels(input_path), "像素不一致"
+
+        print("  ✅ EXIF/GPS子IFD移除成功!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_strip_tiled_big_endian_tiff():
+    """测试大端序瓦片TIFF，瓦片偏移被重新计算"""
+    print("\n🧪 测试大端序瓦片TIFF...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_path = os.path.join(temp_dir, "tiled.tif")
+        output_path = os.path.join(temp_dir, "output.tif")
+        create_tiled_big_endian_tiff(input_path)
+
+        processor = TIFFProcessor()
+        assert processor.process_tiff_streaming(input_path, output_path)
+        assert sorted(processor.removed_tags) == ['Artist', 'XMP']
+
+        with open(output_path, 'rb') as f:
+            output = f.read()
+        assert output[:4] == b'MM\x00*', "应保持大端序"
+        assert b'someone' not in output and b'xmpmeta' not in output
+
+        with Image.open(output_path) as image:
+            assert 322 in image.tag_v2 and 315 not in image.tag_v2
+        assert page_pixels(output_path) == page_pixels(input_path), "瓦片像素不一致"
+
+        print("  ✅ 瓦片TIFF处理正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_unsupported_and_corrupt_tiff():
+    """测试不支持的结构退回PIL，损坏的IFD报告失败"""
+    print("\n🧪 测试不支持和损坏的TIFF...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        # SubIFDs中的偏移无法重新计算，退回PIL重新编码
+        sub_ifd_path = os.path.join(temp_dir, "subifd.tif")
+        create_tiled_big_endian_tiff(sub_ifd_path, extra_entries=[(330, 4, 1, struct.pack('>I', 0))])
+        try:
+            TIFFProcessor().scan_tiff(sub_ifd_path)
+            assert False, "SubIFDs应抛出UnsupportedStructureError"
+        except UnsupportedStructureError:
+            pass
+        result = process_image_file(sub_ifd_path, os.path.join(temp_dir, "subifd_out.tif"))
+        assert result['format'] == 'TIFF' and result['removed'] == []
+
+        # IFD偏移超出文件范围
+        corrupt_path = os.path.join(temp_dir, "corrupt.tif")
+        with open(corrupt_path, 'wb') as f:
+            f.write(b'II*\x00' + struct.pack('<I', 1000) + b'\x00' * 16)
+        try:
+            process_image_file(corrupt_path, os.path.join(temp_dir, "corrupt_out.tif"))
+            assert False, "损坏的TIFF应处理失败"
+        except Exception as e:
+            assert "TIFF块处理失败" in str(e), str(e)
+
+        # 没有元数据的TIFF直接复制
+        clean_path = os.path.join(temp_dir, "clean.tif")
+        buffer = io.BytesIO()
+        Image.new('L', (16, 16), color=7).save(buffer, "TIFF")
+        with open(clean_path, 'wb') as f:
+            f.write(buffer.getvalue())
+        result = process_image_file(clean_path, os.path.join(temp_dir, "clean_out.tif"))
+        assert result['output_strategy'] == 'copy' and not result['needs_stripping']
+
+        print("  ✅ 不支持和损坏的TIFF处理正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试TIFF IFD处理器")
+    print("=" * 50)
+
+    try:
+        test_strip_multipage_tiff()
+        test_strip_exif_sub_ifds()
+        test_strip_tiled_big_endian_tiff()
+        test_unsupported_and_corrupt_tiff()
+
+        print("\n" + "=" * 50)
+        print("🎉 TIFF IFD处理器测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试处理阶段耗时统计
+验证各阶段耗时直方图、JSONL逐文件记录，以及cProfile/tracemalloc钩子
+"""
+
+import functools
+import json
+import os
+import pstats
+import sys
+import subprocess
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, PngImagePlugin
+from batch import BatchRunner
+from timing import StageHistogram, cprofile_hook, tracemalloc_hook
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def create_test_files(temp_dir):
+    """创建带元数据的PNG、干净的PNG、JPEG、BMP和一个损坏的文件"""
+    metadata = PngImagePlugin.PngInfo()
+    metadata.add_text("workflow", "x" * 1000)
+    Image.new('RGB', (32, 32)).save(os.path.join(temp_dir, "meta.png"), "PNG", pnginfo=metadata)
+    Image.new('RGB', (32, 32)).save(os.path.join(temp_dir, "clean.png"), "PNG")
+    Image.new('RGB', (32, 32)).save(os.path.join(temp_dir, "photo.jpg"), "JPEG")
+    Image.new('RGB', (32, 32)).save(os.path.join(temp_dir, "plain.bmp"), "BMP")
+    with open(os.path.join(temp_dir, "broken.png"), 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n\x00\x00\x10\x00IHDR')
+    return sorted(os.path.join(temp_dir, name) for name in os.listdir(temp_dir))
+
+
+def test_stage_timings():
+    """测试统计结果中的阶段耗时和JSONL记录"""
+    print("🧪 测试阶段耗时统计...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_dir = os.path.join(temp_dir, "input")
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(input_dir)
+        os.makedirs(output_dir)
+        inputs = create_test_files(input_dir)
+        timings_path = os.path.join(temp_dir, "timings.jsonl")
+
+        stats = BatchRunner(inputs, output_dir, keep_original_name=True,
+                            timings_path=timings_path).run()
+        timings = stats['timings']
+        print(f"  📊 阶段: {list(timings['stages'])}")
+
+        assert timings['files'] == 4
+        assert timings['bytes_read'] == stats['bytes_in']
+        assert timings['bytes_written'] == stats['bytes_out']
+        assert list(timings['stages']) == ['sniff', 'parse', 'decide', 'write']
+        assert timings['stages']['sniff']['count'] == 4
+        # 两个正常的PNG和JPEG经过判断阶段，BMP不经过
+        assert timings['stages']['decide']['count'] == 3
+        for summary in timings['stages'].values():
+            assert sum(summary['histogram'].values()) == summary['count']
+
+        with open(timings_path, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        assert len(records) == 5
+        failed = [record for record in records if 'error' in record]
+        assert [record['file'] for record in failed] == ["broken.png"]
+        bmp = [record for record in records if record['file'] == "plain.bmp"][0]
+        assert set(bmp['stages_ms']) == {'sniff', 'parse', 'write'}
+
+        # 默认不统计耗时
+        stats = BatchRunner(inputs, output_dir, keep_original_name=True).run()
+        assert 'timings' not in stats
+
+        histogram = StageHistogram()
+        histogram.add({'write': 0.0004}, 10, 5)
+        histogram.add({'write': 5.0})
+        assert histogram.to_dict()['stages']['write']['histogram'] == {'<=0.5ms': 1, '>2500ms': 1}
+
+        print("  ✅ 阶段耗时统计正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_profile_hooks():
+    """测试cProfile和tracemalloc钩子"""
+    print("\n🧪 测试性能分析钩子...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_dir = os.path.join(temp_dir, "input")
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(input_dir)
+        os.makedirs(output_dir)
+        inputs = create_test_files(input_dir)
+
+        profile_path = os.path.join(temp_dir, "batch.prof")
+        BatchRunner(inputs, output_dir, keep_original_name=True,
+                    profile_hook=functools.partial(cprofile_hook, profile_path)).run()
+        functions = pstats.Stats(profile_path).stats
+        assert any(name == 'process_image_file' for _, _, name in functions)
+
+        memory_path = os.path.join(temp_dir, "memory.txt")
+        BatchRunner(inputs, output_dir, keep_original_name=True,
+                    profile_hook=functools.partial(tracemalloc_hook, memory_path)).run()
+        with open(memory_path, 'r', encoding='utf-8') as f:
+            assert f.readline().startswith("current:")
+
+        # 命令行参数
+        timings_path = os.path.join(temp_dir, "cli.jsonl")
+        result = subprocess.run(
+            [sys.executable, "-m", "cli", "strip", input_dir, "-o", output_dir, "--no-cache",
+             "--timings-jsonl", timings_path, "--profile", "cprofile",
+             "--profile-output", os.path.join(temp_dir, "cli.prof")],
+            cwd=PROJECT_DIR, capture_output=True, text=True, encoding='utf-8'
+        )
+        stats = json.loads(result.stdout)
+        assert stats['timings']['files'] == 4
+        assert os.path.exists(os.path.join(temp_dir, "cli.prof"))
+        with open(timings_path, 'r', encoding='utf-8') as f:
+            assert len(f.readlines()) == 5
+
+        print("  ✅ 性能分析钩子正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试处理阶段耗时统计")
+    print("=" * 50)
+
+    try:
+        test_stage_timings()
+        test_profile_hooks()
+
+        print("\n" + "=" * 50)
+        print("🎉 处理阶段耗时统计测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件夹监视模式
+验证新文件、修改的文件和子文件夹中的文件都能被发现并处理
+"""
+
+import os
+import sys
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, PngImagePlugin
+from watcher import FolderWatcher, watch_folders
+
+
+def create_png(path, text="workflow"):
+    metadata = PngImagePlugin.PngInfo()
+    metadata.add_text("workflow", text)
+    Image.new('RGB', (16, 16)).save(path, "PNG", pnginfo=metadata)
+
+
+def test_watcher_poll():
+    """测试轮询结果"""
+    print("🧪 测试文件夹轮询...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_dir = os.path.join(temp_dir, "input")
+        output_dir = os.path.join(input_dir, "output")
+        os.makedirs(output_dir)
+        existing = os.path.join(input_dir, "existing.png")
+        create_png(existing)
+
+        watcher = FolderWatcher([input_dir], settle_time=0, full_rescan_interval=3,
+                                exclude_dirs=[output_dir])
+
+        # 文件需要在两次轮询之间保持不变才会交付处理
+        assert watcher.poll() == []
+        assert watcher.poll() == [existing]
+        assert watcher.poll() == []
+
+        # 新文件、子文件夹中的文件；输出文件夹和不支持的扩展名被忽略
+        os.makedirs(os.path.join(input_dir, "sub"))
+        new_file = os.path.join(input_dir, "sub", "new.png")
+        create_png(new_file)
+        create_png(os.path.join(output_dir, "ignored.png"))
+        with open(os.path.join(input_dir, "notes.txt"), 'w') as f:
+            f.write("ignored")
+        assert watcher.poll() == []
+        assert watcher.poll() == [new_file]
+
+        # 原地修改不会改变目录修改时间，由定期全量stat发现
+        create_png(existing, "changed")
+        stat = os.stat(existing)
+        os.utime(existing, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10 ** 9))
+        ready = []
+        for _ in range(4):
+            ready += watcher.poll()
+        assert ready == [existing], ready
+
+        print("  ✅ 文件夹轮询正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_skip_existing_and_watch_loop():
+    """测试跳过已有文件以及监视循环"""
+    print("\n🧪 测试监视循环...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_dir = os.path.join(temp_dir, "input")
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(input_dir)
+        os.makedirs(output_dir)
+        create_png(os.path.join(input_dir, "old.png"))
+
+        watcher = FolderWatcher([input_dir], settle_time=0, process_existing=False)
+        batches = []
+        watch_folders(watcher, output_dir, interval=0, batch_callback=batches.append, max_polls=2)
+        assert batches == []
+
+        create_png(os.path.join(input_dir, "new.png"))
+        watch_folders(watcher, output_dir, interval=0, batch_callback=batches.append, max_polls=2)
+        assert len(batches) == 1
+        assert batches[0]['processed_files'] == ["new.png"]
+        assert os.listdir(output_dir) == ["new.png"]
+        with open(os.path.join(output_dir, "new.png"), 'rb') as f:
+            assert b'tEXt' not in f.read()
+
+        print("  ✅ 监视循环正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试文件夹监视模式")
+    print("=" * 50)
+
+    try:
+        test_watcher_poll()
+        test_skip_existing_and_watch_loop()
+
+        print("\n" + "=" * 50)
+        print("🎉 文件夹监视模式测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试WebP块处理器
+验证EXIF/XMP被移除、ICC按设置保留或移除、VP8X标志位和RIFF长度被修正，图像数据原样保留
+"""
+
+import os
+import sys
+import struct
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, ImageCms
+from processors import WebPChunkProcessor, process_image_file
+
+XMP_DATA = b'<x:xmpmeta xmlns:x="adobe:ns:meta/">workflow</x:xmpmeta>'
+
+
+def read_chunks(path):
+    """返回 (块类型, 块数据) 列表和RIFF长度"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert data[:4] == b'RIFF' and data[8:12] == b'WEBP'
+    riff_size = struct.unpack('<I', data[4:8])[0]
+    chunks = []
+    offset = 12
+    while offset + 8 <= len(data):
+        fourcc, length = struct.unpack('<4sI', data[offset:offset + 8])
+        chunks.append((fourcc.decode('latin-1'), data[offset + 8:offset + 8 + length]))
+        offset += 8 + length + (length & 1)
+    return chunks, riff_size, len(data)
+
+
+def create_webp(path, **kwargs):
+    image = Image.new('RGB', (32, 32), color='orange')
+    image.putpixel((3, 5), (1, 2, 3))
+    exif = Image.Exif()
+    exif[0x010E] = "workflow description"
+    icc = ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB')).tobytes()
+    image.save(path, "WEBP", lossless=True, exif=exif.tobytes(), xmp=XMP_DATA, icc_profile=icc, **kwargs)
+
+
+def test_strip_webp():
+    """测试移除静态WebP的元数据"""
+    print("🧪 测试WebP元数据移除...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_path = os.path.join(temp_dir, "input.webp")
+        output_path = os.path.join(temp_dir, "output.webp")
+        create_webp(input_path)
+        input_chunks, _, _ = read_chunks(input_path)
+        print(f"  原始块: {[chunk[0] for chunk in input_chunks]}")
+        assert {'EXIF', 'XMP ', 'ICCP'} <= {chunk[0] for chunk in input_chunks}
+
+        result = process_image_file(input_path, output_path)
+        assert result['format'] == 'WEBP'
+        assert sorted(result['removed']) == ['EXIF', 'XMP']
+
+        chunks, riff_size, file_size = read_chunks(output_path)
+        names = [chunk[0] for chunk in chunks]
+        print(f"  处理后的块: {names}")
+        assert names == ['VP8X', 'ICCP', 'VP8L']
+        assert riff_size == file_size - 8
+
+        # VP8X中EXIF和XMP标志位被清除，ICC标志位保留
+        flags = chunks[0][1][0]
+        assert flags & WebPChunkProcessor.VP8X_FLAG_EXIF == 0
+        assert flags & WebPChunkProcessor.VP8X_FLAG_XMP == 0
+        assert flags & WebPChunkProcessor.VP8X_FLAG_ICC
+        assert chunks[0][1][1:] == input_chunks[0][1][1:]
+
+        # 图像数据原样保留
+        assert dict(chunks)['VP8L'] == dict(input_chunks)['VP8L']
+        with Image.open(input_path) as original, Image.open(output_path) as stripped:
+            assert list(original.getdata()) == list(stripped.getdata())
+            assert not stripped.getexif()
+            assert stripped.info.get('icc_profile')
+
+        # 同时去除ICC
+        result = process_image_file(input_path, output_path, strip_icc=True)
+        chunks, riff_size, file_size = read_chunks(output_path)
+        assert [chunk[0] for chunk in chunks] == ['VP8X', 'VP8L']
+        assert chunks[0][1][0] & WebPChunkProcessor.VP8X_FLAG_ICC == 0
+        assert riff_size == file_size - 8
+
+        # 已经干净的文件直接复制
+        result = process_image_file(output_path, os.path.join(temp_dir, "again.webp"), strip_icc=True)
+        assert not result['needs_stripping'] and result['output_strategy'] == 'copy'
+
+        print("  ✅ WebP元数据移除正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_strip_animated_webp():
+    """测试动画WebP的ANIM/ANMF块原样保留"""
+    print("\n🧪 测试动画WebP...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        input_path = os.path.join(temp_dir, "animated.webp")
+        output_path = os.path.join(temp_dir, "output.webp")
+        frames = [Image.new('RGB', (16, 16), color=color) for color in ('red', 'green', 'blue')]
+        exif = Image.Exif()
+        exif[0x010E] = "workflow"
+        frames[0].save(input_path, "WEBP", save_all=True, append_images=frames[1:], duration=100,
+                       loop=0, lossless=True, exif=exif.tobytes(), xmp=XMP_DATA)
+
+        input_chunks, _, _ = read_chunks(input_path)
+        process_image_file(input_path, output_path)
+        chunks, riff_size, file_size = read_chunks(output_path)
+
+        expected = [chunk for chunk in input_chunks if chunk[0] not in ('EXIF', 'XMP ')]
+        assert [chunk[0] for chunk in chunks] == [chunk[0] for chunk in expected]
+        assert chunks[1:] == expected[1:], "ANIM/ANMF数据应原样保留"
+        assert riff_size == file_size - 8
+        with Image.open(output_path) as stripped:
+            assert stripped.n_frames == 3
+
+        print("  ✅ 动画WebP处理正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_odd_length_and_truncated_webp():
+    """测试奇数长度块的填充字节以及不完整的文件"""
+    print("\n🧪 测试填充字节和不完整的文件...")
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        def chunk(fourcc, data):
+            return fourcc + struct.pack('<I', len(data)) + data + (b'\x00' if len(data) & 1 else b'')
+
+        vp8x = chunk(b'VP8X', bytes([WebPChunkProcessor.VP8X_FLAG_XMP]) + b'\x00' * 9)
+        body = b'WEBP' + vp8x + chunk(b'XMP ', b'abc') + chunk(b'VP8L', b'\x2f12345')
+        input_path = os.path.join(temp_dir, "odd.webp")
+        with open(input_path, 'wb') as f:
+            f.write(b'RIFF' + struct.pack('<I', len(body)) + body + b'trailing')
+
+        processor = WebPChunkProcessor()
+        scan = processor.scan_webp(input_path)
+        assert scan['trailing_bytes'] == 8 and scan['needs_stripping']
+
+        output_path = os.path.join(temp_dir, "output.webp")
+        assert processor.process_webp_streaming(input_path, output_path)
+        chunks, riff_size, file_size = read_chunks(output_path)
+        assert chunks == [('VP8X', b'\x00' * 10), ('VP8L', b'\x2f12345')]
+        assert riff_size == file_size - 8 and file_size % 2 == 0
+
+        # 声明的长度超过文件大小
+        truncated_path = os.path.join(temp_dir, "truncated.webp")
+        with open(truncated_path, 'wb') as f:
+            f.write(b'RIFF' + struct.pack('<I', len(body) + 100) + body)
+        try:
+            process_image_file(truncated_path, output_path)
+            assert False, "不完整的文件应处理失败"
+        except Exception as e:
+            assert "WebP块处理失败" in str(e)
+
+        print("  ✅ 填充字节和不完整的文件处理正确!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试WebP块处理器")
+    print("=" * 50)
+
+    try:
+        test_strip_webp()
+        test_strip_animated_webp()
+        test_odd_length_and_truncated_webp()
+
+        print("\n" + "=" * 50)
+        print("🎉 WebP块处理器测试全部通过!")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
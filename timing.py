@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+处理耗时统计与性能分析
+按阶段（预读、检测格式、解析、判断、写入、同步到磁盘）记录单个文件的耗时，汇总为直方图，
+并提供用cProfile或tracemalloc包裹整批处理的钩子，不依赖Qt
+"""
+
+import contextlib
+import json
+import time
+
+
+# 处理阶段
+STAGE_READ = 'read'       # 流水线模式中预读整个输入文件
+STAGE_SNIFF = 'sniff'     # 打开文件并读取文件头判断格式
+STAGE_PARSE = 'parse'     # 解析块/段结构（PIL路径为解码像素）
+STAGE_DECIDE = 'decide'   # 判断是否需要重写以及输出方式
+STAGE_WRITE = 'write'     # 写入输出文件（JPEG边解析边写入，全部计入此阶段）
+STAGE_FSYNC = 'fsync'     # 把输出文件同步到磁盘
+STAGES = (STAGE_READ, STAGE_SNIFF, STAGE_PARSE, STAGE_DECIDE, STAGE_WRITE, STAGE_FSYNC)
+
+# 直方图的桶上限（毫秒），最后一个桶收集所有更慢的文件
+HISTOGRAM_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class StageTimer:
+    """记录单个文件各阶段的耗时（秒）"""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+
+class NullTimer:
+    """未开启耗时统计时使用，不产生任何开销较大的操作"""
+
+    stages = None
+    _context = contextlib.nullcontext()
+
+    def stage(self, name):
+        return self._context
+
+
+NULL_TIMER = NullTimer()
+
+
+class StageHistogram:
+    """汇总多个文件的阶段耗时"""
+
+    def __init__(self):
+        self._stages = {}   # 阶段 -> {'count', 'total', 'max', 'buckets'}
+        self.files = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def add(self, stages, bytes_read=0, bytes_written=0):
+        """
+        加入一个文件的耗时
+
+        Args:
+            stages: {阶段: 秒}
+            bytes_read: 读取的字节数
+            bytes_written: 写入的字节数
+        """
+        self.files += 1
+        self.bytes_read += bytes_read
+        self.bytes_written += bytes_written
+        for name, seconds in stages.items():
+            summary = self._stages.get(name)
+            if summary is None:
+                summary = {'count': 0, 'total': 0.0, 'max': 0.0,
+                           'buckets': [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)}
+                self._stages[name] = summary
+            milliseconds = seconds * 1000
+            summary['count'] += 1
+            summary['total'] += milliseconds
+            summary['max'] = max(summary['max'], milliseconds)
+            summary['buckets'][_bucket_index(milliseconds)] += 1
+
+    def to_dict(self):
+        """转换为可以写入统计结果和JSON的字典"""
+        stages = {}
+        for name in sorted(self._stages, key=_stage_order):
+            summary = self._stages[name]
+            labels = [f"<={bound}ms" for bound in HISTOGRAM_BOUNDS_MS]
+            labels.append(f">{HISTOGRAM_BOUNDS_MS[-1]}ms")
+            stages[name] = {
+                'count': summary['count'],
+                'total_ms': summary['total'],
+                'mean_ms': summary['total'] / summary['count'],
+                'max_ms': summary['max'],
+                'histogram': {label: count for label, count in zip(labels, summary['buckets']) if count},
+            }
+        return {
+            'files': self.files,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'stages': stages,
+        }
+
+
+def _bucket_index(milliseconds):
+    for index, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+        if milliseconds <= bound:
+            return index
+    return len(HISTOGRAM_BOUNDS_MS)
+
+
+def _stage_order(name):
+    return STAGES.index(name) if name in STAGES else len(STAGES)
+
+
+class TimingLog:
+    """把每个文件的耗时逐行写入JSONL文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, filename, input_path, stages=None, bytes_in=0, bytes_out=0, error=None):
+        record = {
+            'file': filename,
+            'input': input_path,
+            'stages_ms': {name: seconds * 1000 for name, seconds in (stages or {}).items()},
+            'bytes_in': bytes_in,
+            'bytes_out': bytes_out,
+        }
+        if error is not None:
+            record['error'] = str(error)
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self._file.close()
+
+
+@contextlib.contextmanager
+def cprofile_hook(output_path):
+    """
+    用cProfile分析整批处理，结束后把统计数据写入output_path（可用pstats读取）
+
+    进程池模式下只能分析主进程中的调度部分，工作进程中的处理不在统计范围内。
+    """
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output_path)
+
+
+@contextlib.contextmanager
+def tracemalloc_hook(output_path, top=25):
+    """用tracemalloc记录整批处理的内存分配，结束后把分配最多的代码行写入output_path"""
+    import tracemalloc
+
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if not was_tracing:
+            tracemalloc.stop()
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(f"current: {current} bytes, peak: {peak} bytes\n")
+            for statistic in snapshot.statistics('lineno')[:top]:
+                f.write(f"{statistic}\n")
+
+
+PROFILE_HOOKS = {
+    'cprofile': cprofile_hook,
+    'tracemalloc': tracemalloc_hook,
+}
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件夹监视模式
+轮询os.scandir快照发现新增或修改的图片，目录修改时间未变化时直接复用上次的快照，
+只依赖标准库，不需要额外的系统服务
+"""
+
+import os
+import time
+
+from batch import BatchRunner
+from formats import supported_extensions
+
+
+class FolderWatcher:
+    """轮询式文件夹监视器，返回已经写入完成、可以处理的文件"""
+
+    def __init__(self, input_dirs, recursive=True, settle_time=1.0,
+                 full_rescan_interval=60, exclude_dirs=(), process_existing=True):
+        """
+        Args:
+            input_dirs: 需要监视的文件夹列表
+            recursive: 是否监视子文件夹
+            settle_time: 文件最后修改后至少经过多少秒才认为写入完成
+            full_rescan_interval: 每隔多少次轮询重新stat所有文件，
+                用于发现原地修改（这种修改不会改变目录的修改时间）
+            exclude_dirs: 不监视的文件夹（例如位于输入文件夹内的输出文件夹）
+            process_existing: 第一次轮询时是否处理已经存在的文件
+        """
+        self.input_dirs = [os.path.abspath(path) for path in input_dirs]
+        self.recursive = recursive
+        self.settle_time = settle_time
+        self.full_rescan_interval = full_rescan_interval
+        self.exclude_dirs = {os.path.normcase(os.path.realpath(path)) for path in exclude_dirs}
+        self.process_existing = process_existing
+
+        self._dirs = {}       # 目录 -> (修改时间, 文件列表, 子目录列表)
+        self._pending = {}    # 等待写入完成的文件 -> (大小, 修改时间)
+        self._done = {}       # 已经交付处理的文件 -> (大小, 修改时间)
+        self._poll_count = 0
+
+    def poll(self):
+        """
+        执行一次轮询
+
+        Returns:
+            list: 新增或修改后已经写入完成的文件路径
+        """
+        self._poll_count += 1
+        first_poll = self._poll_count == 1
+        full_rescan = self.full_rescan_interval and self._poll_count % self.full_rescan_interval == 0
+
+        # 1. 收集所有文件，变化的目录重新scandir，未变化的目录复用快照
+        changed_files, all_files = self._walk(full_rescan)
+
+        # 2. 新文件和变化的文件进入等待队列，下一次轮询时再确认是否写入完成
+        candidates = all_files if full_rescan else changed_files
+        new_pending = set()
+        for path in candidates:
+            if path in self._pending:
+                continue
+            signature = self._stat(path)
+            if signature is None:
+                continue
+            if first_poll and not self.process_existing:
+                self._done[path] = signature
+            elif self._done.get(path) != signature:
+                self._pending[path] = signature
+                new_pending.add(path)
+
+        # 3. 等待队列中的文件大小和修改时间不再变化且超过settle_time后才交付处理
+        ready = []
+        now = time.time()
+        for path, previous in list(self._pending.items()):
+            if path in new_pending:
+                continue
+            signature = self._stat(path)
+            if signature is None:
+                del self._pending[path]
+                continue
+            if signature != previous:
+                self._pending[path] = signature
+                continue
+            if now - signature[1] / 1e9 >= self.settle_time:
+                del self._pending[path]
+                self._done[path] = signature
+                ready.append(path)
+
+        # 已删除的文件不再跟踪
+        if full_rescan:
+            for path in list(self._done):
+                if path not in all_files:
+                    del self._done[path]
+
+        return sorted(ready)
+
+    def _walk(self, full_rescan):
+        """遍历所有监视目录，返回 (目录内容有变化的文件, 全部文件)"""
+        changed_files = set()
+        all_files = set()
+        seen_dirs = set()
+        stack = list(self.input_dirs)
+
+        while stack:
+            directory = stack.pop()
+            if directory in seen_dirs:
+                continue
+            seen_dirs.add(directory)
+
+            try:
+                dir_mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+
+            snapshot = self._dirs.get(directory)
+            if snapshot is not None and snapshot[0] == dir_mtime:
+                # 目录修改时间未变化，说明没有新增、删除或重命名文件
+                _, files, subdirs = snapshot
+            else:
+                files, subdirs = self._scan_dir(directory)
+                self._dirs[directory] = (dir_mtime, files, subdirs)
+                changed_files.update(files)
+
+            all_files.update(files)
+            if self.recursive:
+                stack.extend(subdirs)
+
+        # 删除已经不存在的目录的快照
+        for directory in list(self._dirs):
+            if directory not in seen_dirs:
+                del self._dirs[directory]
+
+        return changed_files, all_files
+
+    def _scan_dir(self, directory):
+        """scandir一个目录，返回支持格式的文件列表和子目录列表"""
+        files = []
+        subdirs = []
+        extensions = supported_extensions()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if os.path.normcase(os.path.realpath(entry.path)) not in self.exclude_dirs:
+                            subdirs.append(entry.path)
+                    elif entry.is_file():
+                        _, ext = os.path.splitext(entry.name)
+                        if ext.lower() in extensions:
+                            files.append(entry.path)
+        except OSError:
+            pass
+        return files, subdirs
+
+    def _stat(self, path):
+        """获取文件的 (大小, 修改时间)，文件不存在时返回None"""
+        try:
+            file_stat = os.stat(path)
+        except OSError:
+            return None
+        return file_stat.st_size, file_stat.st_mtime_ns
+
+
+def watch_folders(watcher, output_dir, interval=1.0, batch_callback=None,
+                  max_polls=None, **runner_options):
+    """
+    持续轮询并处理新文件，直到被中断
+
+    Args:
+        watcher: FolderWatcher实例
+        output_dir: 输出文件夹
+        interval: 轮询间隔（秒）
+        batch_callback: 每批文件处理完成后的回调，参数为统计结果
+        max_polls: 最多轮询次数，None表示一直运行
+        runner_options: 传给BatchRunner的其他参数
+    """
+    original_executor = runner_options.get('executor')
+    polls = 0
+    try:
+        while max_polls is None or polls < max_polls:
+            started = time.monotonic()
+            ready = watcher.poll()
+            polls += 1
+
+            if ready:
+                runner = BatchRunner(ready, output_dir, keep_original_name=True, **runner_options)
+                stats = runner.run()
+                if original_executor is not None:
+                    # 超时终止工作进程后进程池会被重建，后面的批次使用新的进程池
+                    runner_options['executor'] = runner.executor
+                if batch_callback is not None:
+                    batch_callback(stats)
+
+            # 处理耗时计入轮询间隔
+            elapsed = time.monotonic() - started
+            if max_polls is None or polls < max_polls:
+                time.sleep(max(0.0, interval - elapsed))
+    finally:
+        # 原来的进程池由调用方关闭，这里只关闭重建的进程池
+        executor = runner_options.get('executor')
+        if executor is not original_executor:
+            executor.shutdown(wait=True, cancel_futures=True)